@@ -0,0 +1,55 @@
+"""bench_startup.py — время холодного запуска CLI
+
+Запускает команды CLI отдельными процессами (как это делает MES: одно
+задание — один запуск) и печатает минимум и медиану в мс. Первый запуск
+с --post прогревает кэш скомпилированного профиля, поэтому в замер не
+входит.
+
+    python benchmarks/bench_startup.py [-n 20] [--json out.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POST = os.path.join(ROOT, "gcodegen", "data", "posts", "fanuc_ru.yaml")
+
+CASES = {
+    "import": ["-c", "import gcodegen.cli"],
+    "face": ["-m", "gcodegen.cli", "face", "--width", "10", "--length", "10", "--depth", "1"],
+    "face_post": ["-m", "gcodegen.cli", "face", "--width", "10", "--length", "10", "--depth", "1",
+                  "--post", POST],
+    "helpcmd": ["-m", "gcodegen.cli", "helpcmd"],
+}
+
+def run(args: list, n: int) -> list:
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    cmd = [sys.executable] + args
+    subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, check=True)  # прогрев
+    times = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - t0) * 1000)
+    return times
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("-n", type=int, default=20, help="запусков на случай")
+    ap.add_argument("--json", help="сохранить результаты в JSON")
+    a = ap.parse_args()
+    res = {}
+    for name, args in CASES.items():
+        t = run(args, a.n)
+        res[name] = {"min_ms": round(min(t), 1), "median_ms": round(statistics.median(t), 1)}
+        print(f"{name:10s} min {res[name]['min_ms']:7.1f} ms   median {res[name]['median_ms']:7.1f} ms")
+    if a.json:
+        with open(a.json, "w", encoding="utf-8") as f:
+            json.dump(res, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""bench_suite.py — нагрузочные замеры генераторов, постпроцессора, валидатора и arcfit
+
+Каждый случай запускается отдельным процессом (чтобы пиковая память
+не смешивалась между случаями) и меряет блоки/с, МБ/с и пиковый RSS.
+Результаты пишутся в JSON и сравниваются с базовым прогоном:
+
+    python benchmarks/bench_suite.py --json base.json
+    ...изменения...
+    python benchmarks/bench_suite.py --json new.json --baseline base.json
+
+Размеры: small, medium (по умолчанию) и huge (миллионы блоков/строк).
+Файлы для валидатора и arcfit генерируются один раз и лежат во временном каталоге.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SIZES = ("small", "medium", "huge")
+
+# Параметры генераторов по размерам (позиционные, как у iter_*) и опции
+CASES = {
+    # плоскость: ~17 тыс., ~270 тыс. и ~3 млн блоков
+    "face": {
+        "small": ((500, 500, 5, 0.5, 800, 10000, 1, 5), {}),
+        "medium": ((2000, 2000, 20, 0.5, 800, 10000, 1, 5), {}),
+        "huge": ((5000, 5000, 50, 0.25, 800, 10000, 1, 5), {}),
+    },
+    # круглый карман мелкой фрезой: сотни колец на проход
+    "round_pocket": {
+        "small": ((200, 5, 0.1, 300, 12000, 1, 5), {}),
+        "medium": ((500, 20, 0.1, 300, 12000, 0.5, 5), {}),
+        "huge": ((1000, 50, 0.05, 300, 12000, 0.5, 5), {}),
+    },
+    # глубокий прямоугольный карман: сотни и тысячи проходов по Z
+    "square_pocket": {
+        "small": ((100, 60, 20, 0.1, 600, 9000, 3, 5), {}),
+        "medium": ((200, 120, 100, 0.05, 600, 9000, 2, 5), {}),
+        "huge": ((400, 240, 200, 0.02, 600, 9000, 2, 5), {}),
+    },
+}
+# Валидатор: число строк синтетического файла
+VALIDATE_LINES = {"small": 200_000, "medium": 2_000_000, "huge": 10_000_000}
+# arcfit: число строк файла из окружностей, разбитых на отрезки G1
+ARCFIT_LINES = {"small": 20_000, "medium": 200_000, "huge": 2_000_000}
+# Служебные случаи (не генераторы) и их синтетические файлы
+FILE_CASES = ("validate", "arcfit")
+
+def _peak_rss_mb() -> float:
+    # VmHWM — пик именно этого процесса; ru_maxrss на Linux наследует пик
+    # родителя, если тот был больше в момент fork()
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux — КБ, macOS — байты
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+def _counted(blocks, counter: list):
+    for b in blocks:
+        counter[0] += 1
+        yield b
+
+def _synthetic_file(lines: int) -> str:
+    """Файл программы не короче lines строк (плоскость, пока не наберётся)."""
+    from gcodegen.core import iter_face, write_program
+    fn = os.path.join(tempfile.gettempdir(), f"gcodegen_bench_{lines}.nc")
+    if not os.path.exists(fn):
+        # ~33 тыс. строк на проход при фрезе 0.5 мм
+        passes = max(1, lines // 30_000 + 1)
+        tmp = fn + ".tmp"
+        write_program(iter_face(5000, 5000, passes * 0.5, 0.5, 800, 10000, 0.5, 5), tmp)
+        os.replace(tmp, fn)
+    return fn
+
+def _arc_file(lines: int) -> str:
+    """Файл не короче lines строк: окружности по 1000 отрезков G1, как
+    контур из CAM без дуг (arcfit заменяет их почти целиком)."""
+    from math import cos, sin, tau
+    fn = os.path.join(tempfile.gettempdir(), f"gcodegen_bench_arcs_{lines}.nc")
+    if not os.path.exists(fn):
+        tmp = fn + ".tmp"
+        with open(tmp, "w") as f:
+            f.write("G90 G17\nG0 X50.000 Y0.000\nG1 F500\n")
+            for c in range(lines // 1001 + 1):
+                r = 50 + c % 7
+                f.write(f"G1 X{r:.3f} Y0.000\n")
+                for k in range(1, 1001):
+                    f.write(f"X{r * cos(tau * k / 1000):.3f} Y{r * sin(tau * k / 1000):.3f}\n")
+            f.write("M30\n")
+        os.replace(tmp, fn)
+    return fn
+
+def _case_file(name: str, size: str) -> str:
+    if name == "validate":
+        return _synthetic_file(VALIDATE_LINES[size])
+    return _arc_file(ARCFIT_LINES[size])
+
+def run_case(name: str, size: str) -> dict:
+    """Один замер в текущем процессе."""
+    if name == "arcfit":
+        from gcodegen.arcfit import fit_arcs_lines
+        fn = _case_file(name, size)
+        nbytes = os.path.getsize(fn)
+        counter = [0]
+        t0 = time.perf_counter()
+        with open(fn, encoding="utf-8") as f:
+            for _ in fit_arcs_lines(_counted(f, counter)):
+                pass
+        seconds = time.perf_counter() - t0
+        blocks = counter[0]
+    elif name == "validate":
+        from gcodegen.validator import validate_file
+        fn = _case_file(name, size)
+        with open(fn, "rb") as f:
+            blocks = sum(1 for _ in f)
+        nbytes = os.path.getsize(fn)
+        t0 = time.perf_counter()
+        validate_file(fn)
+        seconds = time.perf_counter() - t0
+    else:
+        from gcodegen import core
+        args, opts = CASES[name][size]
+        gen = getattr(core, f"iter_{name}")
+        counter = [0]
+        t0 = time.perf_counter()
+        nbytes = core.write_program(_counted(gen(*args, **opts), counter), os.devnull)
+        seconds = time.perf_counter() - t0
+        blocks = counter[0]
+    return {
+        "blocks": blocks,
+        "bytes": nbytes,
+        "seconds": round(seconds, 4),
+        "blocks_per_s": round(blocks / seconds),
+        "mb_per_s": round(nbytes / seconds / 1e6, 2),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+def _spawn(name: str, size: str) -> dict:
+    out = subprocess.run([sys.executable, __file__, "--child", name, size],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out)
+
+def compare(results: dict, baseline: dict, threshold: float) -> int:
+    """Сравнить с базой; число случаев, замедлившихся больше чем на threshold."""
+    slower = 0
+    print(f"\n{'case':24s} {'blocks/s':>10s} {'rss':>8s}")
+    for key, r in results.items():
+        b = baseline.get(key)
+        if not b:
+            continue
+        speed = r["blocks_per_s"] / b["blocks_per_s"]
+        rss = r["peak_rss_mb"] / b["peak_rss_mb"]
+        flag = ""
+        if speed < 1 - threshold:
+            slower += 1
+            flag = "  <-- медленнее"
+        print(f"{key:24s} {speed:9.2f}x {rss:7.2f}x{flag}")
+    return slower
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--size", action="append", choices=SIZES,
+                    help="размер (можно несколько; по умолчанию small и medium)")
+    ap.add_argument("--case", action="append", choices=list(CASES) + list(FILE_CASES),
+                    help="случай (можно несколько; по умолчанию все)")
+    ap.add_argument("--json", help="сохранить результаты в JSON")
+    ap.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    ap.add_argument("--threshold", type=float, default=0.1,
+                    help="допустимое замедление (доля), иначе код возврата 1")
+    ap.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    a = ap.parse_args()
+
+    if a.child:
+        print(json.dumps(run_case(*a.child)))
+        return
+
+    results = {}
+    for name in a.case or list(CASES) + list(FILE_CASES):
+        for size in a.size or ("small", "medium"):
+            if name in FILE_CASES:
+                # файл готовим здесь, чтобы генерация не попала в RSS замера
+                _case_file(name, size)
+            r = results[f"{name}/{size}"] = _spawn(name, size)
+            print(f"{name + '/' + size:24s} {r['blocks']:>10d} blocks {r['seconds']:8.3f} s "
+                  f"{r['blocks_per_s']:>10d} blocks/s {r['mb_per_s']:7.2f} MB/s "
+                  f"{r['peak_rss_mb']:7.1f} MB RSS")
+
+    if a.json:
+        meta = {"python": platform.python_version(), "platform": platform.platform(),
+                "time": time.strftime("%Y-%m-%d %H:%M:%S")}
+        with open(a.json, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+    if a.baseline:
+        with open(a.baseline, encoding="utf-8") as f:
+            base = json.load(f)["results"]
+        if compare(results, base, a.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
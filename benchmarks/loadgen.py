@@ -0,0 +1,100 @@
+"""loadgen.py — нагрузка на gcodegen serve
+
+Шлёт requests запросов с concurrency одновременными соединениями
+(keep-alive) и печатает задержки p50/p95/p99, запросы/с и МБ/с:
+
+    python -m gcodegen.cli serve &
+    python benchmarks/loadgen.py -n 200 -c 16 --distinct 4
+
+--distinct — сколько разных наборов параметров крутится в нагрузке: при
+малом числе одинаковые запросы приходят одновременно и сервис их
+склеивает (видно по "coalesced" в /stats).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+def _spec(op: str, i: int) -> dict:
+    # разные размеры — разные программы
+    size = 100 + 10 * i
+    if op == "face":
+        return {"width": size, "length": size, "depth": 2, "tool_diam": 10}
+    if op == "round":
+        return {"diameter": size, "depth": 2, "tool_diam": 6}
+    return {"width": size, "length": size * 0.6, "depth": 2, "tool_diam": 6}
+
+async def _request(reader, writer, host: str, path: str, body: bytes) -> tuple[int, int]:
+    """Один запрос по открытому соединению; (код, байт тела)."""
+    writer.write((f"POST {path} HTTP/1.1\r\nHost: {host}\r\n"
+                  f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode()
+                 + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "content-length" in headers:
+        return status, len(await reader.readexactly(int(headers["content-length"])))
+    size = 0
+    while True:
+        n = int((await reader.readline()).strip(), 16)
+        await reader.readexactly(n + 2)
+        if n == 0:
+            return status, size
+        size += n
+
+async def _worker(a, queue: asyncio.Queue, latencies: list, totals: dict) -> None:
+    reader, writer = await asyncio.open_connection(a.host, a.port)
+    try:
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            body = json.dumps(_spec(a.op, i % a.distinct)).encode()
+            t0 = time.perf_counter()
+            status, size = await _request(reader, writer, a.host, f"/{a.op}", body)
+            latencies.append(time.perf_counter() - t0)
+            totals["bytes"] += size
+            totals["errors"] += status != 200
+    finally:
+        writer.close()
+
+async def _stats(a) -> dict:
+    reader, writer = await asyncio.open_connection(a.host, a.port)
+    writer.write(f"GET /stats HTTP/1.1\r\nHost: {a.host}\r\nConnection: close\r\n\r\n".encode())
+    data = await reader.read()
+    writer.close()
+    return json.loads(data.partition(b"\r\n\r\n")[2])
+
+def _pct(sorted_values: list, p: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+async def main(a) -> None:
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(a.requests):
+        queue.put_nowait(i)
+    latencies: list = []
+    totals = {"bytes": 0, "errors": 0}
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_worker(a, queue, latencies, totals) for _ in range(a.concurrency)))
+    wall = time.perf_counter() - t0
+    lat = sorted(latencies)
+    print(f"{len(lat)} запросов ({totals['errors']} с ошибками) за {wall:.2f} с: "
+          f"{len(lat) / wall:.1f} запр/с, {totals['bytes'] / wall / 1e6:.2f} МБ/с")
+    print(f"задержка p50 {_pct(lat, 0.5) * 1000:.1f} мс, p95 {_pct(lat, 0.95) * 1000:.1f} мс, "
+          f"p99 {_pct(lat, 0.99) * 1000:.1f} мс")
+    print("сервер:", json.dumps(await _stats(a)))
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--op", choices=("face", "round", "square"), default="face")
+    ap.add_argument("-n", "--requests", type=int, default=100)
+    ap.add_argument("-c", "--concurrency", type=int, default=8)
+    ap.add_argument("--distinct", type=int, default=4,
+                    help="число разных наборов параметров")
+    asyncio.run(main(ap.parse_args()))
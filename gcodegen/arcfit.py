@@ -0,0 +1,318 @@
+"""arcfit.py — замена цепочек G1 дугами G2/G3
+
+Цепочка линейных перемещений в плоскости XY (Z и F не меняются), точки
+которой лежат на окружности с точностью tol, заменяется одной дугой с
+центром I/J — так же, как дуги выводит round_pocket. Проверяются и точки,
+и середины отрезков (иначе вершины прямоугольника тоже «лежат на
+окружности»), направление обхода должно быть одним, дуга — меньше полной
+окружности. Окружность строится через первую, среднюю и последнюю точки,
+поэтому начало и конец дуги лежат на ней точно и стойка не получит
+расхождения радиусов. Дуги ставятся только в плоскости G17 и с
+относительным центром (G91.1, по умолчанию): иначе те же X/Y/I/J стойка
+поняла бы по-другому.
+
+fit_arcs() работает с Toolpath (для генераторов и compose),
+fit_arcs_lines() — с текстом программы: строки, не попавшие в дуги,
+остаются без изменений.
+"""
+from __future__ import annotations
+from math import atan2, hypot, tau
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+from .toolpath import Toolpath, FEED, ARC_CCW, CMD, CALL, NAN
+from .validator import RE_N, parse_block, parse_body
+
+DEFAULT_TOL = 0.01
+# Минимум отрезков в дуге: короче — выигрыша почти нет
+MIN_SEGMENTS = 4
+# Предел точек одной дуги (проверка дуги — O(точек), поиск длины — O(точек·log))
+MAX_POINTS = 512
+# Дуги большего радиуса — это почти прямая, их оставляем отрезками
+MAX_RADIUS = 10000.0
+
+def _arc_mode(g: tuple, plane: int, incremental_ij: bool) -> tuple:
+    """Плоскость (G17/G18/G19) и режим центра дуги (G91.1 — относительный)
+    после G-кодов кадра."""
+    for code in g:
+        if code in (17, 18, 19):
+            plane = code
+        elif code == 90.1:
+            incremental_ij = False
+        elif code == 91.1:
+            incremental_ij = True
+    return plane, incremental_ij
+
+class Arc(NamedTuple):
+    start: int          # индекс начальной точки в списке точек
+    stop: int           # индекс конечной точки
+    cw: bool
+    cx: float
+    cy: float
+
+def _circle(p: tuple, q: tuple, s: tuple) -> Optional[tuple]:
+    """Центр и радиус окружности через три точки (None — точки на прямой)."""
+    ax, ay = p
+    bx, by = q[0] - ax, q[1] - ay
+    cx, cy = s[0] - ax, s[1] - ay
+    d = 2.0 * (bx * cy - by * cx)
+    if abs(d) < 1e-12:
+        return None
+    b2 = bx * bx + by * by
+    c2 = cx * cx + cy * cy
+    ux = (cy * b2 - by * c2) / d
+    uy = (bx * c2 - cx * b2) / d
+    return ax + ux, ay + uy, hypot(ux, uy)
+
+def _check(pts: List[tuple], a: int, b: int, tol: float) -> Optional[Arc]:
+    """Дуга через точки a..b или None, если они на неё не ложатся."""
+    c = _circle(pts[a], pts[(a + b) // 2], pts[b])
+    if c is None:
+        return None
+    cx, cy, r = c
+    if r > MAX_RADIUS:
+        return None
+    sweep = 0.0
+    sign = 0
+    px, py = pts[a]
+    ang = atan2(py - cy, px - cx)
+    for k in range(a + 1, b + 1):
+        x, y = pts[k]
+        if abs(hypot(x - cx, y - cy) - r) > tol:
+            return None
+        if abs(hypot((x + px) / 2 - cx, (y + py) / 2 - cy) - r) > tol:
+            return None
+        nxt = atan2(y - cy, x - cx)
+        step = (nxt - ang + tau / 2) % tau - tau / 2
+        s = 1 if step > 0 else -1 if step < 0 else 0
+        if s == 0 or (sign and s != sign):
+            return None
+        sign = s
+        sweep += step
+        ang, px, py = nxt, x, y
+    if abs(sweep) >= tau - 1e-6:
+        return None
+    return Arc(a, b, sign < 0, cx, cy)
+
+def _longest(pts: List[tuple], a: int, tol: float, min_segments: int) -> Optional[Arc]:
+    """Самая длинная дуга из точки a (None — нет и в min_segments отрезков).
+
+    Длина удваивается до первой неудачи, затем граница ищется делением
+    пополам: O(L log L) проверенных точек на дугу из L точек вместо O(L²)
+    при наращивании по одной точке.
+    """
+    last = min(len(pts) - 1, a + MAX_POINTS - 1)
+    b = a + min_segments
+    best = _check(pts, a, b, tol)
+    if best is None:
+        return None
+    bad = last + 1
+    while b < last:
+        nb = min(a + 2 * (b - a), last)
+        arc = _check(pts, a, nb, tol)
+        if arc is None:
+            bad = nb
+            break
+        best, b = arc, nb
+    while bad - b > 1:
+        mid = (b + bad) // 2
+        arc = _check(pts, a, mid, tol)
+        if arc is None:
+            bad = mid
+        else:
+            best, b = arc, mid
+    return best
+
+def fit_points(pts: List[tuple], tol: float = DEFAULT_TOL, min_segments: int = MIN_SEGMENTS) -> List[Arc]:
+    """Дуги по ломаной pts[0] -> pts[1] -> ... (жадно, самые длинные)."""
+    arcs: List[Arc] = []
+    n = len(pts)
+    a = 0
+    while a + min_segments < n:
+        best = _longest(pts, a, tol, min_segments)
+        if best is None:
+            a += 1
+        else:
+            arcs.append(best)
+            a = best.stop
+    return arcs
+
+# ---------- Toolpath ----------
+def fit_arcs(tp: Toolpath, tol: float = DEFAULT_TOL, min_segments: int = MIN_SEGMENTS) -> Toolpath:
+    """Копия траектории, в которой цепочки G1 заменены дугами (и в подпрограммах)."""
+    out = Toolpath()
+    px = py = pz = NAN
+    feed = NAN
+    run: List[int] = []         # индексы G1 текущей цепочки
+    start = (NAN, NAN)
+    args = tp.args
+    plane, incremental_ij = 17, True
+
+    def flush() -> None:
+        if not run:
+            return
+        pts = [start]
+        x, y = start
+        for k in run:
+            x = tp.x[k] if tp.x[k] == tp.x[k] else x
+            y = tp.y[k] if tp.y[k] == tp.y[k] else y
+            pts.append((x, y))
+        done = 0
+        for arc in fit_points(pts, tol, min_segments):
+            for k in run[done:arc.start]:
+                _copy(tp, k, out)
+            first = run[arc.start]
+            sx, sy = pts[arc.start]
+            ex, ey = pts[arc.stop]
+            out.arc(arc.cw, ex, ey, arc.cx - sx, arc.cy - sy, f=tp.f[first])
+            done = arc.stop
+        for k in run[done:]:
+            _copy(tp, k, out)
+        run.clear()
+
+    for k, (o, x, y, z, f) in enumerate(zip(tp.op, tp.x, tp.y, tp.z, tp.f)):
+        if o > ARC_CCW:
+            flush()
+            if o == CALL:
+                px = py = pz = NAN  # позиция после подпрограммы здесь не отслеживается
+            elif o == CMD and k in args:
+                plane, incremental_ij = _arc_mode(parse_body(args[k][0]).g, plane, incremental_ij)
+            if k in args:
+                out.args[len(out.op)] = args[k]
+            out._push(o)
+            continue
+        planar = (o == FEED and plane == 17 and incremental_ij
+                  and (z != z or z == pz) and (f != f or f == feed)
+                  and px == px and py == py)
+        if not planar:
+            flush()
+        elif not run:
+            start = (px, py)
+        if planar:
+            run.append(k)
+        else:
+            _copy(tp, k, out)
+        if x == x: px = x
+        if y == y: py = y
+        if z == z: pz = z
+        if f == f: feed = f
+    flush()
+    out.subs = [(n, c, fit_arcs(body, tol, min_segments)) for n, c, body in tp.subs]
+    return out
+
+def _copy(src: Toolpath, k: int, dst: Toolpath) -> None:
+    dst._push(src.op[k], src.x[k], src.y[k], src.z[k], src.i[k], src.j[k], src.f[k])
+
+# ---------- текст программы ----------
+def _fmt(v: float, precision: int) -> str:
+    s = f"{v:.{precision}f}"
+    return "0." + "0" * precision if s.lstrip("-").strip("0.") == "" else s
+
+def _with_g1(raw: str) -> str:
+    """Вставить G1 после N-номера (после дуги модальный G1 нужно вернуть)."""
+    line = raw.lstrip()
+    mm = RE_N.match(line)
+    n = mm.group(0) if mm else ""
+    return f"{raw[:len(raw) - len(line)]}{n}G1 {line[len(n):]}"
+
+def fit_arcs_lines(lines: Iterable[str], tol: float = DEFAULT_TOL, min_segments: int = MIN_SEGMENTS,
+                   precision: int = 3) -> Iterator[str]:
+    """Строки программы с дугами вместо цепочек G1 (строки без '\\n').
+
+    В цепочку попадают только кадры G1 (явные или модальные) из слов
+    G/X/Y/Z/F без комментариев, в режимах G90, G17 и G91.1 и с
+    неизменными Z и F. Кадр со сменой плоскости или режима центра
+    завершает цепочку.
+    После вставленной дуги ближайший кадр с координатами без G-кода
+    движения получает явный G1.
+    """
+    motion = None
+    absolute = True
+    plane, incremental_ij = 17, True
+    pos = {"X": None, "Y": None, "Z": None}
+    feed = None
+    run: List[tuple] = []       # (строка, x, y, есть ли в кадре G-код движения)
+    start = None
+    after_arc = False
+
+    def out(raw: str, has_motion: bool, has_axes: bool) -> str:
+        nonlocal after_arc
+        if after_arc and has_axes:
+            after_arc = False
+            if not has_motion:
+                return _with_g1(raw)
+        elif has_motion:
+            after_arc = False
+        return raw
+
+    def flush() -> Iterator[str]:
+        nonlocal after_arc
+        if not run:
+            return
+        pts = [start] + [(x, y) for _, x, y, _ in run]
+        done = 0
+        for arc in fit_points(pts, tol, min_segments):
+            for raw, _, _, g in run[done:arc.start]:
+                yield out(raw, g, True)
+            sx, sy = pts[arc.start]
+            ex, ey = pts[arc.stop]
+            mm = RE_N.match(run[arc.stop - 1][0].strip())
+            n = mm.group(0) if mm else ""
+            yield (f"{n}{'G2' if arc.cw else 'G3'} X{_fmt(ex, precision)} Y{_fmt(ey, precision)}"
+                   f" I{_fmt(arc.cx - sx, precision)} J{_fmt(arc.cy - sy, precision)}")
+            after_arc = True
+            done = arc.stop
+        for raw, _, _, g in run[done:]:
+            yield out(raw, g, True)
+        run.clear()
+
+    for raw in lines:
+        raw = raw.rstrip("\r\n")
+        b = parse_block(raw)
+        if b is None:
+            yield from flush()
+            yield raw
+            continue
+        w = dict(b.words)
+        has_motion = False
+        for g in b.g:
+            if g in (0, 1, 2, 3):
+                motion = g
+                has_motion = True
+            elif g == 90:
+                absolute = True
+            elif g == 91:
+                absolute = False
+        # смена плоскости или режима центра завершает цепочку
+        mode_word = any(g in (17, 18, 19, 90.1, 91.1) for g in b.g)
+        plane, incremental_ij = _arc_mode(b.g, plane, incremental_ij)
+        letters = {letter for letter, _ in b.words}
+        has_axes = bool(letters & {"X", "Y", "Z", "I", "J", "R"})
+        f = b.f[-1] if b.f else None
+        z = float(w["Z"]) if "Z" in w else None
+        x = float(w["X"]) if "X" in w else pos["X"]
+        y = float(w["Y"]) if "Y" in w else pos["Y"]
+        candidate = (motion == 1 and absolute and plane == 17 and incremental_ij
+                     and not mode_word and letters <= {"G", "X", "Y", "Z", "F"}
+                     and set(b.g) <= {1} and "(" not in b.body and ";" not in b.body
+                     and ("X" in letters or "Y" in letters)
+                     and (z is None or z == pos["Z"]) and (f is None or f == feed)
+                     and pos["X"] is not None and pos["Y"] is not None)
+        if not candidate:
+            yield from flush()
+            yield out(raw, has_motion, has_axes)
+        else:
+            if not run:
+                start = (pos["X"], pos["Y"])
+            run.append((raw, x, y, has_motion))
+        if absolute:
+            pos["X"], pos["Y"] = x, y
+            if z is not None:
+                pos["Z"] = z
+        else:
+            pos = {"X": None, "Y": None, "Z": None}
+        if f is not None:
+            feed = f
+        if any(mc in (30, 2, 99) for mc in b.m):
+            yield from flush()
+            pos = {"X": None, "Y": None, "Z": None}
+    yield from flush()
@@ -0,0 +1,133 @@
+"""batch.py — пакетная генерация программ по манифесту заданий
+
+Манифест — YAML (список заданий или {defaults: {...}, jobs: [...]}) либо
+JSONL (одно задание на строку). Задание — операция и её параметры:
+
+    - op: face            # face | round | square
+      output: out/face1.nc
+      post: posts/fanuc_ru.yaml
+      width: 100
+      length: 60
+      depth: 1
+
+Параметры совпадают с аргументами iter_face()/iter_round_pocket()/
+iter_square_pocket() (незаданные step_down, feed, spindle, tool_diam и safe
+берутся, как в CLI); start_x/start_y и center_x/center_y
+собираются в start_xy/center_xy. Относительные пути output и post
+отсчитываются от каталога манифеста.
+
+Задания выполняются в пуле процессов; профиль постпроцессора читается
+один раз на процесс, а не на каждое задание, траектории берутся из
+кэша геометрии процесса (fanout.GEOMETRY).
+"""
+from __future__ import annotations
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, NamedTuple, Optional
+
+from .core import write_program
+from .fanout import GEOMETRY, TOOLPATHS
+from .post import PostProfile
+
+# Значения по умолчанию — как у команд CLI
+JOB_DEFAULTS = {"step_down": 0.5, "feed": 800.0, "spindle": 10000, "tool_diam": 10.0, "safe": 5.0}
+
+# Ключи задания, которые не передаются в генератор
+SERVICE_KEYS = ("op", "output", "post", "modal", "name")
+
+class JobResult(NamedTuple):
+    index: int
+    name: str
+    output: str
+    seconds: float
+    size: int               # записано символов
+    error: Optional[str]
+
+def load_jobs(path: str) -> List[dict]:
+    """Прочитать манифест (.yaml/.yml или .jsonl) в список заданий."""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(".jsonl"):
+            data = [json.loads(s) for s in f if s.strip()]
+        else:
+            import yaml
+            data = yaml.safe_load(f) or []
+    defaults = {}
+    if isinstance(data, dict):
+        defaults = data.get("defaults") or {}
+        data = data.get("jobs") or []
+    if not isinstance(data, list):
+        raise ValueError(f"Манифест {path}: ожидается список заданий")
+    jobs = []
+    for i, spec in enumerate(data, 1):
+        if not isinstance(spec, dict):
+            raise ValueError(f"Манифест {path}: задание #{i} — не словарь")
+        job = {**JOB_DEFAULTS, **defaults, **spec}
+        for key in ("output", "post"):
+            if job.get(key):
+                job[key] = os.path.join(base, job[key])
+        jobs.append(job)
+    return jobs
+
+# Профили постпроцессора, уже прочитанные этим процессом: (путь, modal) -> профиль
+_posts: dict[tuple, PostProfile] = {}
+
+def _post_for(path: Optional[str], modal: Optional[bool]) -> PostProfile:
+    profile = _posts.get((path, modal))
+    if profile is None:
+        profile = PostProfile.from_yaml(path) if path else PostProfile.default()
+        if modal is not None:
+            profile = profile.replace(modal=modal)
+        _posts[(path, modal)] = profile
+    # генератор сам берёт у профиля новый контекст вывода на программу
+    return profile
+
+def _job_args(job: dict) -> dict:
+    args = {k: v for k, v in job.items() if k not in SERVICE_KEYS}
+    for prefix in ("start", "center"):
+        if f"{prefix}_x" in args or f"{prefix}_y" in args:
+            args[f"{prefix}_xy"] = (args.pop(f"{prefix}_x", 0.0), args.pop(f"{prefix}_y", 0.0))
+        elif f"{prefix}_xy" in args:
+            args[f"{prefix}_xy"] = tuple(args[f"{prefix}_xy"])
+    return args
+
+def run_job(index: int, job: dict) -> JobResult:
+    """Выполнить одно задание; ошибка задания не прерывает пакет."""
+    op = job.get("op", "")
+    name = str(job.get("name") or op)
+    output = job.get("output") or ""
+    t0 = time.perf_counter()
+    try:
+        if op not in TOOLPATHS:
+            raise ValueError(f"Неизвестная операция: {op!r}")
+        if not output:
+            raise ValueError("Не указан output")
+        folder = os.path.dirname(output)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        pp = _post_for(job.get("post"), job.get("modal"))
+        # геометрия из кэша процесса: задания, отличающиеся только постом,
+        # подачей или оборотами, её не пересчитывают
+        tp = GEOMETRY.toolpath(op, **_job_args(job))
+        size = write_program(pp.emitter().iter_program(tp), output)
+    except Exception as e:
+        return JobResult(index, name, output, time.perf_counter() - t0, 0, f"{type(e).__name__}: {e}")
+    return JobResult(index, name, output, time.perf_counter() - t0, size, None)
+
+def run_batch(jobs: List[dict], workers: int = 0) -> Iterator[JobResult]:
+    """Выполнить задания в пуле из workers процессов (0 — по числу ядер).
+
+    Результаты выдаются в порядке заданий. workers=1 — без пула, в текущем
+    процессе.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        yield from (run_job(i, job) for i, job in enumerate(jobs, 1))
+        return
+    workers = min(workers, len(jobs))
+    # мелкие задания отдаём пачками, чтобы не платить пересылкой за каждое
+    chunk = max(1, len(jobs) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(run_job, range(1, len(jobs) + 1), jobs, chunksize=chunk)
@@ -0,0 +1,182 @@
+"""cache.py — дисковый кэш готовых программ
+
+Ключ — sha256 от имени операции, всех параметров генератора и полей
+PostConfig, поэтому одинаковые задания с одинаковым постом дают один файл.
+Дата в шапке ({date}) в кэше хранится меткой и подставляется при выдаче,
+так что программа из кэша совпадает со свежесгенерированной.
+
+Размер кэша ограничен: при превышении удаляются давно не использованные
+файлы (LRU по времени изменения, которое обновляется при каждом попадании).
+Счётчики попаданий/промахов лежат в stats.json рядом с программами.
+"""
+from __future__ import annotations
+import datetime as _dt
+import hashlib
+import inspect
+import json
+import os
+import re
+from dataclasses import asdict
+from typing import Optional
+
+from .core import iter_face, iter_round_pocket, iter_square_pocket, _program, _emitter
+from .post import PostProcessor, PostProfile, cache_dir
+
+GENERATORS = {
+    "face": iter_face,
+    "round_pocket": iter_round_pocket,
+    "square_pocket": iter_square_pocket,
+}
+
+# Менять при изменении вывода генераторов: старые записи перестанут совпадать
+CACHE_FORMAT = 2
+DEFAULT_MAX_BYTES = 256 << 20
+
+_RE_DATE = re.compile("\x00DATE:([^\x00]*)\x00")
+
+class _DateMark:
+    """Подставляется вместо даты: запоминает формат ({date:%d.%m.%Y})."""
+    def __format__(self, spec: str) -> str:
+        return f"\x00DATE:{spec}\x00"
+
+    def __str__(self) -> str:
+        return "\x00DATE:\x00"
+
+def default_dir() -> str:
+    return os.path.join(cache_dir(), "programs")
+
+class ProgramCache:
+    """Кэш программ в каталоге path, не больше max_bytes байт."""
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path or default_dir()
+        self.max_bytes = max_bytes
+        self.last_hit = False
+        os.makedirs(self.path, exist_ok=True)
+
+    # ---------- ключ ----------
+    @staticmethod
+    def key(op: str, params: dict, post: PostProcessor) -> str:
+        data = {"format": CACHE_FORMAT, "op": op, "params": params, "post": asdict(post.cfg)}
+        raw = json.dumps(data, sort_keys=True, default=repr).encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key + ".nc")
+
+    # ---------- генерация ----------
+    def generate(self, op: str, *args, post: PostProcessor | PostProfile | None = None, **kwargs) -> str:
+        """Программа как generate_*(): из кэша или сгенерированная и сохранённая.
+
+        op — "face", "round_pocket" или "square_pocket"; остальные параметры —
+        как у соответствующего iter_*().
+        """
+        gen = GENERATORS.get(op)
+        if gen is None:
+            raise ValueError(f"Неизвестная операция: {op!r}")
+        post = _emitter(post)
+        bound = inspect.signature(gen).bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = dict(bound.arguments)
+        params.pop("post", None)
+        params.update(params.pop("opts", {}))
+        key = self.key(op, params, post)
+
+        text = self._load(key)
+        self.last_hit = text is not None
+        if text is None:
+            date, post.date = post.date, _DateMark()
+            try:
+                text = _program(gen(post=post, **params))
+            finally:
+                post.date = date
+            self._store(key, text)
+        self._count("hits" if self.last_hit else "misses")
+        today = _dt.date.today() if post.date is None else post.date
+        return _RE_DATE.sub(lambda mm: format(today, mm.group(1)), text)
+
+    def _load(self, key: str) -> Optional[str]:
+        fn = self._file(key)
+        try:
+            with open(fn, "r", encoding="utf-8", newline="") as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(fn)  # отметка для LRU
+        except OSError:
+            pass
+        return text
+
+    def _store(self, key: str, text: str) -> None:
+        fn = self._file(key)
+        tmp = f"{fn}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        os.replace(tmp, fn)
+        self._evict()
+
+    # ---------- LRU ----------
+    def _entries(self) -> list[tuple[float, int, str]]:
+        out = []
+        with os.scandir(self.path) as it:
+            for e in it:
+                if e.name.endswith(".nc"):
+                    st = e.stat()
+                    out.append((st.st_mtime, st.st_size, e.path))
+        return out
+
+    def _evict(self) -> None:
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for _, size, fn in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(fn)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        self._count("evictions", evicted)
+
+    def clear(self) -> None:
+        for _, _, fn in self._entries():
+            os.remove(fn)
+        self._save_stats({})
+
+    # ---------- статистика ----------
+    def _stats_file(self) -> str:
+        return os.path.join(self.path, "stats.json")
+
+    def _load_stats(self) -> dict:
+        try:
+            with open(self._stats_file(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_stats(self, stats: dict) -> None:
+        tmp = f"{self._stats_file()}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+        os.replace(tmp, self._stats_file())
+
+    def _count(self, name: str, n: int = 1) -> None:
+        # счётчики приблизительны при одновременной работе нескольких процессов
+        stats = self._load_stats()
+        stats[name] = stats.get(name, 0) + n
+        self._save_stats(stats)
+
+    def stats(self) -> dict:
+        """hits, misses, evictions, entries, bytes, max_bytes."""
+        stats = {"hits": 0, "misses": 0, "evictions": 0}
+        stats.update(self._load_stats())
+        entries = self._entries()
+        stats["entries"] = len(entries)
+        stats["bytes"] = sum(size for _, size, _ in entries)
+        stats["max_bytes"] = self.max_bytes
+        return stats
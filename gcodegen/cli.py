@@ -1,21 +1,102 @@
 """cli.py — Typer CLI с поддержкой RU/EN"""
-import os, sys
+import os
+import time
 import typer
-from rich.console import Console
-from rich.table import Table
 
-from .core import generate_face, generate_round_pocket, generate_square_pocket, help_text
-from .post import PostProcessor
-from .validator import validate_gcode
+from .compress import open_text
+from .core import help_text, write_program, iter_face, iter_round_pocket, iter_square_pocket
+from .post import PostProcessor, PostProfile
 from .i18n import tr
 
+# rich, yaml, пул процессов и т.п. импортируются внутри команд, которым они
+# нужны: короткий запуск face/round/square не платит за их загрузку
+
 LANG = os.getenv("GCODEGEN_LANG", "ru").lower()
 
 app = typer.Typer(help=tr(LANG, "app_help"))
-console = Console()
+GENERATORS = {"face": iter_face, "round_pocket": iter_round_pocket, "square_pocket": iter_square_pocket}
+
+def _console():
+    from rich.console import Console
+    return Console()
+
+def _load_post(path: str | None, modal: bool | None = None) -> PostProcessor:
+    profile = PostProfile.from_yaml(path) if path else PostProfile.default()
+    if modal is not None:
+        profile = profile.replace(modal=modal)
+    return profile.emitter()
+
+def _report_modal(pp: PostProcessor) -> None:
+    """Сколько байт сэкономило модальное сжатие (в stderr, чтобы не портить вывод)."""
+    if pp.cfg.modal:
+        typer.echo(tr(LANG, "modal_saved").format(n=pp.bytes_saved), err=True)
 
-def _load_post(path: str | None) -> PostProcessor:
-    return PostProcessor.from_yaml(path) if path else PostProcessor.default()
+def _report_stats(st) -> None:
+    """Отчёт --stats в stderr."""
+    typer.echo(tr(LANG, "stats_title"), err=True)
+    for name, value in st.report():
+        typer.echo(f"  {name:24s} {value}", err=True)
+
+def _fan_out(op: str, posts: list[str], modal: bool | None, output: str | None, *args, **kwargs) -> None:
+    """Одна траектория -> программа под каждый профиль (файлы <output>.<профиль>.nc)."""
+    import inspect
+    from .fanout import TOOLPATHS, check_outputs, fan_out, output_for
+    named = inspect.signature(TOOLPATHS[op]).bind(*args, **kwargs).arguments
+    outputs = [output_for(output, op, p) for p in posts]
+    try:
+        check_outputs(posts, outputs)
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--post") from None
+    for r in fan_out(op, posts, outputs, modal=modal, **named):
+        typer.echo(tr(LANG, "fanout_written").format(
+            post=r.post, output=r.output, size=r.size, t=r.seconds), err=True)
+
+def _emit(op: str, post: list[str], modal: bool | None, output: str | None, cache: bool,
+          cache_dir: str | None, cache_stats: bool, stats: bool, profile: str | None,
+          *args, **kwargs) -> None:
+    """Сгенерировать программу (или взять из кэша) и записать её."""
+    if len(post) > 1:
+        _fan_out(op, post, modal, output, *args, **kwargs)
+        return
+    from .stats import Stats, profile as _profile
+    pp = _load_post(post[0] if post else None, modal)
+    st = Stats() if stats else None
+    if cache or cache_stats:
+        from .cache import ProgramCache
+        pc = ProgramCache(cache_dir)
+    with _profile(profile):
+        if cache:
+            t0 = time.perf_counter()
+            text = pc.generate(op, *args, post=pp, **kwargs)
+            blocks = (text[:-1],)
+            if st:
+                st.add_time("cache", time.perf_counter() - t0)
+                for b in text[:-1].split("\n"):
+                    st.count_block(b)
+        elif st:
+            # траектория строится сразу при вызове iter_*, форматирование —
+            # по мере чтения блоков, остальное время записи — I/O
+            with st.phase("geometry"):
+                blocks = GENERATORS[op](*args, post=pp, **kwargs)
+            pp.attach_stats(st)
+            blocks = st.timed(blocks, "format")
+        else:
+            blocks = GENERATORS[op](*args, post=pp, **kwargs)
+        t0 = time.perf_counter()
+        size = write_program(blocks, output)
+        if st:
+            st.add_time("io", time.perf_counter() - t0 - st.phases.get("format", 0.0))
+            st.bytes = size
+    if not cache or not pc.last_hit:
+        _report_modal(pp)
+    if cache_stats:
+        cs = pc.stats()
+        typer.echo(tr(LANG, "cache_stats").format(
+            mb=cs["bytes"] / 2**20, max_mb=cs["max_bytes"] / 2**20, **cs), err=True)
+    if st:
+        _report_stats(st)
+    if profile:
+        typer.echo(tr(LANG, "profile_saved").format(path=profile), err=True)
 
 @app.command(help=tr(LANG, "cmd_face_help"))
 def face(
@@ -30,46 +111,19 @@ def face(
 
     start_x: float = typer.Option(0.0),
     start_y: float = typer.Option(0.0),
-    post: str | None = typer.Option(None, help="YAML post"),
+    post: list[str] = typer.Option([], "--post", help=tr(LANG, "opt_posts")),
     output: str | None = typer.Option(None, help="Output file"),
+    modal: bool | None = typer.Option(None, "--modal/--no-modal", help=tr(LANG, "opt_modal")),
+    subprogram: bool = typer.Option(False, "--subprogram/--no-subprogram", help=tr(LANG, "opt_subprogram")),
+    cache: bool = typer.Option(False, "--cache/--no-cache", help=tr(LANG, "opt_cache")),
+    cache_dir: str | None = typer.Option(None, help=tr(LANG, "opt_cache_dir")),
+    cache_stats: bool = typer.Option(False, "--cache-stats", help=tr(LANG, "opt_cache_stats")),
+    stats: bool = typer.Option(False, "--stats", help=tr(LANG, "opt_stats")),
+    profile: str | None = typer.Option(None, "--profile", help=tr(LANG, "opt_profile")),
 ):
-    pp = _load_post(post)
-    code = generate_face(width, length, depth, step_down, feed, spindle, tool_diam, safe, (start_x, start_y), pp)
-    if output:
-        with open(output, "w", encoding="utf-8") as f:
-            f.write(code)
-    else:
-        sys.stdout.write(code)
-
-@app.command(name="round", help=tr(LANG, "cmd_round_help"))
-def round_pocket(
-    diameter: float = typer.Option(..., help="Диаметр кармана, мм"),
-    depth: float = typer.Option(..., help="Глубина, мм"),
-    step_down: float = typer.Option(0.5, help="Шаг по Z, мм"),
-    feed: float = typer.Option(800.0, help="Подача, мм/мин"),
-    spindle: int = typer.Option(10000, help="Обороты шпинделя"),
-    tool_diam: float = typer.Option(10.0, help="Диаметр фрезы, мм"),
-    safe: float = typer.Option(5.0, help="Безопасная высота Z, мм"),
-    center_x: float = typer.Option(0.0, help="Центр X"),
-    center_y: float = typer.Option(0.0, help="Центр Y"),
-    post: str | None = typer.Option(None, help="YAML пост"),
-    output: str | None = typer.Option(None, help="Файл вывода"),
-    cw: bool = typer.Option(True, "--cw/--ccw", help="CW=G12, CCW=G13"),
-    start_r: float = typer.Option(None, help="Начальный радиус I (мм)"),
-    radial_step: float = typer.Option(None, help="Радиальный шаг Q (мм)")
-):
-    pp = _load_post(post)
-    code = generate_round_pocket(
-        diameter, depth, step_down, feed, spindle, tool_diam, safe,
-        (center_x, center_y), pp,
-        cw=cw, start_r=start_r, radial_step=radial_step
-    )
-    if output:
-        with open(output, "w", encoding="utf-8") as f:
-            f.write(code)
-    else:
-        sys.stdout.write(code)
-
+    _emit("face", post, modal, output, cache, cache_dir, cache_stats, stats, profile,
+          width, length, depth, step_down, feed, spindle, tool_diam, safe, (start_x, start_y),
+          subprogram=subprogram)
 
 @app.command(name="round", help=tr(LANG, "cmd_round_help"))
 def round_pocket(
@@ -84,20 +138,23 @@ def round_pocket(
     center_y: float = typer.Option(0.0, help="Центр Y"),
     stepover_ratio: float = typer.Option(0.6, help="Степовер, доля D инструмента"),
     cw: bool = typer.Option(True, "--cw/--ccw", help="CW=G2, CCW=G3"),
-    post: str | None = typer.Option(None, help="YAML пост"),
+    strategy: str = typer.Option("rings", help=tr(LANG, "opt_strategy")),
+    helix: bool = typer.Option(False, "--helix/--no-helix", help=tr(LANG, "opt_helix")),
+    ramp_angle: float = typer.Option(3.0, help=tr(LANG, "opt_ramp_angle")),
+    post: list[str] = typer.Option([], "--post", help=tr(LANG, "opt_posts")),
     output: str | None = typer.Option(None, help="Файл вывода"),
+    modal: bool | None = typer.Option(None, "--modal/--no-modal", help=tr(LANG, "opt_modal")),
+    cache: bool = typer.Option(False, "--cache/--no-cache", help=tr(LANG, "opt_cache")),
+    cache_dir: str | None = typer.Option(None, help=tr(LANG, "opt_cache_dir")),
+    cache_stats: bool = typer.Option(False, "--cache-stats", help=tr(LANG, "opt_cache_stats")),
+    stats: bool = typer.Option(False, "--stats", help=tr(LANG, "opt_stats")),
+    profile: str | None = typer.Option(None, "--profile", help=tr(LANG, "opt_profile")),
 ):
-    pp = _load_post(post)
-    code = generate_round_pocket(
-        diameter, depth, step_down, feed, spindle, tool_diam, safe,
-        (center_x, center_y), pp,
-        stepover_ratio=stepover_ratio, cw=cw
-    )
-    if output:
-        with open(output, "w", encoding="utf-8") as f:
-            f.write(code)
-    else:
-        sys.stdout.write(code)
+    _emit("round_pocket", post, modal, output, cache, cache_dir, cache_stats, stats, profile,
+          diameter, depth, step_down, feed, spindle, tool_diam, safe,
+          (center_x, center_y),
+          stepover_ratio=stepover_ratio, cw=cw, strategy=strategy, helix=helix, ramp_angle=ramp_angle)
+
 @app.command(name="square", help=tr(LANG, "cmd_square_help"))
 def square(
     width: float = typer.Option(...),
@@ -110,38 +167,262 @@ def square(
     safe: float = typer.Option(5.0),
     start_x: float = typer.Option(0.0),
     start_y: float = typer.Option(0.0),
-    post: str | None = typer.Option(None),
+    post: list[str] = typer.Option([], "--post", help=tr(LANG, "opt_posts")),
     output: str | None = typer.Option(None),
+    modal: bool | None = typer.Option(None, "--modal/--no-modal", help=tr(LANG, "opt_modal")),
+    subprogram: bool = typer.Option(False, "--subprogram/--no-subprogram", help=tr(LANG, "opt_subprogram")),
+    cache: bool = typer.Option(False, "--cache/--no-cache", help=tr(LANG, "opt_cache")),
+    cache_dir: str | None = typer.Option(None, help=tr(LANG, "opt_cache_dir")),
+    cache_stats: bool = typer.Option(False, "--cache-stats", help=tr(LANG, "opt_cache_stats")),
+    stats: bool = typer.Option(False, "--stats", help=tr(LANG, "opt_stats")),
+    profile: str | None = typer.Option(None, "--profile", help=tr(LANG, "opt_profile")),
 ):
-    pp = _load_post(post)
-    code = generate_square_pocket(
-        width, length, depth, step_down, feed, spindle, tool_diam, safe,
-        (start_x, start_y), pp
-    )
-    if output:
-        with open(output, "w", encoding="utf-8") as f:
-            f.write(code)
-    else:
-        sys.stdout.write(code)
-@app.command(help=tr(LANG, "cmd_validate_help"))
-def validate(file: str = typer.Argument(...)):
-    with open(file, "r", encoding="utf-8") as f:
-        txt = f.read()
-    warns = validate_gcode(txt, LANG)
+    _emit("square_pocket", post, modal, output, cache, cache_dir, cache_stats, stats, profile,
+          width, length, depth, step_down, feed, spindle, tool_diam, safe,
+          (start_x, start_y), subprogram=subprogram)
+
+def _print_warns(console, warns: list) -> bool:
+    """Таблица предупреждений (или OK); True — предупреждений нет."""
     if not warns:
         console.print(f"[green]{tr(LANG,'validate_ok')}[/green]")
-        raise typer.Exit(0)
+        return True
+    from rich.table import Table
     table = Table(title=tr(LANG, 'validate_title'))
     table.add_column("#", justify="right")
     table.add_column("Message", justify="left")
     for i,w in enumerate(warns,1):
         table.add_row(str(i), w)
     console.print(table)
-    raise typer.Exit(1)
+    return False
+
+def _watch(console, file: str, rules, interval: float = 0.2) -> None:
+    """Перепроверять файл при каждом сохранении — только изменённый участок."""
+    from .validator import IncrementalValidator
+    v = None
+    seen = None
+    try:
+        while True:
+            st = os.stat(file)
+            if (st.st_mtime_ns, st.st_size) != seen:
+                seen = (st.st_mtime_ns, st.st_size)
+                with open_text(file) as f:
+                    lines = list(f)
+                t0 = time.perf_counter()
+                if v is None:
+                    v = IncrementalValidator(lines, LANG, rules=rules)
+                else:
+                    v.update(lines)
+                warns = v.warnings()
+                dt = time.perf_counter() - t0
+                _print_warns(console, warns)
+                typer.echo(tr(LANG, "watch_rescanned").format(n=v.rescanned, total=len(v), ms=dt * 1e3), err=True)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+@app.command(help=tr(LANG, "cmd_validate_help"))
+def validate(
+    file: str = typer.Argument(...),
+    jobs: int = typer.Option(1, "--jobs", "-j", help=tr(LANG, "opt_jobs")),
+    stats: bool = typer.Option(False, "--stats", help=tr(LANG, "opt_stats")),
+    profile: str | None = typer.Option(None, "--profile", help=tr(LANG, "opt_profile")),
+    watch: bool = typer.Option(False, "--watch", help=tr(LANG, "opt_watch")),
+    post: str | None = typer.Option(None, help=tr(LANG, "opt_validate_post")),
+    disable_rule: list[str] = typer.Option([], "--disable-rule", help=tr(LANG, "opt_disable_rule")),
+    rule_timings: bool = typer.Option(False, "--rule-timings", help=tr(LANG, "opt_rule_timings")),
+):
+    from .validator import RuleSet, validate_file, validate_lines
+    from .stats import Stats, profile as _profile
+    console = _console()
+    cfg = PostProfile.from_yaml(post).cfg if post else None
+    try:
+        rules = RuleSet.from_config(cfg) if cfg else RuleSet()
+        if disable_rule:
+            rules = RuleSet(rules.names, disable_rule, rules.known_g, rules.known_m)
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--disable-rule") from None
+    if rule_timings:
+        # время правил считается в этом процессе — без пула
+        rules = rules.timed()
+        jobs = 1
+    if watch:
+        _watch(console, file, rules)
+        return
+    st = Stats() if stats else None
+    with _profile(profile):
+        if st and jobs == 1:
+            # счётчики строк — обёрткой над потоком строк, сам цикл не меняется
+            with st.phase("validate"), open_text(file) as f:
+                warns = validate_lines(st.count_lines(f), LANG, rules=rules)
+        elif st:
+            with st.phase("validate"):
+                warns = validate_file(file, LANG, jobs=jobs, rules=rules)
+            st.bytes = os.path.getsize(file)
+        else:
+            warns = validate_file(file, LANG, jobs=jobs, rules=rules)
+    if st:
+        _report_stats(st)
+    if rule_timings:
+        typer.echo(tr(LANG, "rule_timings_title"), err=True)
+        for name, (calls, sec) in sorted(rules.timings.items(), key=lambda kv: -kv[1][1]):
+            typer.echo(f"  {name:24s} {calls:>10d} {sec * 1e3:>10.1f} ms", err=True)
+    if profile:
+        typer.echo(tr(LANG, "profile_saved").format(path=profile), err=True)
+    raise typer.Exit(0 if _print_warns(console, warns) else 1)
+
+@app.command(help=tr(LANG, "cmd_batch_help"))
+def batch(
+    manifest: str = typer.Argument(...),
+    jobs: int = typer.Option(0, "--jobs", "-j", help=tr(LANG, "opt_workers")),
+):
+    from rich.table import Table
+    from .batch import load_jobs, run_batch
+    console = _console()
+    specs = load_jobs(manifest)
+    t0 = time.perf_counter()
+    table = Table(title=tr(LANG, "batch_title"))
+    table.add_column("#", justify="right")
+    table.add_column("Job", justify="left")
+    table.add_column("Output", justify="left")
+    table.add_column("ms", justify="right")
+    table.add_column("KB", justify="right")
+    table.add_column("Status", justify="left")
+    total = failed = 0
+    for r in run_batch(specs, jobs):
+        total += r.size
+        failed += r.error is not None
+        table.add_row(str(r.index), r.name, r.output, f"{r.seconds * 1000:.1f}",
+                      f"{r.size / 1024:.1f}", r.error or "OK")
+    wall = time.perf_counter() - t0
+    console.print(table)
+    console.print(tr(LANG, "batch_summary").format(
+        n=len(specs), err=failed, t=wall,
+        rate=len(specs) / wall if wall else 0.0,
+        mb=total / wall / 1e6 if wall else 0.0))
+    raise typer.Exit(1 if failed else 0)
+
+@app.command(help=tr(LANG, "cmd_compose_help"))
+def compose(
+    manifest: str = typer.Argument(...),
+    post: str | None = typer.Option(None, help="YAML post"),
+    output: str | None = typer.Option(None, help="Output file"),
+    modal: bool | None = typer.Option(None, "--modal/--no-modal", help=tr(LANG, "opt_modal")),
+    optimize: bool = typer.Option(True, "--optimize/--no-optimize", help=tr(LANG, "opt_optimize")),
+):
+    from .batch import load_jobs
+    from .compose import iter_compose
+    pp = _load_post(post, modal)
+    report = []
+    write_program(iter_compose(load_jobs(manifest), pp, optimize, report), output)
+    r = report[0]
+    typer.echo(tr(LANG, "compose_report").format(
+        n=r.features, tools=r.tools, before=r.rapid_before, after=r.rapid_after, saved=r.saved), err=True)
+    _report_modal(pp)
+
+@app.command(help=tr(LANG, "cmd_arcfit_help"))
+def arcfit(
+    file: str = typer.Argument(...),
+    output: str | None = typer.Option(None, help="Output file"),
+    tol: float = typer.Option(0.01, help=tr(LANG, "opt_arc_tol")),
+    min_segments: int = typer.Option(4, help=tr(LANG, "opt_min_segments")),
+    post: str | None = typer.Option(None, help="YAML post"),
+    precision: int | None = typer.Option(None, help=tr(LANG, "opt_arc_precision")),
+):
+    from .arcfit import fit_arcs_lines
+    if precision is None:
+        # дуги — с той же точностью, что и остальные кадры программы
+        profile = PostProfile.from_yaml(post) if post else PostProfile.default()
+        precision = profile.cfg.precision
+    counts = {"in": 0, "out": 0, "bytes": 0}
+
+    def counted(lines, key):
+        for raw in lines:
+            counts[key] += 1
+            if key == "in":
+                counts["bytes"] += len(raw)
+            yield raw
+
+    with open_text(file) as f:
+        lines = fit_arcs_lines(counted(f, "in"), tol, min_segments, precision)
+        size = write_program(counted(lines, "out"), output)
+    typer.echo(tr(LANG, "arcfit_report").format(
+        before=counts["in"], after=counts["out"], b_before=counts["bytes"], b_after=size), err=True)
+
+@app.command(help=tr(LANG, "cmd_estimate_help"))
+def estimate(
+    file: str = typer.Argument(...),
+    post: str | None = typer.Option(None, help="YAML post"),
+    rapid_rate: float | None = typer.Option(None, help=tr(LANG, "opt_rapid_rate")),
+    max_accel: float | None = typer.Option(None, help=tr(LANG, "opt_max_accel")),
+):
+    from .estimate import estimate_file, format_duration
+    profile = PostProfile.from_yaml(post) if post else PostProfile.default()
+    changes = {k: v for k, v in (("rapid_rate", rapid_rate), ("max_accel", max_accel)) if v is not None}
+    if changes:
+        profile = profile.replace(**changes)
+    e = estimate_file(file, profile)
+    typer.echo(tr(LANG, "estimate_total").format(t=format_duration(e.seconds)))
+    typer.echo(tr(LANG, "estimate_detail").format(
+        feed=format_duration(e.feed_seconds), feed_mm=e.feed_length,
+        rapid=format_duration(e.rapid_seconds), rapid_mm=e.rapid_length, moves=e.moves))
+
+def _numbers(text: str, count: int, option: str) -> list:
+    try:
+        values = [float(v) for v in text.split(",")]
+    except ValueError:
+        values = []
+    if len(values) != count:
+        raise typer.BadParameter(tr(LANG, "bad_numbers").format(n=count), param_hint=option)
+    return values
+
+@app.command(help=tr(LANG, "cmd_simulate_help"))
+def simulate(
+    file: str = typer.Argument(...),
+    tool_diam: float = typer.Option(..., help=tr(LANG, "opt_tool_diam")),
+    depth: float | None = typer.Option(None, help=tr(LANG, "opt_sim_depth")),
+    rect: str | None = typer.Option(None, help=tr(LANG, "opt_sim_rect")),
+    circle: str | None = typer.Option(None, help=tr(LANG, "opt_sim_circle")),
+    cell: float | None = typer.Option(None, help=tr(LANG, "opt_sim_cell")),
+):
+    from .simulate import Region, simulate_file
+    region = None
+    if rect:
+        region = Region("rect", *_numbers(rect, 4, "--rect"))
+    elif circle:
+        region = Region("circle", *_numbers(circle, 3, "--circle"))
+    r = simulate_file(file, tool_diam, depth, region, cell)
+    typer.echo(tr(LANG, "simulate_report").format(
+        volume=r.removed_volume, min_z=r.min_z, cell=r.cell, cells=r.heights.size))
+    failed = False
+    if depth is not None:
+        if r.gouge_area:
+            failed = True
+            typer.echo(tr(LANG, "simulate_gouge").format(area=r.gouge_area))
+        if region is not None and r.islands:
+            failed = True
+            typer.echo(tr(LANG, "simulate_uncut").format(area=r.uncut_area, islands=r.islands))
+    if r.rapids_in_stock:
+        failed = True
+        typer.echo(tr(LANG, "simulate_rapids").format(n=r.rapids_in_stock))
+    if not failed:
+        typer.echo(tr(LANG, "validate_ok"))
+    raise typer.Exit(1 if failed else 0)
+
+@app.command(help=tr(LANG, "cmd_serve_help"))
+def serve(
+    host: str = typer.Option("127.0.0.1", help=tr(LANG, "opt_host")),
+    port: int = typer.Option(8765, help=tr(LANG, "opt_port")),
+    workers: int = typer.Option(0, "--workers", "-j", help=tr(LANG, "opt_workers")),
+    post: list[str] = typer.Option([], "--post", help=tr(LANG, "opt_serve_post")),
+):
+    from .serve import serve as run
+    typer.echo(tr(LANG, "serve_started").format(host=host, port=port,
+                                                workers=workers or os.cpu_count() or 1))
+    run(host, port, workers, tuple(post))
 
 @app.command(name="helpcmd", help=tr(LANG, "cmd_help_help"))
 def helpcmd(topic: str | None = typer.Argument(None)):
-    console.print(help_text(topic))
+    typer.echo(help_text(topic))
 
 if __name__ == "__main__":
     app()
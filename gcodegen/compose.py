@@ -0,0 +1,240 @@
+"""compose.py — несколько элементов в одной программе
+
+Элементы (features) задаются как задания batch: {"op": "round",
+"diameter": 20, "depth": 3, "center_x": 40, ...}. Из траектории каждого
+элемента берётся только тело (без шапки, смены инструмента, M3/M8 и
+концовки), и элементы выводятся одной программой с общей преамбулой.
+Элементы с разным инструментом (ключ tool, иначе — по tool_diam) идут
+группами, каждая со своей сменой инструмента; M3 S... повторяется только
+при смене оборотов.
+
+Внутри группы порядок элементов подбирается так, чтобы сократить
+ускоренные перемещения между ними (от точки выхода одного элемента до
+точки входа следующего): ближайший сосед по сетке, затем 2-opt в
+скользящем окне. Проходы по Z внутри элемента не переставляются.
+"""
+from __future__ import annotations
+from math import hypot, sqrt
+from typing import Iterator, List, NamedTuple, Optional
+
+from .batch import JOB_DEFAULTS, _job_args
+from .core import SUBPROGRAM_OFFSET, _emitter
+from .fanout import TOOLPATHS
+from .post import PostProcessor, PostProfile
+from .toolpath import (Toolpath, ARC_CCW, CALL, CMD, HEADER, FOOTER, TOOL_CHANGE,
+                       SPINDLE_ON, SPINDLE_OFF, COOLANT_ON, COOLANT_OFF)
+
+# Операции преамбулы и концовки, которые у элемента отбрасываются
+PREAMBLE_OPS = (CMD, HEADER, FOOTER, TOOL_CHANGE, SPINDLE_ON, SPINDLE_OFF, COOLANT_ON, COOLANT_OFF)
+
+# Окно 2-opt: переворачиваются отрезки маршрута не длиннее WINDOW элементов
+WINDOW = 32
+MAX_PASSES = 8
+
+class Feature(NamedTuple):
+    name: str
+    tool: int
+    spindle: int
+    body: Toolpath
+    subs: list
+    entry: tuple        # (x, y) первой точки
+    exit: tuple         # (x, y) последней точки
+
+class ComposeReport(NamedTuple):
+    features: int
+    tools: int
+    rapid_before: float     # мм ускоренных XY-перемещений в исходном порядке
+    rapid_after: float      # ... после оптимизации
+
+    @property
+    def saved(self) -> float:
+        return self.rapid_before - self.rapid_after
+
+def _ends(tp: Toolpath, subs: dict) -> tuple:
+    """Точки входа и выхода по XY (с учётом подпрограмм)."""
+    pos = [None, None]
+    entry = None
+
+    def walk(t: Toolpath) -> None:
+        nonlocal entry
+        for k, (o, x, y) in enumerate(zip(t.op, t.x, t.y)):
+            if o == CALL:
+                body = subs.get(t.args[k][0])
+                if body is not None:
+                    walk(body)
+                continue
+            if o > ARC_CCW:
+                continue
+            if x == x:
+                pos[0] = x
+            if y == y:
+                pos[1] = y
+            if entry is None and None not in pos:
+                entry = tuple(pos)
+
+    walk(tp)
+    if entry is None:
+        raise ValueError("У элемента нет перемещений по XY")
+    return entry, tuple(pos)
+
+def make_feature(spec: dict, index: int = 0, tools: Optional[dict] = None) -> Feature:
+    """Траектория элемента по заданию; tools — номера инструментов по tool_diam."""
+    job = {**JOB_DEFAULTS, **spec}
+    op = job.get("op", "")
+    gen = TOOLPATHS.get(op)
+    if gen is None:
+        raise ValueError(f"Неизвестная операция: {op!r}")
+    tool = job.pop("tool", None)
+    if tool is None:
+        tools = {} if tools is None else tools
+        tool = tools.setdefault(job["tool_diam"], len(tools) + 1)
+    args = _job_args(job)
+    tp = gen(**args)
+    body = Toolpath()
+    body.extend(tp, drop=PREAMBLE_OPS)
+    entry, exit_ = _ends(body, {n: b for n, _, b in tp.subs})
+    name = str(job.get("name") or f"{op} #{index + 1}")
+    return Feature(name, int(tool), int(args["spindle"]), body, tp.subs, entry, exit_)
+
+# ---------- порядок обхода ----------
+def _dist(a: tuple, b: tuple) -> float:
+    return hypot(a[0] - b[0], a[1] - b[1])
+
+def route_length(features: List[Feature], order: List[int], start: tuple = (0.0, 0.0)) -> float:
+    """Сумма XY-расстояний: старт -> вход первого, выход -> вход следующего."""
+    total = 0.0
+    pos = start
+    for k in order:
+        total += _dist(pos, features[k].entry)
+        pos = features[k].exit
+    return total
+
+def _nearest(features: List[Feature], start: tuple) -> List[int]:
+    """Ближайший сосед; кандидаты ищутся по сетке точек входа кольцами ячеек."""
+    n = len(features)
+    xs = [f.entry[0] for f in features]
+    ys = [f.entry[1] for f in features]
+    x0, y0 = min(xs), min(ys)
+    cell = max(max(xs) - x0, max(ys) - y0) / sqrt(n) or 1.0
+    grid: dict[tuple, list] = {}
+    for k in range(n):
+        grid.setdefault((int((xs[k] - x0) / cell), int((ys[k] - y0) / cell)), []).append(k)
+    span = int(sqrt(n)) + 1
+    order: List[int] = []
+    pos = start
+    while len(order) < n:
+        px, py = pos
+        cx, cy = int((px - x0) // cell), int((py - y0) // cell)
+        # кольцо r покрывает всё ближе r * cell; искать дальше нет смысла
+        r_max = max(abs(cx), abs(cx - span), abs(cy), abs(cy - span)) + 1
+        best = -1
+        best_d = float("inf")
+        for r in range(r_max + 1):
+            if best >= 0 and best_d <= (r - 1) * cell:
+                break
+            for gx in range(cx - r, cx + r + 1):
+                for gy in ((cy - r, cy + r) if abs(gx - cx) != r else range(cy - r, cy + r + 1)):
+                    for k in grid.get((gx, gy), ()):
+                        d = hypot(xs[k] - px, ys[k] - py)
+                        if d < best_d:
+                            best, best_d = k, d
+        cell_k = grid[(int((xs[best] - x0) / cell), int((ys[best] - y0) / cell))]
+        cell_k.remove(best)
+        order.append(best)
+        pos = features[best].exit
+    return order
+
+def _two_opt(features: List[Feature], order: List[int], start: tuple) -> List[int]:
+    """Переворот отрезков маршрута в окне WINDOW, пока это сокращает путь.
+
+    Вход и выход элемента могут не совпадать, поэтому стоимость перевёрнутого
+    отрезка считается заново (накопительно по j, O(WINDOW) на позицию i).
+    """
+    ent = [f.entry for f in features]
+    ext = [f.exit for f in features]
+    n = len(order)
+    for _ in range(MAX_PASSES):
+        improved = False
+        for i in range(n - 1):
+            prev = start if i == 0 else ext[order[i - 1]]
+            head = _dist(prev, ent[order[i]])
+            fwd = rev = 0.0
+            for j in range(i + 1, min(n, i + WINDOW)):
+                a, b = order[j - 1], order[j]
+                fwd += _dist(ext[a], ent[b])
+                rev += _dist(ext[b], ent[a])
+                tail_old = _dist(ext[b], ent[order[j + 1]]) if j + 1 < n else 0.0
+                tail_new = _dist(ext[order[i]], ent[order[j + 1]]) if j + 1 < n else 0.0
+                old = head + fwd + tail_old
+                new = _dist(prev, ent[b]) + rev + tail_new
+                if new < old - 1e-9:
+                    order[i:j + 1] = order[i:j + 1][::-1]
+                    improved = True
+                    break
+        if not improved:
+            break
+    return order
+
+def plan(features: List[Feature], start: tuple = (0.0, 0.0)) -> List[int]:
+    """Порядок обхода элементов (индексы)."""
+    if not features:
+        return []
+    return _two_opt(features, _nearest(features, start), start)
+
+# ---------- сборка ----------
+def compose_toolpath(specs: List[dict], optimize: bool = True, program_number: int = 1000,
+                     comment: str = "COMPOSED") -> tuple:
+    """Одна траектория из заданий элементов; (Toolpath, ComposeReport)."""
+    tools: dict = {}
+    features = [make_feature(s, n, tools) for n, s in enumerate(specs)]
+    groups: dict[int, List[int]] = {}
+    for k, f in enumerate(features):
+        groups.setdefault(f.tool, []).append(k)
+
+    tp = Toolpath()
+    tp.header(program_number=program_number, comment=comment)
+    tp.cmd("G17 G21 G90")
+    tp.cmd("G54")
+    before = after = 0.0
+    sub_number = program_number + SUBPROGRAM_OFFSET
+    for g, (tool, members) in enumerate(groups.items()):
+        group = [features[k] for k in members]
+        order = plan(group) if optimize else list(range(len(group)))
+        before += route_length(group, list(range(len(group))))
+        after += route_length(group, order)
+        if g:
+            tp.coolant_off()
+            tp.spindle_off()
+        tp.tool_change(tool=tool)
+        spindle = group[order[0]].spindle
+        tp.spindle_on(spindle)
+        tp.coolant_on()
+        for k in order:
+            f = group[k]
+            tp.comment(f"FEATURE {f.name}")
+            if f.spindle != spindle:
+                spindle = f.spindle
+                tp.spindle_on(spindle)
+            # подпрограммы элемента получают сквозные номера
+            numbers = {}
+            for n, c, body in f.subs:
+                numbers[n] = sub_number
+                tp.subprogram(sub_number, f"{f.name} {c}", body)
+                sub_number += 1
+            for pos, a in f.body.args.items():
+                if f.body.op[pos] == CALL:
+                    f.body.args[pos] = (numbers.get(a[0], a[0]),)
+            tp.extend(f.body)
+    tp.coolant_off()
+    tp.spindle_off()
+    tp.footer()
+    return tp, ComposeReport(len(features), len(groups), before, after)
+
+def iter_compose(specs: List[dict], post: PostProcessor | PostProfile | None = None,
+                 optimize: bool = True, report: Optional[list] = None) -> Iterator[str]:
+    """Блоки составной программы; report (список) получает ComposeReport."""
+    post = _emitter(post)
+    tp, rep = compose_toolpath(specs, optimize)
+    if report is not None:
+        report.append(rep)
+    return post.iter_program(tp)
@@ -1,9 +1,16 @@
-from math import ceil, pi, cos, sin
-from typing import Tuple, List
-from .post import PostProcessor
+import sys
+from math import ceil, pi, cos, sin, tan, radians
+from itertools import chain
+from typing import Iterable, Iterator, Tuple, List
+from .compress import open_text
+from .post import PostProcessor, PostProfile
+from .toolpath import Toolpath
 
 Number = float
 
+# Номер подпрограммы слоя = номер программы + SUBPROGRAM_OFFSET
+SUBPROGRAM_OFFSET = 1000
+
 def help_text(topic: str | None = None) -> str:
     base = (
         "Доступные функции:\n"
@@ -17,70 +24,254 @@ def help_text(topic: str | None = None) -> str:
         return base + f"\nПодробнее о {topic}: см. README.md"
     return "Неизвестная тема."
 
+# Число проходов считается заранее в целых единицах сетки 10^-6 мм (мельче
+# точности любого поста), а не сравнением накопленной во float суммы
+# y += stepover с границей: на длинном растре ошибка суммы может добавить
+# или потерять проход.
+GRID = 10**6
+
+def _units(v: Number) -> int:
+    return round(v * GRID)
+
+def _check_steps(**steps: Number) -> None:
+    """ValueError, если шаг не больше нуля в единицах сетки (меньше 1e-6 мм)."""
+    for name, step in steps.items():
+        if _units(step) <= 0:
+            raise ValueError(f"Шаг {name} должен быть больше нуля (не меньше 1e-6 мм): {step}")
+
+def _count(lo: Number, hi: Number, step: Number) -> int:
+    """Число точек lo, lo + step, ... не дальше hi (step проверен _check_steps)."""
+    span = _units(hi - lo)
+    return span // _units(step) + 1 if span >= 0 else 0
+
 def _passes(depth: Number, step_down: Number) -> List[Number]:
-    n = ceil(depth / step_down)
+    n = -(-_units(depth) // _units(step_down))
     return [-(min((i+1)*step_down, depth)) for i in range(n)]
 
-def generate_face(
+# Профиль по умолчанию: один на процесс, программы получают свои контексты
+_DEFAULT_PROFILE = PostProfile()
+
+def _emitter(post: PostProcessor | PostProfile | None) -> PostProcessor:
+    """Контекст вывода программы: профиль -> новый emitter(), None -> профиль по умолчанию."""
+    if post is None:
+        return _DEFAULT_PROFILE.emitter()
+    if isinstance(post, PostProfile):
+        return post.emitter()
+    return post
+
+def _next_part(tp: Toolpath) -> Toolpath:
+    """Следующая часть программы: пустая траектория с теми же подпрограммами."""
+    part = Toolpath()
+    part.subs = tp.subs
+    return part
+
+def _join(parts: Iterator[Toolpath]) -> Toolpath:
+    """Склеить части программы в одну траекторию."""
+    tp = next(parts)
+    for part in parts:
+        tp.extend(part)
+    return tp
+
+def _stream(parts: Iterator[Toolpath], post: PostProcessor | PostProfile | None) -> Iterator[str]:
+    """Блоки программы, форматируемые по частям (проход по Z за проходом).
+
+    В памяти одновременно только одна часть, поэтому память не растёт с
+    размером программы. Первая часть строится сразу: ошибки в аргументах
+    видны при вызове, а не на первом блоке.
+    """
+    post = _emitter(post)
+    first = next(parts)
+    return chain.from_iterable(map(post.iter_program, chain((first,), parts)))
+
+def _program(blocks: Iterable[str]) -> str:
+    """Собрать программу целиком из потока блоков (пустые блоки пропускаются)."""
+    return "\n".join(filter(None, blocks)) + "\n"
+
+# Размер буфера записи: блоки копятся до этого объёма и сбрасываются одним write()
+WRITE_CHUNK = 1 << 20
+
+def write_program(blocks: Iterable[str], output: str | None) -> int:
+    """Потоковая запись программы в файл (или stdout) кусками по WRITE_CHUNK.
+
+    Результат побайтно совпадает с generate_*(), но в памяти не держится
+    больше одного куска, независимо от размера программы. Файл .gz/.xz/
+    .bz2/.zst сжимается потоком (compress.py). Возвращает число
+    записанных символов (до сжатия).
+    """
+    out = open_text(output, "w") if output else sys.stdout
+    try:
+        buf: list[str] = []
+        size = total = 0
+        for block in blocks:
+            if not block:
+                continue
+            buf.append(block)
+            size += len(block) + 1
+            if size >= WRITE_CHUNK:
+                buf.append("")
+                total += out.write("\n".join(buf))
+                buf.clear()
+                size = 0
+        buf.append("")
+        total += out.write("\n".join(buf))
+    finally:
+        if output:
+            out.close()
+    return total
+
+def _face_layer(tp: Toolpath, x0e: Number, x1e: Number, y0e: Number, y1e: Number,
+                stepover: Number, feed: Number) -> None:
+    """Один слой плоскости: зигзаг по X с шагом по Y (без движения по Z)."""
+    n = _count(y0e, y1e, stepover)
+    for k in range(n):
+        tp.feed(x=x1e if k % 2 == 0 else x0e, y=y0e + k*stepover, f=feed)
+        if k + 1 < n:
+            tp.feed(y=y0e + (k+1)*stepover, f=feed)
+
+def _face_parts(
     width: Number, length: Number, depth: Number, step_down: Number,
     feed: Number, spindle: int, tool_diam: Number, safe: Number,
     start_xy: Tuple[Number, Number] = (0.0, 0.0),
-    post: PostProcessor | None = None,
     *,
     overlap: float = 0.5,
     finish_contour: bool = True,
-) -> str:
-    if post is None: post = PostProcessor.default()
-
+    subprogram: bool = False,
+) -> Iterator[Toolpath]:
+    """Части face_toolpath(): начало программы, проходы по Z, концовка."""
     x0,y0 = start_xy
     x1,y1 = x0+width, y0+length
     extra = tool_diam * overlap
     x0e, x1e = x0 - extra, x1 + extra
     y0e, y1e = y0 - extra, y1 + extra
     stepover = tool_diam*0.6
-    g=[]; emit=g.append
-    emit(post.header(program_number=1000, comment="FACE"))
-    emit(post.line({"cmd":"G17 G21 G90"}))
-    emit(post.line({"cmd":"G54"}))
-    emit(post.tool_change(tool=1))
-    emit(post.spindle_on(spindle))
-    emit(post.coolant_on())
-    emit(post.rapid(z=safe))
-    emit(post.rapid(x=x0,y=y0))
-    emit(post.rapid(x=x0e, y=y0e))
+    _check_steps(step_down=step_down, stepover=stepover)
+    tp = Toolpath()
+    tp.header(program_number=1000, comment="FACE")
+    tp.cmd("G17 G21 G90")
+    tp.cmd("G54")
+    tp.tool_change(tool=1)
+    tp.spindle_on(spindle)
+    tp.coolant_on()
+    tp.rapid(z=safe)
+    tp.rapid(x=x0,y=y0)
+    tp.rapid(x=x0e, y=y0e)
+    if subprogram:
+        layer = Toolpath()
+        _face_layer(layer, x0e, x1e, y0e, y1e, stepover, feed)
+        tp.subprogram(1000 + SUBPROGRAM_OFFSET, "FACE LAYER", layer)
     for i, z in enumerate(_passes(depth, step_down), 1):
-        emit(post.comment(f"PASS {i} Z{z:.3f}"))
-        emit(post.feed_move(z=z, feed=feed))
-        direction = 1
-        y = y0e
-        while y <= y1e + 1e-6:
-            if direction > 0:
-                emit(post.feed_move(x=x1e, y=y, feed=feed))
-            else:
-                emit(post.feed_move(x=x0e, y=y, feed=feed))
-            y += stepover
-            direction *= -1
-            if y <= y1e + 1e-6:
-                emit(post.feed_move(y=y, feed=feed))
-
-    emit(post.rapid(z=safe))
-    emit(post.coolant_off())
-    emit(post.spindle_off())
-    emit(post.footer())
-    return "\n".join(filter(None,g))+"\n"
+        yield tp
+        tp = _next_part(tp)
+        tp.comment(f"PASS {i} Z{z:.3f}")
+        tp.feed(z=z, f=feed)
+        if subprogram:
+            tp.call(1000 + SUBPROGRAM_OFFSET)
+        else:
+            _face_layer(tp, x0e, x1e, y0e, y1e, stepover, feed)
 
+    tp.rapid(z=safe)
+    tp.coolant_off()
+    tp.spindle_off()
+    tp.footer()
+    yield tp
 
+def face_toolpath(
+    width: Number, length: Number, depth: Number, step_down: Number,
+    feed: Number, spindle: int, tool_diam: Number, safe: Number,
+    start_xy: Tuple[Number, Number] = (0.0, 0.0),
+    *,
+    overlap: float = 0.5,
+    finish_contour: bool = True,
+    subprogram: bool = False,
+) -> Toolpath:
+    """Фрезеровка плоскости: геометрия программы без форматирования.
+
+    subprogram=True — растр по XY выводится один раз подпрограммой
+    (номер 2000) и вызывается на каждом проходе по Z.
+    """
+    return _join(_face_parts(
+        width, length, depth, step_down, feed, spindle, tool_diam, safe, start_xy,
+        overlap=overlap, finish_contour=finish_contour, subprogram=subprogram,
+    ))
+
+def iter_face(
+    width: Number, length: Number, depth: Number, step_down: Number,
+    feed: Number, spindle: int, tool_diam: Number, safe: Number,
+    start_xy: Tuple[Number, Number] = (0.0, 0.0),
+    post: PostProcessor | PostProfile | None = None,
+    **opts,
+) -> Iterator[str]:
+    """Фрезеровка плоскости: блоки программы выдаются по одному.
+    Опции (overlap, finish_contour) — как у face_toolpath().
 
+    post — PostProcessor или PostProfile; с профилем каждая программа
+    получает свой контекст вывода, и один профиль можно отдавать в потоки.
+    """
+    return _stream(_face_parts(width, length, depth, step_down, feed, spindle, tool_diam, safe, start_xy, **opts), post)
 
-def generate_round_pocket(
+def generate_face(
+    width: Number, length: Number, depth: Number, step_down: Number,
+    feed: Number, spindle: int, tool_diam: Number, safe: Number,
+    start_xy: Tuple[Number, Number] = (0.0, 0.0),
+    post: PostProcessor | PostProfile | None = None,
+    *,
+    overlap: float = 0.5,
+    finish_contour: bool = True,
+    subprogram: bool = False,
+) -> str:
+    """Фрезеровка плоскости: программа одной строкой. Параметры — как у iter_face()."""
+    return _program(iter_face(
+        width, length, depth, step_down, feed, spindle, tool_diam, safe, start_xy, post,
+        overlap=overlap, finish_contour=finish_contour, subprogram=subprogram,
+    ))
+
+
+
+
+def _helix(tp: Toolpath, cx: Number, cy: Number, r: Number, z_top: Number, z: Number,
+           ramp_angle: float, cw: bool, feed: Number) -> None:
+    """Винтовое врезание от z_top до z полными витками радиуса r (старт справа от центра)."""
+    pitch = 2 * pi * r * tan(radians(ramp_angle))
+    turns = max(1, ceil((z_top - z) / pitch - 1e-9))
+    for k in range(1, turns + 1):
+        tp.arc(cw, cx + r, cy, -r, 0.0, f=feed, z=z_top - (z_top - z) * k / turns)
+
+def _spiral_layer(tp: Toolpath, cx: Number, cy: Number, r0: Number, r_final: Number,
+                  stepover: Number, cw: bool, feed: Number) -> None:
+    """Спираль Архимеда от r0 до r_final полуокружностями и окружность по краю.
+
+    Полуокружности соединяют точки на оси X по разные стороны от центра,
+    радиус растёт на stepover/2 за полвитка; центры дуг смещены на ±stepover/4,
+    поэтому в стыках касательные совпадают и движение не прерывается.
+    """
+    x, side = cx + r0, 1
+    # n == 0, если r_final больше r0 меньше чем на допуск: только окружность по краю
+    n = max(0, -(-2 * _units(r_final - r0) // _units(stepover)))
+    if n > 0:
+        step = (r_final - r0) / n
+        for k in range(1, n + 1):
+            r = r0 + k * step
+            side = -side
+            nx = cx + side * r
+            tp.arc(cw, nx, cy, (nx - x) / 2, 0.0, f=feed)
+            x = nx
+    # чистовая окружность по краю кармана
+    tp.arc(cw, x, cy, cx - x, 0.0, f=feed)
+
+def _round_pocket_parts(
     diameter: float, depth: float, step_down: float,
     feed: float, spindle: int, tool_diam: float, safe: float,
     center_xy: Tuple[float, float] = (0.0, 0.0),
-    post: PostProcessor | None = None,
-    *, stepover_ratio: float = 0.6, cw: bool = True
-) -> str:
-    if post is None:
-        post = PostProcessor.default()
+    *, stepover_ratio: float = 0.6, cw: bool = True,
+    strategy: str = "rings", helix: bool = False, ramp_angle: float = 3.0,
+) -> Iterator[Toolpath]:
+    """Части round_pocket_toolpath(): начало программы, проходы по Z, концовка."""
+    if strategy not in ("rings", "spiral"):
+        raise ValueError(f"Неизвестная стратегия: {strategy!r}")
+    if helix and ramp_angle <= 0:
+        raise ValueError("Угол врезания по винту должен быть больше нуля.")
+    if stepover_ratio <= 0:
+        raise ValueError("Доля шага stepover_ratio должна быть больше нуля.")
 
     cx, cy = center_xy
     tool_r = tool_diam / 2.0
@@ -89,71 +280,148 @@ def generate_round_pocket(
         raise ValueError("Диаметр кармана должен быть больше диаметра фрезы.")
 
     stepover = tool_diam * stepover_ratio
-    arc_cmd = "G2" if cw else "G3"
-
-    g: List[str] = []
-    emit = g.append
-
-    emit(post.header(program_number=1001, comment="ROUND_POCKET_RINGS"))
-    emit(post.line({"cmd": "G17 G21 G90"}))
-    emit(post.line({"cmd": "G54"}))
-    emit(post.tool_change(tool=1))
-    emit(post.spindle_on(spindle))
-    emit(post.coolant_on())
-    emit(post.rapid(z=safe))
-
-    current_depth = 0.0
-    pass_idx = 0
-    while current_depth < depth - 1e-9:
-        pass_idx += 1
-        layer = min(step_down, depth - current_depth)
-        current_depth += layer
-        z = -current_depth
-
-        emit(post.comment(f"PASS {pass_idx} Z{z:.3f}"))
-        emit(post.rapid(x=cx, y=cy))
-        emit(post.feed_move(z=z, feed=feed))
-
+    _check_steps(step_down=step_down, stepover=stepover)
+
+    tp = Toolpath()
+    tp.header(program_number=1001, comment=f"ROUND_POCKET_{strategy.upper()}")
+    tp.cmd("G17 G21 G90")
+    tp.cmd("G54")
+    tp.tool_change(tool=1)
+    tp.spindle_on(spindle)
+    tp.coolant_on()
+    tp.rapid(z=safe)
+
+    z_prev = 0.0
+    for pass_idx, z in enumerate(_passes(depth, step_down), 1):
+        yield tp
+        tp = _next_part(tp)
+        layer, z_prev = z_prev - z, z
+
+        tp.comment(f"PASS {pass_idx} Z{z:.3f}")
         r = max(tool_r * 0.6, 0.001)
-        while r <= r_final + 1e-6:
+        if strategy == "spiral" or helix:
+            # врезание на радиусе первого витка: с него же начинается спираль
+            start_r = min(r, r_final)
+            tp.rapid(x=cx + start_r, y=cy)
+            if helix:
+                tp.feed(z=z + layer, f=feed)
+                _helix(tp, cx, cy, start_r, z + layer, z, ramp_angle, cw, feed)
+            else:
+                tp.feed(z=z, f=feed)
+        else:
+            tp.rapid(x=cx, y=cy)
+            tp.feed(z=z, f=feed)
+
+        if strategy == "spiral":
+            _spiral_layer(tp, cx, cy, start_r, r_final, stepover, cw, feed)
+            tp.rapid(z=safe)
+            continue
+        for k in range(_count(r, r_final, stepover)):
             # стартовая точка окружности — справа от центра
-            x0 = cx + r
+            x0 = cx + r + k*stepover
             y0 = cy
-            emit(post.feed_move(x=x0, y=y0, feed=feed))
+            tp.feed(x=x0, y=y0, f=feed)
 
             # центр дуги от стартовой точки
             I = cx - x0
             J = cy - y0
             # одна полная окружность
-            emit(post.line({"cmd": arc_cmd, "x": x0, "y": y0, "i": I, "j": J, "f": feed}))
-
-            r += stepover
-
-        emit(post.rapid(z=safe))
-
-    emit(post.coolant_off())
-    emit(post.spindle_off())
-    emit(post.footer())
-    return "\n".join(filter(None, g)) + "\n"
-
+            tp.arc(cw, x0, y0, I, J, f=feed)
 
+        tp.rapid(z=safe)
 
+    tp.coolant_off()
+    tp.spindle_off()
+    tp.footer()
+    yield tp
 
+def round_pocket_toolpath(
+    diameter: float, depth: float, step_down: float,
+    feed: float, spindle: int, tool_diam: float, safe: float,
+    center_xy: Tuple[float, float] = (0.0, 0.0),
+    *, stepover_ratio: float = 0.6, cw: bool = True,
+    strategy: str = "rings", helix: bool = False, ramp_angle: float = 3.0,
+) -> Toolpath:
+    """Круглый карман: геометрия программы без форматирования.
+
+    strategy="rings" — концентрические окружности G2/G3 с шагом наружу
+    на каждом кольце; "spiral" — непрерывная спираль из полуокружностей
+    (шаг stepover за оборот) и чистовая окружность по краю.
+    helix=True — врезание по винту с углом ramp_angle (градусы) вместо
+    прямого врезания по Z.
+    """
+    return _join(_round_pocket_parts(
+        diameter, depth, step_down, feed, spindle, tool_diam, safe, center_xy,
+        stepover_ratio=stepover_ratio, cw=cw, strategy=strategy, helix=helix, ramp_angle=ramp_angle,
+    ))
+
+def iter_round_pocket(
+    diameter: float, depth: float, step_down: float,
+    feed: float, spindle: int, tool_diam: float, safe: float,
+    center_xy: Tuple[float, float] = (0.0, 0.0),
+    post: PostProcessor | PostProfile | None = None,
+    **opts,
+) -> Iterator[str]:
+    """Круглый карман: блоки программы выдаются по одному.
+    Опции (stepover_ratio, cw) — как у round_pocket_toolpath()."""
+    return _stream(_round_pocket_parts(diameter, depth, step_down, feed, spindle, tool_diam, safe, center_xy, **opts), post)
 
-def generate_square_pocket(
+def generate_round_pocket(
+    diameter: float, depth: float, step_down: float,
+    feed: float, spindle: int, tool_diam: float, safe: float,
+    center_xy: Tuple[float, float] = (0.0, 0.0),
+    post: PostProcessor | PostProfile | None = None,
+    *, stepover_ratio: float = 0.6, cw: bool = True,
+    strategy: str = "rings", helix: bool = False, ramp_angle: float = 3.0,
+) -> str:
+    """Круглый карман: программа одной строкой. Параметры — как у iter_round_pocket()."""
+    return _program(iter_round_pocket(
+        diameter, depth, step_down, feed, spindle, tool_diam, safe, center_xy, post,
+        stepover_ratio=stepover_ratio, cw=cw, strategy=strategy, helix=helix, ramp_angle=ramp_angle,
+    ))
+
+
+
+
+
+def _square_layer(tp: Toolpath, X0: Number, X1: Number, Y0: Number, Y1: Number,
+                  stepover: Number, raster_axis: str, finish_contour: bool) -> None:
+    """Один слой кармана: зигзаг и финишный контур (без движения по Z)."""
+    if raster_axis.upper() == "X":
+        # зигзаг по X, шаг по Y
+        n = _count(Y0, Y1, stepover)
+        for k in range(n):
+            tp.feed(x=X1 if k % 2 == 0 else X0, y=Y0 + k*stepover)
+            if k + 1 < n:
+                tp.feed(y=Y0 + (k+1)*stepover)
+    else:
+        # зигзаг по Y, шаг по X
+        n = _count(X0, X1, stepover)
+        for k in range(n):
+            tp.feed(x=X0 + k*stepover, y=Y1 if k % 2 == 0 else Y0)
+            if k + 1 < n:
+                tp.feed(x=X0 + (k+1)*stepover)
+
+    # финишный контур на том же Z
+    if finish_contour:
+        tp.feed(x=X0, y=Y0)
+        tp.feed(x=X1, y=Y0)
+        tp.feed(x=X1, y=Y1)
+        tp.feed(x=X0, y=Y1)
+        tp.feed(x=X0, y=Y0)
+
+def _square_pocket_parts(
     width: Number, length: Number, depth: Number, step_down: Number,
     feed: Number, spindle: int, tool_diam: Number, safe: Number,
     start_xy: Tuple[Number, Number] = (0.0, 0.0),
-    post: PostProcessor | None = None,
     *,
     stepover_ratio: float = 0.6,      # доля диаметра фрезы
     overlap: float = 0.5,             # заход за габарит (в долях D)
     finish_contour: bool = True,      # делать ли обход контура
-    raster_axis: str = "X"            # "X" или "Y" – направление зигзага
-) -> str:
-    if post is None:
-        post = PostProcessor.default()
-
+    raster_axis: str = "X",           # "X" или "Y" – направление зигзага
+    subprogram: bool = False,         # слой по XY — подпрограммой M98/M99
+) -> Iterator[Toolpath]:
+    """Части square_pocket_toolpath(): начало программы, проходы по Z, концовка."""
     x0, y0 = start_xy
     x1, y1 = x0 + width, y0 + length
 
@@ -163,59 +431,89 @@ def generate_square_pocket(
     Y0, Y1 = y0 - extra, y1 + extra
 
     stepover = tool_diam * stepover_ratio
-
-    g = []; emit = g.append
-    emit(post.header(program_number=1002, comment="SQUARE_POCKET"))
-    emit(post.line({"cmd": "G17 G21 G90"}))
-    emit(post.line({"cmd": "G54"}))
-    emit(post.tool_change(tool=1))
-    emit(post.spindle_on(spindle))
-    emit(post.coolant_on())
-    emit(post.rapid(z=safe))
-    emit(post.rapid(x=X0, y=Y0))
-
+    _check_steps(step_down=step_down, stepover=stepover)
+
+    tp = Toolpath()
+    tp.header(program_number=1002, comment="SQUARE_POCKET")
+    tp.cmd("G17 G21 G90")
+    tp.cmd("G54")
+    tp.tool_change(tool=1)
+    tp.spindle_on(spindle)
+    tp.coolant_on()
+    tp.rapid(z=safe)
+    tp.rapid(x=X0, y=Y0)
+
+    if subprogram:
+        layer = Toolpath()
+        _square_layer(layer, X0, X1, Y0, Y1, stepover, raster_axis, finish_contour)
+        tp.subprogram(1002 + SUBPROGRAM_OFFSET, "SQUARE_POCKET LAYER", layer)
     for i, z in enumerate(_passes(depth, step_down), 1):
-        emit(post.comment(f"PASS {i} Z{z:.3f}"))
-        emit(post.feed_move(z=z, feed=feed))
-
-        if raster_axis.upper() == "X":
-            # зигзаг по X, шаг по Y
-            direction = 1
-            y = Y0
-            while y <= Y1 + 1e-6:
-                if direction > 0:
-                    emit(post.feed_move(x=X1, y=y))
-                else:
-                    emit(post.feed_move(x=X0, y=y))
-                y += stepover
-                direction *= -1
-                if y <= Y1 + 1e-6:
-                    emit(post.feed_move(y=y))
+        yield tp
+        tp = _next_part(tp)
+        tp.comment(f"PASS {i} Z{z:.3f}")
+        tp.feed(z=z, f=feed)
+
+        if subprogram:
+            tp.call(1002 + SUBPROGRAM_OFFSET)
         else:
-            # зигзаг по Y, шаг по X
-            direction = 1
-            x = X0
-            while x <= X1 + 1e-6:
-                if direction > 0:
-                    emit(post.feed_move(x=x, y=Y1))
-                else:
-                    emit(post.feed_move(x=x, y=Y0))
-                x += stepover
-                direction *= -1
-                if x <= X1 + 1e-6:
-                    emit(post.feed_move(x=x))
-
-        # финишный контур на том же Z
-        if finish_contour:
-            emit(post.feed_move(x=X0, y=Y0))
-            emit(post.feed_move(x=X1, y=Y0))
-            emit(post.feed_move(x=X1, y=Y1))
-            emit(post.feed_move(x=X0, y=Y1))
-            emit(post.feed_move(x=X0, y=Y0))
-
-        emit(post.rapid(z=safe))
-
-    emit(post.coolant_off())
-    emit(post.spindle_off())
-    emit(post.footer())
-    return "\n".join(filter(None, g)) + "\n"
+            _square_layer(tp, X0, X1, Y0, Y1, stepover, raster_axis, finish_contour)
+
+        tp.rapid(z=safe)
+
+    tp.coolant_off()
+    tp.spindle_off()
+    tp.footer()
+    yield tp
+
+def square_pocket_toolpath(
+    width: Number, length: Number, depth: Number, step_down: Number,
+    feed: Number, spindle: int, tool_diam: Number, safe: Number,
+    start_xy: Tuple[Number, Number] = (0.0, 0.0),
+    *,
+    stepover_ratio: float = 0.6,      # доля диаметра фрезы
+    overlap: float = 0.5,             # заход за габарит (в долях D)
+    finish_contour: bool = True,      # делать ли обход контура
+    raster_axis: str = "X",           # "X" или "Y" – направление зигзага
+    subprogram: bool = False,         # слой по XY — подпрограммой M98/M99
+) -> Toolpath:
+    """Прямоугольный карман растром: геометрия программы без форматирования.
+
+    subprogram=True — слой (растр и финишный контур) выводится один раз
+    подпрограммой (номер 2002) и вызывается на каждом проходе по Z.
+    """
+    return _join(_square_pocket_parts(
+        width, length, depth, step_down, feed, spindle, tool_diam, safe, start_xy,
+        stepover_ratio=stepover_ratio, overlap=overlap, finish_contour=finish_contour,
+        raster_axis=raster_axis, subprogram=subprogram,
+    ))
+
+def iter_square_pocket(
+    width: Number, length: Number, depth: Number, step_down: Number,
+    feed: Number, spindle: int, tool_diam: Number, safe: Number,
+    start_xy: Tuple[Number, Number] = (0.0, 0.0),
+    post: PostProcessor | PostProfile | None = None,
+    **opts,
+) -> Iterator[str]:
+    """Прямоугольный карман: блоки программы выдаются по одному.
+    Опции (stepover_ratio, overlap, finish_contour, raster_axis) —
+    как у square_pocket_toolpath()."""
+    return _stream(_square_pocket_parts(width, length, depth, step_down, feed, spindle, tool_diam, safe, start_xy, **opts), post)
+
+def generate_square_pocket(
+    width: Number, length: Number, depth: Number, step_down: Number,
+    feed: Number, spindle: int, tool_diam: Number, safe: Number,
+    start_xy: Tuple[Number, Number] = (0.0, 0.0),
+    post: PostProcessor | PostProfile | None = None,
+    *,
+    stepover_ratio: float = 0.6,
+    overlap: float = 0.5,
+    finish_contour: bool = True,
+    raster_axis: str = "X",
+    subprogram: bool = False,
+) -> str:
+    """Прямоугольный карман: программа одной строкой. Параметры — как у iter_square_pocket()."""
+    return _program(iter_square_pocket(
+        width, length, depth, step_down, feed, spindle, tool_diam, safe, start_xy, post,
+        stepover_ratio=stepover_ratio, overlap=overlap, finish_contour=finish_contour,
+        raster_axis=raster_axis, subprogram=subprogram,
+    ))
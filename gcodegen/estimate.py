@@ -0,0 +1,195 @@
+"""estimate.py — оценка машинного времени программы
+
+Время считается по потоку перемещений: G0 — со скоростью ускоренного
+хода (PostConfig.rapid_rate), G1/G2/G3 — с модальной подачей F, длина дуг —
+по I/J (или R) с учётом винтовой составляющей по Z. Если в профиле задан
+max_accel, каждое перемещение считается трапецией скорости с разгоном с
+нуля и торможением до нуля (оценка сверху: без сглаживания углов).
+
+Источник — либо Toolpath из *_toolpath() (без форматирования и разбора
+текста), либо произвольная программа: она разбирается токенизатором
+валидатора в тот же Toolpath. Подпрограммы (M98/M99) разворачиваются по
+вызовам, G90/G91 и G20/G21 учитываются. Начальная точка — X0 Y0 Z0.
+"""
+from __future__ import annotations
+from math import atan2, asin, hypot, sqrt, tau
+from typing import Iterable, NamedTuple
+import re
+
+from .compress import open_text
+from .post import PostConfig, PostProcessor, PostProfile
+from .toolpath import Toolpath, RAPID, FEED, ARC_CW, ARC_CCW, CMD, CALL, NAN
+from .validator import parse_block
+
+class Estimate(NamedTuple):
+    """Итог оценки: время (с) и путь (мм) по видам перемещений."""
+    seconds: float
+    feed_seconds: float
+    rapid_seconds: float
+    feed_length: float
+    rapid_length: float
+    moves: int
+
+# Модальные коды, которые меняют счёт: единицы и режим координат
+RE_MODE = re.compile(r"G(?:2[01]|9[01])(?!\d)")
+
+def _config(post: PostConfig | PostProfile | PostProcessor | None) -> PostConfig:
+    if post is None:
+        return PostConfig()
+    return post if isinstance(post, PostConfig) else post.cfg
+
+def _move_time(length: float, v: float, accel: float) -> float:
+    """Время перемещения длиной length со скоростью v (мм/с)."""
+    if accel <= 0.0:
+        return length / v
+    if length >= v * v / accel:
+        return length / v + v / accel
+    # скорость v не достигается: треугольник разгон-торможение
+    return 2.0 * sqrt(length / accel)
+
+def estimate_toolpath(tp: Toolpath, post: PostConfig | PostProfile | PostProcessor | None = None) -> Estimate:
+    """Оценка времени по траектории (например, face_toolpath(...))."""
+    cfg = _config(post)
+    acc = [0.0, 0.0, 0.0, 0.0, 0]
+    # состояние: x, y, z, подача (мм/мин), абсолютные координаты, масштаб единиц
+    state = [0.0, 0.0, 0.0, 0.0, True, 1.0]
+    subs = {n: body for n, _, body in tp.subs}
+    _run(tp, subs, state, acc, cfg.rapid_rate / 60.0, cfg.max_accel, 0)
+    feed_s, rapid_s, feed_len, rapid_len, moves = acc
+    return Estimate(feed_s + rapid_s, feed_s, rapid_s, feed_len, rapid_len, moves)
+
+# Предел вложенности вызовов подпрограмм (защита от рекурсии M98 в себя)
+MAX_CALL_DEPTH = 16
+
+def _run(tp: Toolpath, subs: dict, state: list, acc: list, rapid_v: float,
+         accel: float, depth: int) -> None:
+    """Один проход по колонкам траектории; state и acc обновляются на месте."""
+    px, py, pz, feed, absolute, scale = state
+    feed_s, rapid_s, feed_len, rapid_len, moves = acc
+    args = tp.args
+    for k, (o, x, y, z, i, j, f) in enumerate(zip(tp.op, tp.x, tp.y, tp.z, tp.i, tp.j, tp.f)):
+        if o > ARC_CCW:
+            if o == CMD:
+                for code in RE_MODE.findall(args.get(k, ("",))[0].upper()):
+                    if code == "G90": absolute = True
+                    elif code == "G91": absolute = False
+                    elif code == "G20": scale = 25.4
+                    else: scale = 1.0
+            elif o == CALL and depth < MAX_CALL_DEPTH:
+                body = subs.get(args[k][0])
+                if body is not None:
+                    state[:] = px, py, pz, feed, absolute, scale
+                    acc[:] = feed_s, rapid_s, feed_len, rapid_len, moves
+                    _run(body, subs, state, acc, rapid_v, accel, depth + 1)
+                    px, py, pz, feed, absolute, scale = state
+                    feed_s, rapid_s, feed_len, rapid_len, moves = acc
+            continue
+        # NaN — координата не задана (x == x ложно только для NaN)
+        if absolute:
+            nx = x * scale if x == x else px
+            ny = y * scale if y == y else py
+            nz = z * scale if z == z else pz
+        else:
+            nx = px + x * scale if x == x else px
+            ny = py + y * scale if y == y else py
+            nz = pz + z * scale if z == z else pz
+        if f == f:
+            feed = f * scale
+        moves += 1
+        if o == RAPID:
+            length = sqrt((nx - px) ** 2 + (ny - py) ** 2 + (nz - pz) ** 2)
+            if length:
+                rapid_len += length
+                rapid_s += _move_time(length, rapid_v, accel)
+        else:
+            if o == FEED:
+                length = sqrt((nx - px) ** 2 + (ny - py) ** 2 + (nz - pz) ** 2)
+            elif j == j:
+                i *= scale
+                j *= scale
+                cx, cy = px + i, py + j
+                sweep = atan2(ny - cy, nx - cx) - atan2(py - cy, px - cx)
+                if o == ARC_CW:
+                    sweep = -sweep
+                sweep %= tau
+                if sweep < 1e-9:
+                    sweep = tau  # конец совпал с началом — полная окружность
+                length = hypot(hypot(i, j) * sweep, nz - pz)
+            else:
+                # дуга через R (см. parse_program: радиус лежит в колонке i)
+                r = abs(i) * scale
+                chord = hypot(nx - px, ny - py)
+                sweep = 2.0 * asin(min(1.0, chord / (2.0 * r))) if r else 0.0
+                if i < 0:
+                    sweep = tau - sweep
+                length = hypot(r * sweep, nz - pz)
+            if length and feed > 0.0:
+                feed_len += length
+                feed_s += _move_time(length, feed / 60.0, accel)
+        px, py, pz = nx, ny, nz
+    state[:] = px, py, pz, feed, absolute, scale
+    acc[:] = feed_s, rapid_s, feed_len, rapid_len, moves
+
+def parse_program(lines: Iterable[str]) -> Toolpath:
+    """Разобрать текст программы в Toolpath для оценки.
+
+    Подпрограммы — блоки O... после M30/M2 до M99 — попадают в subs.
+    Дуга, заданная через R, хранится с радиусом в колонке i и NaN в j.
+    """
+    main = tp = Toolpath()
+    motion = FEED
+    after_end = False
+    for raw in lines:
+        b = parse_block(raw)
+        if b is None:
+            continue
+        modes = [g for g in b.g if g in (20, 21, 90, 91)]
+        if modes:
+            tp.cmd(" ".join(f"G{g}" for g in modes))
+        w = dict(b.words)
+        if "O" in w and after_end:
+            tp = Toolpath()
+            main.subprogram(int(float(w["O"])), "", tp)
+            continue
+        for g in b.g:
+            if g in (0, 1, 2, 3):
+                motion = g
+        x, y, z = (float(w[a]) if a in w else NAN for a in "XYZ")
+        f = b.f[-1] if b.f else NAN
+        if x == x or y == y or z == z:
+            if motion == RAPID:
+                tp.rapid(x, y, z)
+            elif motion == FEED:
+                tp.feed(x, y, z, f)
+            elif "I" in w or "J" in w:
+                tp.arc(motion == ARC_CW, x, y, float(w.get("I", 0.0)), float(w.get("J", 0.0)), f, z)
+            elif "R" in w:
+                tp.arc(motion == ARC_CW, x, y, float(w["R"]), NAN, f, z)
+        elif f == f:
+            tp.feed(f=f)  # F без перемещения меняет модальную подачу
+        for mc in b.m:
+            if mc == 98 and "P" in w:
+                for _ in range(int(float(w.get("L", 1)))):
+                    tp.call(int(float(w["P"])))
+            elif mc in (30, 2):
+                after_end = True
+            elif mc == 99 and tp is not main:
+                tp = main
+    return main
+
+def estimate_lines(lines: Iterable[str], post: PostConfig | PostProfile | PostProcessor | None = None) -> Estimate:
+    return estimate_toolpath(parse_program(lines), post)
+
+def estimate_gcode(text: str, post: PostConfig | PostProfile | PostProcessor | None = None) -> Estimate:
+    """Оценка времени программы, например результата generate_*()."""
+    return estimate_lines(text.splitlines(), post)
+
+def estimate_file(path: str, post: PostConfig | PostProfile | PostProcessor | None = None,
+                  encoding: str = 'utf-8') -> Estimate:
+    with open_text(path, 'r', encoding=encoding) as f:
+        return estimate_lines(f, post)
+
+def format_duration(seconds: float) -> str:
+    """Секунды -> "Ч:ММ:СС"."""
+    s = int(round(seconds))
+    return f"{s // 3600}:{s // 60 % 60:02d}:{s % 60:02d}"
@@ -0,0 +1,140 @@
+"""fanout.py — одна геометрия, несколько постпроцессоров
+
+Траектория (Toolpath) от профиля поста не зависит, поэтому для одной
+детали под несколько стоек она строится один раз и отдаётся каждому
+профилю; форматирование под разные стойки идёт параллельно в пуле
+процессов, каждая программа — в свой файл.
+
+Построенные траектории лежат в памяти (GeometryCache) по параметрам
+геометрии. feed и spindle в ключ не входят: при смене только подачи или
+оборотов берётся готовая траектория, и в ней меняются F и S
+(Toolpath.retime), а не пересчитываются проходы. Тем же кэшем пользуется
+batch (и serve), так что задания, отличающиеся постом или режимами,
+геометрию в одном процессе не повторяют.
+"""
+from __future__ import annotations
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional, Sequence
+
+from .compress import split_codec
+from .core import face_toolpath, round_pocket_toolpath, square_pocket_toolpath, write_program
+from .toolpath import Toolpath
+
+TOOLPATHS = {
+    "face": face_toolpath,
+    "round": round_pocket_toolpath,
+    "round_pocket": round_pocket_toolpath,
+    "square": square_pocket_toolpath,
+    "square_pocket": square_pocket_toolpath,
+}
+
+# Параметры, которые меняются без пересчёта геометрии
+RETIME_KEYS = ("feed", "spindle")
+
+# Предел кэша по числу операций во всех траекториях (~49 байт на операцию)
+MAX_OPS = 2_000_000
+
+def _size(tp: Toolpath) -> int:
+    return len(tp) + sum(_size(body) for _, _, body in tp.subs)
+
+class GeometryCache:
+    """Траектории по параметрам геометрии; вытесняются давно не нужные (LRU)."""
+
+    def __init__(self, max_ops: int = MAX_OPS):
+        self.max_ops = max_ops
+        self._items: OrderedDict[tuple, tuple] = OrderedDict()   # ключ -> (tp, feed, spindle, size)
+        self._ops = 0
+        self.hits = self.retimed = self.misses = 0
+
+    def toolpath(self, op: str, **args) -> Toolpath:
+        """Траектория операции op с аргументами генератора (как у *_toolpath())."""
+        gen = TOOLPATHS.get(op)
+        if gen is None:
+            raise ValueError(f"Неизвестная операция: {op!r}")
+        feed, spindle = args["feed"], args["spindle"]
+        key = (gen.__name__,) + tuple(sorted((k, v) for k, v in args.items() if k not in RETIME_KEYS))
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            tp = gen(**args)
+            size = _size(tp)
+            # с подачей 0 F нельзя пересчитать пропорционально (retime) — не кэшируем
+            if size <= self.max_ops and feed:
+                self._items[key] = (tp, feed, spindle, size)
+                self._ops += size
+                while self._ops > self.max_ops:
+                    self._ops -= self._items.popitem(last=False)[1][3]
+            return tp
+        self._items.move_to_end(key)
+        tp, feed0, spindle0, _ = item
+        if feed == feed0 and spindle == spindle0:
+            self.hits += 1
+            return tp
+        self.retimed += 1
+        return tp.retime(feed0, feed, spindle if spindle != spindle0 else None)
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._ops = 0
+
+# Кэш процесса (batch, serve и fan_out без своего кэша)
+GEOMETRY = GeometryCache()
+
+class Posted(NamedTuple):
+    post: str               # путь профиля ("" — профиль по умолчанию)
+    output: str
+    seconds: float
+    size: int               # записано символов
+
+def output_for(output: Optional[str], op: str, post: str) -> str:
+    """Имя файла программы для профиля: part.nc + fanuc.yaml -> part.fanuc.nc
+    (part.nc.gz -> part.fanuc.nc.gz)."""
+    stem = os.path.splitext(os.path.basename(post))[0] if post else "default"
+    if not output:
+        return f"{op}.{stem}.nc"
+    base, packed = split_codec(output)
+    root, ext = os.path.splitext(base)
+    return f"{root}.{stem}{ext or '.nc'}{packed}"
+
+def _post(tp: Toolpath, post: str, modal: Optional[bool], output: str) -> Posted:
+    from .batch import _post_for
+    t0 = time.perf_counter()
+    profile = _post_for(post or None, modal)
+    size = write_program(profile.emitter().iter_program(tp), output)
+    return Posted(post, output, time.perf_counter() - t0, size)
+
+def check_outputs(posts: Sequence[str], outputs: Sequence[str]) -> None:
+    """ValueError, если файлов вывода не столько, сколько профилей, или два
+    профиля пишут в один файл (например, один --post указан дважды)."""
+    if len(outputs) != len(posts):
+        raise ValueError("Число файлов вывода не совпадает с числом профилей")
+    if len(set(outputs)) != len(outputs):
+        raise ValueError("Несколько профилей пишут в один файл")
+
+def fan_out(op: str, posts: Sequence[str], outputs: Optional[Sequence[str]] = None,
+            modal: Optional[bool] = None, workers: int = 0,
+            cache: Optional[GeometryCache] = None, **args) -> List[Posted]:
+    """Построить траекторию op один раз и записать программу под каждый профиль.
+
+    posts — пути YAML-профилей ("" — профиль по умолчанию); outputs — файлы
+    в том же порядке (по умолчанию output_for(None, op, post)). Профили
+    форматируются параллельно в workers процессах (0 — по числу ядер,
+    1 — в текущем процессе). Порядок результатов — как у posts.
+    """
+    if outputs is None:
+        outputs = [output_for(None, op, p) for p in posts]
+    check_outputs(posts, outputs)
+    tp = (cache or GEOMETRY).toolpath(op, **args)
+    for output in outputs:
+        folder = os.path.dirname(output)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+    workers = min(workers or os.cpu_count() or 1, len(posts))
+    if workers <= 1:
+        return [_post(tp, p, modal, o) for p, o in zip(posts, outputs)]
+    n = len(posts)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_post, [tp] * n, posts, [modal] * n, outputs))
@@ -18,6 +18,61 @@ STRINGS = {
         "cmd_square_help": "Квадратный карман",
         "cmd_validate_help": "Проверка G-кода",
         "cmd_help_help": "Описание функций",
+        "opt_modal": "Модальное сжатие вывода (не повторять G1, F и неизменившиеся оси)",
+        "modal_saved": "Модальное сжатие: сэкономлено {n} байт",
+        "opt_subprogram": "Слой по XY — один раз подпрограммой (M98/M99), вызов на каждом проходе по Z",
+        "opt_jobs": "Число процессов для проверки больших файлов (0 — по числу ядер)",
+        "cmd_batch_help": "Пакетная генерация по манифесту заданий (YAML/JSONL)",
+        "opt_workers": "Число процессов (0 — по числу ядер)",
+        "batch_title": "Задания",
+        "opt_cache": "Брать программу из дискового кэша (и сохранять в него)",
+        "opt_cache_dir": "Каталог кэша (по умолчанию ~/.cache/gcodegen/programs)",
+        "opt_cache_stats": "Показать статистику кэша",
+        "cache_stats": "Кэш: {hits} попаданий, {misses} промахов, {evictions} вытеснений; {entries} программ, {mb:.1f} из {max_mb:.0f} МБ",
+        "opt_stats": "Показать время по фазам, блоки по типам, байты и пиковую память (в stderr)",
+        "opt_profile": "Сохранить профиль cProfile (pstats) в файл",
+        "stats_title": "Статистика:",
+        "profile_saved": "Профиль сохранён: {path} (python -m pstats {path})",
+        "batch_summary": "{n} заданий ({err} с ошибками) за {t:.2f} с: {rate:.1f} заданий/с, {mb:.2f} МБ/с",
+        "cmd_serve_help": "Локальный HTTP-сервис генерации и проверки",
+        "opt_host": "Адрес для прослушивания",
+        "opt_port": "Порт",
+        "opt_serve_post": "Профиль постпроцессора, загружаемый в процессы заранее (можно несколько)",
+        "serve_started": "Сервис на http://{host}:{port} ({workers} процессов), Ctrl+C — остановить",
+        "cmd_estimate_help": "Оценка машинного времени программы",
+        "cmd_arcfit_help": "Заменить цепочки G1 дугами G2/G3",
+        "opt_strategy": "Стратегия: rings (кольца) или spiral (непрерывная спираль)",
+        "opt_helix": "Врезание по винту вместо прямого врезания по Z",
+        "opt_ramp_angle": "Угол винтового врезания, градусы",
+        "opt_arc_tol": "Допуск отклонения точек от дуги, мм",
+        "opt_min_segments": "Минимум отрезков G1 в одной дуге",
+        "opt_arc_precision": "Знаков после запятой в дугах (по умолчанию — как в профиле --post)",
+        "arcfit_report": "Кадров: {before} -> {after}, байт: {b_before} -> {b_after}",
+        "cmd_compose_help": "Несколько элементов из манифеста — одной программой",
+        "opt_optimize": "Переставлять элементы, сокращая ускоренные перемещения",
+        "compose_report": "Элементов: {n}, инструментов: {tools}; ускоренные перемещения между элементами {before:.1f} -> {after:.1f} мм (сэкономлено {saved:.1f} мм)",
+        "opt_rapid_rate": "Скорость ускоренного хода, мм/мин (по умолчанию из поста)",
+        "opt_max_accel": "Предел ускорения, мм/с² (0 — без разгона; по умолчанию из поста)",
+        "estimate_total": "Время обработки: {t}",
+        "estimate_detail": "  рабочие ходы: {feed} ({feed_mm:.1f} мм), ускоренные: {rapid} ({rapid_mm:.1f} мм), перемещений: {moves}",
+        "cmd_simulate_help": "Проверка съёма материала по карте высот (нужен numpy)",
+        "opt_sim_depth": "Целевая глубина: ниже — зарез, в области выше — недорез",
+        "opt_sim_rect": "Область кармана x0,y0,x1,y1",
+        "opt_sim_circle": "Круглая область кармана cx,cy,r",
+        "opt_sim_cell": "Шаг сетки, мм (по умолчанию по диаметру фрезы и габариту)",
+        "bad_numbers": "ожидается чисел через запятую: {n}",
+        "simulate_report": "Снято {volume:.0f} мм³, минимальный Z {min_z:.3f}; сетка {cell:.3f} мм, ячеек: {cells}",
+        "simulate_gouge": "Зарез ниже целевой глубины: {area:.1f} мм²",
+        "simulate_uncut": "Недорез: {area:.1f} мм², островков: {islands}",
+        "simulate_rapids": "Ускоренных перемещений в материале: {n}",
+        "opt_posts": "YAML пост; несколько --post — геометрия строится один раз, программа под каждый профиль пишется в <output>.<профиль>.nc",
+        "fanout_written": "{output}: {size} байт за {t:.2f} с ({post})",
+        "opt_watch": "Следить за файлом и при каждом сохранении перепроверять только изменённый участок",
+        "watch_rescanned": "Перепроверено строк: {n} из {total} за {ms:.2f} мс",
+        "opt_validate_post": "YAML пост: набор правил и допустимые коды G/M этой стойки",
+        "opt_disable_rule": "Отключить правило (можно несколько): long_line, unknown_code, g1_before_m3, ...",
+        "opt_rule_timings": "Показать число вызовов и время каждого правила (проверка в одном процессе)",
+        "rule_timings_title": "Правила: вызовов, время",
     },
     "en": {
         "app_help": "G-code generators: face, round pocket, square pocket",
@@ -36,6 +91,61 @@ STRINGS = {
         "cmd_square_help": "Square pocket",
         "cmd_validate_help": "Validate G-code",
         "cmd_help_help": "Show function help",
+        "opt_modal": "Modal output compaction (omit repeated G1, F and unchanged axes)",
+        "modal_saved": "Modal compaction: {n} bytes saved",
+        "opt_subprogram": "Emit the XY layer once as a subprogram (M98/M99), called per Z pass",
+        "opt_jobs": "Worker processes for validating large files (0 = one per core)",
+        "cmd_batch_help": "Generate programs from a job manifest (YAML/JSONL)",
+        "opt_workers": "Worker processes (0 = one per core)",
+        "batch_title": "Jobs",
+        "opt_cache": "Use the on-disk program cache (read and store)",
+        "opt_cache_dir": "Cache directory (default ~/.cache/gcodegen/programs)",
+        "opt_cache_stats": "Show cache statistics",
+        "cache_stats": "Cache: {hits} hits, {misses} misses, {evictions} evictions; {entries} programs, {mb:.1f} of {max_mb:.0f} MB",
+        "opt_stats": "Report time per phase, blocks by type, bytes and peak memory (to stderr)",
+        "opt_profile": "Dump a cProfile (pstats) profile to this file",
+        "stats_title": "Stats:",
+        "profile_saved": "Profile saved: {path} (python -m pstats {path})",
+        "batch_summary": "{n} jobs ({err} failed) in {t:.2f} s: {rate:.1f} jobs/s, {mb:.2f} MB/s",
+        "cmd_serve_help": "Local HTTP service for generation and validation",
+        "opt_host": "Address to listen on",
+        "opt_port": "Port",
+        "opt_serve_post": "Post profile to preload into workers (repeatable)",
+        "serve_started": "Serving on http://{host}:{port} ({workers} workers), Ctrl+C to stop",
+        "cmd_estimate_help": "Estimate machining time of a program",
+        "cmd_arcfit_help": "Replace runs of G1 segments with G2/G3 arcs",
+        "opt_strategy": "Strategy: rings (concentric) or spiral (continuous)",
+        "opt_helix": "Helical ramp entry instead of a straight plunge",
+        "opt_ramp_angle": "Helical ramp angle, degrees",
+        "opt_arc_tol": "Max deviation of points from the arc, mm",
+        "opt_min_segments": "Minimum G1 segments per arc",
+        "opt_arc_precision": "Decimal places in fitted arcs (default: from the --post profile)",
+        "arcfit_report": "Blocks: {before} -> {after}, bytes: {b_before} -> {b_after}",
+        "cmd_compose_help": "Emit features from a manifest as one program",
+        "opt_optimize": "Reorder features to reduce rapid travel",
+        "compose_report": "Features: {n}, tools: {tools}; rapid travel between features {before:.1f} -> {after:.1f} mm ({saved:.1f} mm saved)",
+        "opt_rapid_rate": "Rapid rate, mm/min (default from the post)",
+        "opt_max_accel": "Acceleration limit, mm/s² (0 = ignore; default from the post)",
+        "estimate_total": "Cycle time: {t}",
+        "estimate_detail": "  feed moves: {feed} ({feed_mm:.1f} mm), rapids: {rapid} ({rapid_mm:.1f} mm), moves: {moves}",
+        "cmd_simulate_help": "Check material removal on a heightmap (requires numpy)",
+        "opt_sim_depth": "Target depth: deeper is a gouge, shallower inside the region is uncut",
+        "opt_sim_rect": "Pocket region x0,y0,x1,y1",
+        "opt_sim_circle": "Round pocket region cx,cy,r",
+        "opt_sim_cell": "Grid cell, mm (default from tool diameter and extents)",
+        "bad_numbers": "expected {n} comma-separated numbers",
+        "simulate_report": "Removed {volume:.0f} mm³, min Z {min_z:.3f}; cell {cell:.3f} mm, {cells} cells",
+        "simulate_gouge": "Gouge below target depth: {area:.1f} mm²",
+        "simulate_uncut": "Uncut: {area:.1f} mm² in {islands} islands",
+        "simulate_rapids": "Rapid moves inside stock: {n}",
+        "opt_posts": "YAML post; with several --post the geometry is built once and each profile is written to <output>.<profile>.nc",
+        "fanout_written": "{output}: {size} bytes in {t:.2f} s ({post})",
+        "opt_watch": "Watch the file and re-check only the edited range on every save",
+        "watch_rescanned": "Re-checked {n} of {total} lines in {ms:.2f} ms",
+        "opt_validate_post": "YAML post: rule set and accepted G/M codes for this controller",
+        "opt_disable_rule": "Disable a rule (repeatable): long_line, unknown_code, g1_before_m3, ...",
+        "opt_rule_timings": "Show calls and time per rule (validates in one process)",
+        "rule_timings_title": "Rules: calls, time",
     },
 }
 
@@ -1,9 +1,139 @@
 """post.py — форматирование G-кода"""
 from __future__ import annotations
+import copy
 import datetime as _dt
-from dataclasses import dataclass, field
-from typing import Optional
-import yaml
+import os
+import re
+import struct
+from array import array
+from itertools import repeat
+from math import copysign
+from operator import add, truediv
+from dataclasses import dataclass, field, replace
+from typing import Iterator, Optional
+from .toolpath import (
+    Toolpath, MOTION_CMD, NAN, COMMENT, CMD, HEADER, FOOTER, TOOL_CHANGE,
+    SPINDLE_ON, SPINDLE_OFF, COOLANT_ON, COOLANT_OFF, CALL,
+)
+
+# Перемещений в одном пакете format_moves(): ограничивает память при потоковой выдаче
+MOVE_BATCH = 8192
+# Предел размера кэша отформатированных слов на одну букву адреса
+WORD_CACHE_LIMIT = 1 << 16
+# Если из первых WORD_PROBE значений колонки больше половины — промахи кэша
+# (координаты из CAM не повторяются), она и следующие WORD_DIRECT колонок этой
+# буквы форматируются без кэша, затем кэш пробуется снова
+WORD_PROBE = 1024
+WORD_DIRECT = 16
+# Коды служебных операций (всё, что не G0..G3)
+_RE_SERVICE = re.compile(b"[^\\x00-\\x03]")
+_NAN_BYTES = array("d", [NAN]).tobytes()
+_DOUBLE, _INT64 = struct.Struct("d"), struct.Struct("q")
+
+# Версия формата скомпилированных профилей (см. load_profile)
+PROFILE_FORMAT = 3
+
+def cache_dir() -> str:
+    """Каталог кэша gcodegen (XDG_CACHE_HOME или ~/.cache)."""
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "gcodegen")
+
+def _compile(templates: list[str]) -> tuple:
+    """Шаблоны строк -> ((текст, нужен ли format, сырая ли строка '%'), ...).
+
+    Строки без {} форматировать не нужно: они готовы заранее.
+    """
+    return tuple((t, "{" in t or "}" in t, t.strip() == "%") for t in templates)
+
+def fixed(v: float, precision: int, sep: str = ".") -> str:
+    """Число с precision знаками после запятой в целой арифметике.
+
+    Значение переводится в целое число единиц 10^-precision (половина —
+    от нуля), целая и дробная части печатаются как целые. Ноль всегда
+    без знака: "-0.000" не выводится.
+    """
+    q = int(abs(v) * 10**precision + 0.5)
+    sign = "-" if v < 0 and q else ""
+    if not precision:
+        return f"{sign}{q}"
+    whole, frac = divmod(q, 10**precision)
+    return f"{sign}{whole}{sep}{frac:0{precision}d}"
+
+class _WordCache(dict):
+    """Кэш слов адреса: биты координаты (int64) -> " X1.000" (NaN -> "").
+
+    Ключ — целое с битами double (колонка траектории читается как
+    array("q")): у NaN он один, поэтому пустые слова тоже берутся из
+    словаря, а 0.0 и -0.0 — разные ключи.
+    """
+    __slots__ = ("letter", "precision", "sep", "misses", "direct")
+
+    def __init__(self, letter: str, precision: int, sep: str):
+        self.letter = letter
+        self.precision = precision
+        self.sep = sep
+        self.misses = 0
+        self.direct = 0     # сколько ещё пакетов форматировать без кэша
+
+    def __missing__(self, key: int) -> str:
+        self.misses += 1
+        v = _DOUBLE.unpack(_INT64.pack(key))[0]
+        s = self[key] = "" if v != v else f" {self.letter}{fixed(v, self.precision, self.sep)}"
+        return s
+
+    def column(self, part: array, raw: bytes) -> list[str]:
+        """Слова для колонки part (raw — её байты): через кэш или, если
+        повторов мало, форматированием колонки целиком (_format).
+
+        Без прямого режима первые WORD_PROBE значений идут через кэш; если
+        больше половины из них промахи, остаток колонки и следующие
+        WORD_DIRECT колонок этой буквы форматируются без кэша.
+        """
+        words: list[str] = []
+        if not self.direct:
+            n = min(len(part), WORD_PROBE)
+            misses = self.misses
+            words = list(map(self.__getitem__, array("q", raw[:8 * n])))
+            if n < WORD_PROBE or self.misses - misses <= n // 2:
+                words += map(self.__getitem__, array("q", raw[8 * n:]))
+                return words
+            self.direct = WORD_DIRECT
+            part, raw = part[n:], raw[8 * n:]
+        self.direct -= 1
+        try:
+            return words + self._format(part, raw)
+        except (ValueError, OverflowError):
+            # NaN с другими битами или бесконечность — через кэш
+            return words + list(map(self.__getitem__, array("q", raw)))
+
+    def _format(self, part: array, raw: bytes) -> list[str]:
+        """Колонка без кэша: те же слова, что у fixed(), но каждая стадия —
+        один проход map() на уровне C, а текст — один оператор % на всю
+        колонку. Совпадает с fixed() при |q| < 2^53 (q — число единиц
+        10^-precision), т.е. для любых реальных координат."""
+        nans = []
+        k = raw.find(_NAN_BYTES)
+        if k >= 0:
+            part = array("d", part)
+            while k >= 0:
+                if k % 8 == 0:
+                    nans.append(k // 8)
+                    part[k // 8] = 0.0
+                k = raw.find(_NAN_BYTES, k + 1)
+        scale = float(10**self.precision)
+        q = map(int, map(add, map(scale.__mul__, part), map(copysign, repeat(0.5), part)))
+        fmt = f" {self.letter}%.{self.precision}f\0"
+        text = (fmt * len(part)) % tuple(map(truediv, q, repeat(scale)))
+        if self.sep != ".":
+            text = text.replace(".", self.sep)
+        words = text.split("\0")
+        words.pop()
+        for k in nans:
+            words[k] = ""
+        return words
+
+    def word(self, v: float) -> str:
+        return self[_INT64.unpack(_DOUBLE.pack(v))[0]]
 
 @dataclass
 class PostConfig:
@@ -17,30 +147,162 @@ class PostConfig:
     coolant_off_cmd: str = "M9"
     spindle_on_cmd: str = "M3 S{spindle}"
     spindle_off_cmd: str = "M5"
+    # Модальное сжатие: не повторять G1/G2/G3, F и неизменившиеся X/Y/Z
+    modal: bool = False
+    # Подпрограммы (повторяющиеся слои): вызов, заголовок и возврат
+    subprogram_call_cmd: str = "M98 P{program_number}"
+    subprogram_header_template: list[str] = field(default_factory=lambda: ["O{program_number}","(SUB: {comment})"])
+    subprogram_end_cmd: str = "M99"
+    # Оценка времени (estimate.py): ускоренный ход, мм/мин, и предел
+    # ускорения, мм/с² (0 — без учёта разгона и торможения)
+    rapid_rate: float = 5000.0
+    max_accel: float = 0.0
+    # Проверка программ для этой стойки (validator.RuleSet.from_config):
+    # правила (пусто — все), отключённые правила и дополнительные
+    # допустимые коды G/M сверх KNOWN_G/KNOWN_M
+    rules: list[str] = field(default_factory=list)
+    disable_rules: list[str] = field(default_factory=list)
+    known_g: list[float] = field(default_factory=list)
+    known_m: list[float] = field(default_factory=list)
 
-class PostProcessor:
-    def __init__(self, cfg: PostConfig):
+def load_profile(path: str) -> PostConfig:
+    """Профиль поста из YAML через кэш: разобранный PostConfig хранится
+    pickle-файлом в cache_dir()/posts и перечитывается, только если у YAML
+    изменились время изменения или размер. yaml импортируется только тогда.
+    """
+    import hashlib, pickle
+    st = os.stat(path)
+    stamp = (PROFILE_FORMAT, os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    name = hashlib.sha1(stamp[1].encode("utf-8")).hexdigest() + ".pickle"
+    fn = os.path.join(cache_dir(), "posts", name)
+    try:
+        with open(fn, "rb") as f:
+            cached_stamp, cfg = pickle.load(f)
+        if cached_stamp == stamp:
+            return cfg
+    except (OSError, EOFError, ValueError, TypeError, AttributeError, pickle.UnpicklingError):
+        pass
+    import yaml
+    with open(path, 'r', encoding='utf-8') as f:
+        data = yaml.safe_load(f)
+    cfg = PostConfig(**data)
+    try:
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        tmp = f"{fn}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump((stamp, cfg), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, fn)
+    except OSError:
+        pass  # кэш недоступен на запись — просто работаем без него
+    return cfg
+
+class PostProfile:
+    """Скомпилированный профиль поста: только чтение, общий для любого числа
+    программ и потоков.
+
+    Всё, что меняется по ходу вывода (номер кадра, модальные слова), живёт
+    в PostProcessor — контексте одной программы, который выдаёт emitter().
+    Профиль хранит копию PostConfig, разобранные шаблоны шапки и кэши слов
+    координат (их заполнение из разных потоков безопасно: значение для
+    ключа всегда одно и то же).
+    """
+    __slots__ = ("cfg", "_header_src", "_header", "_word_cache")
+
+    def __init__(self, cfg: PostConfig | None = None, *, copy_cfg: bool = True):
+        if cfg is None:
+            cfg = PostConfig()
+        elif copy_cfg:
+            cfg = copy.deepcopy(cfg)
         self.cfg = cfg
+        self._header_src: list | None = None
+        self._header: tuple = ()
+        self._word_cache: dict[tuple, _WordCache] = {}
+
+    @classmethod
+    def from_yaml(cls, path: str) -> "PostProfile":
+        return cls(load_profile(path), copy_cfg=False)
+
+    @classmethod
+    def default(cls) -> "PostProfile":
+        return cls()
+
+    def replace(self, **changes) -> "PostProfile":
+        """Новый профиль с изменёнными полями PostConfig (modal=True и т.п.)."""
+        return PostProfile(replace(self.cfg, **changes), copy_cfg=False)
+
+    def emitter(self) -> "PostProcessor":
+        """Контекст вывода одной программы."""
+        return PostProcessor(self)
+
+    def header_parts(self) -> tuple:
+        src = self.cfg.header_template
+        if self._header_src is not src:
+            self._header = _compile(src)
+            self._header_src = src
+        return self._header
+
+    def words(self, letter: str) -> "_WordCache":
+        key = (letter, self.cfg.precision, self.cfg.decimal_separator)
+        cache = self._word_cache.get(key)
+        if cache is None or len(cache) > WORD_CACHE_LIMIT:
+            cache = self._word_cache[key] = _WordCache(letter, *key[1:])
+        return cache
+
+class PostProcessor:
+    """Контекст вывода одной программы по профилю (PostProfile).
+
+    PostProcessor(cfg) с PostConfig по-прежнему работает: профиль строится
+    без копии, так что изменения pp.cfg действуют, как и раньше.
+    """
+    def __init__(self, cfg: PostConfig | PostProfile):
+        self.profile = cfg if isinstance(cfg, PostProfile) else PostProfile(cfg, copy_cfg=False)
+        self.cfg = self.profile.cfg
         self._ln = 0
+        # модальное состояние: [движение, X, Y, Z, F] как отформатированные слова
+        self._modal: list = [None] * 5
+        self.bytes_saved = 0
+        # дата для {date} в шапке; None — сегодняшняя
+        self.date = None
 
     @classmethod
     def from_yaml(cls, path: str) -> "PostProcessor":
-        with open(path, 'r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
-        return cls(PostConfig(**data))
+        return cls(PostProfile.from_yaml(path))
 
     @classmethod
     def default(cls) -> "PostProcessor":
         return cls(PostConfig())
 
+    def attach_stats(self, stats) -> None:
+        """Считать блоки по типам в stats (gcodegen.stats.Stats).
+
+        Обёртки ставятся только на этот экземпляр: без attach_stats()
+        у _block и format_moves нет никаких лишних проверок.
+        """
+        block, format_moves = self._block, self.format_moves
+        counts = stats.blocks
+
+        def counted_block(text: str) -> str:
+            out = block(text)
+            stats.count_block(out)
+            return out
+
+        def counted_moves(tp: Toolpath, start: int = 0, stop: int | None = None) -> list[str]:
+            out = format_moves(tp, start, stop)
+            ops = tp.op[start:stop].tobytes()
+            for code, cmd in enumerate(MOTION_CMD):
+                counts[cmd] += ops.count(code)
+            # модальное сжатие выбрасывает перемещения без изменений
+            stats.dropped += len(ops) - len(out)
+            return out
+
+        self._block = counted_block
+        self.format_moves = counted_moves
+
     # ---------- helpers ----------
     def _num(self, v: Optional[float]) -> Optional[str]:
         if v is None:
             return None
-        s = f"{v:.{self.cfg.precision}f}"
-        if self.cfg.decimal_separator != '.':
-            s = s.replace('.', self.cfg.decimal_separator)
-        return s
+        return fixed(v, self.cfg.precision, self.cfg.decimal_separator)
 
     def _block(self, text: str) -> str:
         if not self.cfg.line_numbers:
@@ -59,32 +321,70 @@ class PostProcessor:
         Остальные – через _block.
         """
         lines = []
+        # новая программа: нумерация и модальное состояние — с начала
+        self._ln = 0
+        self._modal = [None] * 5
+        self.bytes_saved = 0
 
+        date = _dt.date.today() if self.date is None else self.date
         # Если в шаблоне есть %, выводим его сырым
-        for t in self.cfg.header_template:
-            formatted = t.format(program_number=program_number,
-                                 comment=comment,
-                                 date=_dt.date.today())
-            if formatted.strip() == "%":
-                lines.append(self._raw(formatted))
-            else:
-                lines.append(self._block(formatted))
+        for t, fmt, raw in self.profile.header_parts():
+            if fmt:
+                t = t.format(program_number=program_number, comment=comment, date=date)
+                raw = t.strip() == "%"
+            lines.append(self._raw(t) if raw else self._block(t))
 
         return "\n".join(lines)
 
-    def footer(self) -> str:
+    def footer(self, subprograms: list | tuple = ()) -> str:
+        """
+        Концовка программы. Подпрограммы (номер, комментарий, Toolpath)
+        выводятся после неё, но до завершающих строк '%'.
+        """
         lines = []
-        for t in self.cfg.footer_template:
+        self._modal = [None] * 5
+        tail = list(self.cfg.footer_template)
+        closing = []
+        while subprograms and tail and tail[-1].strip() == "%":
+            closing.insert(0, tail.pop())
+        for t in tail:
             if t.strip() == "%":
                 lines.append(self._raw(t))
             else:
                 lines.append(self._block(t))
+        for number, comment, body in subprograms:
+            lines.extend(self._subprogram(number, comment, body))
+        lines.extend(self._raw(t) for t in closing)
         return "\n".join(lines)
 
+    def _subprogram(self, program_number: int, comment: str, body: Toolpath) -> list[str]:
+        self._modal = [None] * 5
+        # O-номер подпрограммы должен стоять в начале строки — заголовок без N
+        lines = [self._raw(t.format(program_number=program_number, comment=comment))
+                 for t in self.cfg.subprogram_header_template]
+        lines.extend(filter(None, self.iter_program(body)))
+        lines.append(self._block(self.cfg.subprogram_end_cmd))
+        return lines
+
+    def call(self, program_number: int) -> str:
+        """Вызов подпрограммы (по Fanuc — M98 Pxxxx). Позиция после возврата неизвестна."""
+        self._modal = [None] * 5
+        return self._block(self.cfg.subprogram_call_cmd.format(program_number=program_number))
+
     def comment(self, text: str) -> str:
         return self._block(f"({text})")
 
     def line(self, data: dict) -> str:
+        if self.cfg.modal:
+            cmd = data.get('cmd', '').strip()
+            if cmd in MOTION_CMD and data.get('k') is None and data.get('s') is None:
+                words = [self._words(a.upper()).word(data[a]) if data.get(a) is not None else ""
+                         for a in ("x", "y", "z", "i", "j", "f")]
+                body = self._compact(cmd, *words)
+                return self._block(body) if body is not None else ""
+            if cmd:
+                # произвольная команда (G54, G91, ...) — позиция больше не известна
+                self._modal = [None] * 5
         parts = [data.get('cmd', '').strip()]
         for axis in ("x", "y", "z", "i", "j", "k", "f", "s"):
             if axis in data and data[axis] is not None:
@@ -114,4 +414,130 @@ class PostProcessor:
         """
         Выбор инструмента. По Fanuc обычно T1 M6.
         """
-        return self._block(f"T{tool} M6")
\ No newline at end of file
+        self._modal = [None] * 5
+        return self._block(f"T{tool} M6")
+
+    # ---------- toolpath ----------
+    def iter_program(self, tp: Toolpath) -> Iterator[str]:
+        """Отформатировать траекторию целиком: блоки выдаются по одному.
+
+        Подряд идущие перемещения форматируются пакетами через format_moves(),
+        служебные операции — обычными эмиттерами (header, comment, ...).
+        """
+        ops = tp.op
+        args = tp.args
+        k = 0
+        # позиции служебных операций ищем в байтах кодов, без цикла по строкам
+        for m in _RE_SERVICE.finditer(ops.tobytes()):
+            s = m.start()
+            while k < s:
+                e = min(s, k + MOVE_BATCH)
+                yield from self.format_moves(tp, k, e)
+                k = e
+            yield self._service(ops[s], args.get(s, ()), tp.subs)
+            k = s + 1
+        n = len(ops)
+        while k < n:
+            e = min(n, k + MOVE_BATCH)
+            yield from self.format_moves(tp, k, e)
+            k = e
+
+    def format_moves(self, tp: Toolpath, start: int = 0, stop: int | None = None) -> list[str]:
+        """Пакетное форматирование перемещений tp[start:stop] (только G0..G3).
+
+        Работает по колонкам: колонка целиком из NaN пропускается одним
+        сравнением байтов, остальные переводятся в слова через кэш
+        биты значения -> " X1.000" (координаты в траекториях сильно повторяются;
+        если нет — колонка форматируется целиком без кэша, см. _WordCache.column),
+        N-номера раздаются диапазоном, а блоки склеиваются одним zip.
+        Результат побайтно совпадает с построчным line().
+        """
+        if stop is None:
+            stop = len(tp)
+        n = stop - start
+        if n <= 0:
+            return []
+        cfg = self.cfg
+        cmds = map(MOTION_CMD.__getitem__, tp.op[start:stop])
+        nan_col = _NAN_BYTES * n
+        words = []
+        for letter, col in (("X", tp.x), ("Y", tp.y), ("Z", tp.z), ("I", tp.i), ("J", tp.j), ("F", tp.f)):
+            part = col[start:stop]
+            raw = part.tobytes()
+            if raw == nan_col:
+                words.append(None)
+            else:
+                words.append(self._words(letter).column(part, raw))
+        if cfg.modal:
+            words = [repeat("") if w is None else w for w in words]
+            cols = [[b for b in map(self._compact, cmds, *words) if b is not None]]
+            n = len(cols[0])
+        else:
+            cols = [cmds, *filter(None, words)]
+        if cfg.line_numbers:
+            step = cfg.line_step
+            first = self._ln + step
+            self._ln += step * n
+            cols.insert(0, map("N%d ".__mod__, range(first, self._ln + 1, step)))
+        return list(map("".join, zip(*cols)))
+
+    def _compact(self, cmd: str, x: str, y: str, z: str, i: str, j: str, f: str) -> str | None:
+        """Модальное сжатие одного перемещения; слова — вида " X1.000" или "".
+
+        Убираются повтор G1/G2/G3 (G0 всегда пишется явно — по нему валидатор
+        узнаёт быстрые ходы), повтор F и X/Y/Z, совпадающие с текущей
+        позицией (у дуг X/Y оставляем: это конечная точка). Перемещение
+        без изменений выбрасывается целиком (None). Сэкономленные байты
+        копятся в bytes_saved.
+        """
+        m = self._modal
+        full = len(cmd) + len(x) + len(y) + len(z) + len(i) + len(j) + len(f)
+        arc = cmd == "G2" or cmd == "G3"
+        if not arc:
+            if x == m[1]: x = ""
+            if y == m[2]: y = ""
+        if z == m[3]: z = ""
+        if f == m[4]: f = ""
+        if not (x or y or z or i or j or f):
+            self.bytes_saved += full + 1
+            if self.cfg.line_numbers:
+                self.bytes_saved += len(f"N{self._ln + self.cfg.line_step} ")
+            return None
+        if x: m[1] = x
+        if y: m[2] = y
+        if z: m[3] = z
+        if f: m[4] = f
+        body = x + y + z + i + j + f
+        if cmd == m[0] and cmd != "G0":
+            body = body[1:]
+        else:
+            m[0] = cmd
+            body = cmd + body
+        self.bytes_saved += full - len(body)
+        return body
+
+    def _words(self, letter: str) -> "_WordCache":
+        return self.profile.words(letter)
+
+    def _service(self, op: int, a: tuple, subs: list | tuple = ()) -> str:
+        if op == COMMENT:
+            return self.comment(*a)
+        if op == CMD:
+            return self.line({"cmd": a[0]})
+        if op == HEADER:
+            return self.header(*a)
+        if op == FOOTER:
+            return self.footer(subs)
+        if op == TOOL_CHANGE:
+            return self.tool_change(*a)
+        if op == SPINDLE_ON:
+            return self.spindle_on(*a)
+        if op == SPINDLE_OFF:
+            return self.spindle_off()
+        if op == COOLANT_ON:
+            return self.coolant_on()
+        if op == COOLANT_OFF:
+            return self.coolant_off()
+        if op == CALL:
+            return self.call(*a)
+        raise ValueError(f"Неизвестная операция траектории: {op}")
@@ -0,0 +1,325 @@
+"""serve.py — локальный HTTP-сервис генерации и проверки
+
+Минимальный HTTP/1.1 сервер на asyncio (без сторонних зависимостей):
+
+    POST /face | /round | /square   JSON-параметры задания (как в манифесте
+                                    batch) -> программа, chunked-потоком
+    POST /validate[?lang=en]        текст программы -> JSON {"warnings": [...]}
+    GET  /health                    "ok"
+    GET  /stats                     счётчики сервера (JSON)
+
+Генерация и проверка идут в пуле процессов; каждый процесс держит
+прочитанные профили постпроцессора (batch._post_for), профили из --post
+загружаются при старте процесса. Одинаковые запросы, пришедшие, пока
+первый ещё выполняется, не запускают работу повторно: они ждут тот же
+результат. Программа пишется процессом во временный файл и отдаётся
+кусками по CHUNK, так что сервер не держит её в памяти целиком.
+
+Задание принимает только параметры генератора операции (и modal); post —
+имя одного из профилей --post (имя файла без расширения или тот же путь),
+других файлов сервер не читает.
+"""
+from __future__ import annotations
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import signal
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from . import batch
+from .fanout import TOOLPATHS
+
+ROUTES = {"/face": "face", "/round": "round", "/square": "square"}
+CHUNK = 64 << 10
+MAX_BODY = 256 << 20
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error"}
+
+def _warm(posts: tuple) -> None:
+    """Инициализация процесса пула: прочитать профили заранее."""
+    # обработчик SIGTERM цикла событий наследуется при fork — процессу пула не нужен
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.set_wakeup_fd(-1)
+    for path in posts:
+        batch._post_for(path, None)
+
+def _kind(annotation) -> str:
+    if annotation is bool:
+        return "bool"
+    if annotation is str:
+        return "str"
+    if annotation in (int, float):
+        return "number"
+    return "point"          # Tuple[float, float]
+
+def _params(op: str) -> dict:
+    """Параметры генератора операции: имя -> вид значения."""
+    sig = inspect.signature(TOOLPATHS[op])
+    params = {name: _kind(p.annotation) for name, p in sig.parameters.items()}
+    for name, kind in list(params.items()):
+        if kind == "point":
+            prefix = name[:-3]
+            params[f"{prefix}_x"] = params[f"{prefix}_y"] = "number"
+    return params
+
+PARAMS = {op: _params(op) for op in set(ROUTES.values())}
+
+def _check(kind: str, value) -> bool:
+    if kind == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if kind == "bool":
+        return isinstance(value, bool)
+    if kind == "str":
+        return isinstance(value, str)
+    return (isinstance(value, list) and len(value) == 2
+            and all(_check("number", v) for v in value))
+
+def job_spec(op: str, spec: dict, posts: dict) -> dict:
+    """Задание из JSON запроса; ValueError с понятным текстом при лишних
+    ключах, неверных типах и профиле поста не из posts (имя -> путь)."""
+    params = PARAMS[op]
+    job = {}
+    for key, value in spec.items():
+        if key == "post":
+            if not isinstance(value, str) or value not in posts:
+                raise ValueError(f"неизвестный профиль поста: {value!r}")
+            job["post"] = posts[value]
+        elif key == "modal":
+            if value is not None and not isinstance(value, bool):
+                raise ValueError("modal: ожидается true, false или null")
+            job["modal"] = value
+        elif key in params:
+            if not _check(params[key], value):
+                raise ValueError(f"{key}: неверный тип значения")
+            job[key] = value
+        else:
+            raise ValueError(f"неизвестный параметр: {key!r}")
+    return job
+
+def _validate(text: str, lang: str) -> list:
+    from .validator import validate_gcode
+    return validate_gcode(text, lang)
+
+class _Shared:
+    """Результат, общий для одинаковых запросов; файл удаляется, когда
+    работа завершена и читателей не осталось."""
+    __slots__ = ("future", "users")
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.users = 0
+
+class Server:
+    def __init__(self, workers: int = 0, posts: tuple = (), tmpdir: Optional[str] = None):
+        # ошибка в профиле — сразу при старте, а не сломанным пулом
+        for path in posts:
+            batch._post_for(path, None)
+        self.pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                                        initializer=_warm, initargs=(tuple(posts),))
+        # профили, разрешённые в запросах: имя файла без расширения и сам путь
+        self.posts = {os.path.splitext(os.path.basename(p))[0]: p for p in posts}
+        self.posts.update((p, p) for p in posts)
+        self._own_tmp = tmpdir is None
+        self.tmpdir = tmpdir or tempfile.mkdtemp(prefix="gcodegen-serve-")
+        self.inflight: dict[tuple, _Shared] = {}
+        self.counters = {"requests": 0, "generated": 0, "coalesced": 0, "validated": 0,
+                         "errors": 0, "bytes_sent": 0}
+        self._seq = 0
+
+    # ---------- выполнение ----------
+    def _shared(self, key: tuple, submit) -> _Shared:
+        """Найти идущую работу с тем же ключом или запустить новую."""
+        entry = self.inflight.get(key)
+        if entry is None:
+            entry = self.inflight[key] = _Shared(asyncio.wrap_future(submit()))
+            # новые запросы после завершения — уже новая работа
+            entry.future.add_done_callback(lambda _f: self.inflight.pop(key, None))
+        else:
+            self.counters["coalesced"] += 1
+        entry.users += 1
+        return entry
+
+    async def generate(self, op: str, spec: dict, writer: asyncio.StreamWriter) -> None:
+        job = {**batch.JOB_DEFAULTS, **job_spec(op, spec, self.posts), "op": op}
+        key = ("gen", json.dumps(job, sort_keys=True, default=repr))
+
+        def submit():
+            self._seq += 1
+            job["output"] = os.path.join(self.tmpdir, f"{os.getpid()}-{self._seq}.nc")
+            self.counters["generated"] += 1
+            return self.pool.submit(batch.run_job, self._seq, job)
+
+        entry = self._shared(key, submit)
+        try:
+            # shield: отмена одного клиента не отменяет общую работу
+            r = await asyncio.shield(entry.future)
+            if r.error:
+                self.counters["errors"] += 1
+                # текст ValueError — из проверок генератора; прочее — без подробностей
+                kind, _, msg = r.error.partition(": ")
+                if kind == "ValueError":
+                    await self._send(writer, 400, msg.encode("utf-8"))
+                else:
+                    await self._send(writer, 500, b"generation failed")
+                return
+            await self._stream_file(writer, r.output)
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                # клиент мог уйти раньше, чем пул закончил: файл удаляется по готовности
+                entry.future.add_done_callback(lambda f: self._remove_output(entry, f))
+
+    @staticmethod
+    def _remove_output(entry: _Shared, future: asyncio.Future) -> None:
+        if entry.users or future.cancelled() or future.exception():
+            return
+        output = future.result().output
+        if output and os.path.exists(output):
+            os.remove(output)
+
+    async def validate(self, body: bytes, lang: str, writer: asyncio.StreamWriter) -> None:
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            raise ValueError("ожидается текст программы в UTF-8") from None
+        # ключ — хеш тела, а не сам текст (до MAX_BODY), который хешировался бы при каждом поиске
+        key = ("validate", lang, hashlib.sha256(body).digest())
+        entry = self._shared(key, lambda: self.pool.submit(_validate, text, lang))
+        try:
+            warns = await asyncio.shield(entry.future)
+        except Exception:  # сбой в пуле — соединение живёт дальше
+            self.counters["errors"] += 1
+            return await self._send(writer, 500, b"internal error")
+        finally:
+            entry.users -= 1
+        self.counters["validated"] += 1
+        body = json.dumps({"warnings": warns}, ensure_ascii=False).encode("utf-8")
+        await self._send(writer, 200, body, "application/json; charset=utf-8")
+
+    # ---------- HTTP ----------
+    async def _send(self, writer: asyncio.StreamWriter, status: int, body: bytes,
+                    ctype: str = "text/plain; charset=utf-8") -> None:
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {ctype}\r\nContent-Length: {len(body)}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        self.counters["bytes_sent"] += len(body)
+        await writer.drain()
+
+    async def _stream_file(self, writer: asyncio.StreamWriter, path: str) -> None:
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; charset=utf-8\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(CHUNK)
+                if not data:
+                    break
+                writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.counters["bytes_sent"] += len(data)
+                await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Соединение: запросы по очереди, пока клиент держит keep-alive."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    await self._send(writer, 400, b"bad request line")
+                    break
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = h.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                # только цифры: int() принял бы и "-5", "+5", "1_0"
+                value = headers.get("content-length") or "0"
+                length = int(value) if value.isascii() and value.isdigit() else -1
+                if length < 0:
+                    await self._send(writer, 400, b"bad content-length")
+                    break
+                if length > MAX_BODY:
+                    await self._send(writer, 413, b"body too large")
+                    break
+                body = await reader.readexactly(length) if length else b""
+                self.counters["requests"] += 1
+                await self._dispatch(method, target, body, writer)
+                if headers.get("connection", "").lower() == "close" or version == "HTTP/1.0":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, target: str, body: bytes,
+                        writer: asyncio.StreamWriter) -> None:
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        if path == "/health":
+            return await self._send(writer, 200, b"ok")
+        if path == "/stats":
+            stats = dict(self.counters, inflight=len(self.inflight))
+            return await self._send(writer, 200, json.dumps(stats).encode(), "application/json")
+        if path not in ROUTES and path != "/validate":
+            return await self._send(writer, 404, b"not found")
+        if method != "POST":
+            return await self._send(writer, 405, b"use POST")
+        try:
+            if path == "/validate":
+                lang = parse_qs(url.query).get("lang", ["ru"])[0]
+                return await self.validate(body, lang, writer)
+            spec = json.loads(body or b"{}")
+            if not isinstance(spec, dict):
+                raise ValueError("ожидается JSON-объект с параметрами")
+        except ValueError as e:
+            self.counters["errors"] += 1
+            return await self._send(writer, 400, str(e).encode("utf-8"))
+        try:
+            await self.generate(ROUTES[path], spec, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            raise
+        except ValueError as e:
+            self.counters["errors"] += 1
+            await self._send(writer, 400, str(e).encode("utf-8"))
+        except Exception:
+            self.counters["errors"] += 1
+            await self._send(writer, 500, b"internal error")
+
+    async def run(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.handle, host, port)
+        stop = asyncio.Event()
+        try:
+            # SIGTERM — штатная остановка: close() удалит временные файлы
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass            # Windows: только Ctrl+C
+        async with server:
+            await stop.wait()
+
+    def close(self) -> None:
+        self.pool.shutdown(cancel_futures=True)
+        if self._own_tmp:
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+def serve(host: str = "127.0.0.1", port: int = 8765, workers: int = 0, posts: tuple = ()) -> None:
+    """Запустить сервис (блокирует до Ctrl+C или SIGTERM)."""
+    srv = Server(workers, posts)
+    try:
+        asyncio.run(srv.run(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.close()
@@ -0,0 +1,317 @@
+"""simulate.py — проверка съёма материала по карте высот (NumPy)
+
+Заготовка — сетка высот Z с шагом cell (верх — z=0). Рабочие перемещения
+G1/G2/G3 (дуги — по I/J) раскладываются на точки с шагом не больше
+половины ячейки, и торцевая фреза диаметром tool_diam проходит по ним:
+высота ячейки опускается до Z инструмента, если ячейка ближе радиуса
+фрезы к осевой линии.
+
+Всё, кроме разбора траектории, делается массивами. Повторяющиеся слои
+(одна XY-геометрия на разных Z) сводятся к самому глубокому, точки
+раскладываются порциями, в каждой ячейке остаётся самый низкий Z точки,
+и затем берётся минимум по диску фрезы — построчными окнами с удвоением,
+т.е. за O(ячеек × диаметр / ячейку × log) на всю программу, а не на
+каждую точку или слой.
+
+Итог: снятый объём, глубина, площадь ниже целевой глубины (зарезы) и,
+если задана область кармана, — площадь и число островков, где целевая
+глубина не достигнута. NumPy — необязательная зависимость
+(pip install gcodegen-ru[sim]).
+"""
+from __future__ import annotations
+from math import ceil, sqrt
+from typing import List, NamedTuple, Optional
+
+from .compress import open_text
+from .estimate import RE_MODE, parse_program
+from .toolpath import Toolpath, RAPID, FEED, ARC_CW, ARC_CCW, CMD, CALL
+
+# Предел числа ячеек при автоматическом выборе шага
+MAX_CELLS = 4_000_000
+# Точек осевой линии в одной порции разбора
+CHUNK = 1 << 22
+# Допуск по Z при сравнении с целевой глубиной, мм
+Z_TOL = 0.01
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Для simulate нужен numpy: pip install gcodegen-ru[sim]") from None
+    return numpy
+
+class Region(NamedTuple):
+    """Область, которая должна быть выбрана до целевой глубины.
+
+    kind — "rect" (a, b, c, d = x0, y0, x1, y1) или "circle" (a, b, c = cx, cy, r).
+    """
+    kind: str
+    a: float
+    b: float
+    c: float
+    d: float = 0.0
+
+    def bounds(self) -> tuple:
+        if self.kind == "circle":
+            return self.a - self.c, self.b - self.c, self.a + self.c, self.b + self.c
+        return self.a, self.b, self.c, self.d
+
+def region_for(op: str, params: dict) -> Region:
+    """Область элемента по параметрам генератора (как в задании batch)."""
+    if op in ("round", "round_pocket"):
+        cx, cy = params.get("center_xy") or (params.get("center_x", 0.0), params.get("center_y", 0.0))
+        return Region("circle", cx, cy, params["diameter"] / 2.0)
+    x0, y0 = params.get("start_xy") or (params.get("start_x", 0.0), params.get("start_y", 0.0))
+    return Region("rect", x0, y0, x0 + params["width"], y0 + params["length"])
+
+class SimResult(NamedTuple):
+    cell: float                 # шаг сетки, мм
+    origin: tuple               # (x, y) центра ячейки [0, 0]
+    heights: object             # numpy-массив высот [y, x]
+    removed_volume: float       # мм³
+    min_z: float
+    gouge_area: float           # мм² ниже целевой глубины (если задана)
+    uncut_area: float           # мм² в области выше целевой глубины
+    islands: int                # связных недорезанных участков
+    rapids_in_stock: int        # G0 ниже верха заготовки (кроме отвода вверх)
+
+# ---------- перемещения ----------
+def _moves(tp: Toolpath) -> tuple:
+    """Абсолютные рабочие перемещения: списки (x0, y0, z0, x1, y1, z1, cw|-1, i, j).
+
+    Подпрограммы разворачиваются, G90/G91 и G20/G21 учитываются.
+    """
+    lines: List[tuple] = []
+    arcs: List[tuple] = []
+    rapids = [0]
+    subs = {n: body for n, _, body in tp.subs}
+    state = [0.0, 0.0, 0.0, True, 1.0]
+
+    def run(t: Toolpath, depth: int) -> None:
+        px, py, pz, absolute, scale = state
+        args = t.args
+        for k, (o, x, y, z, i, j) in enumerate(zip(t.op, t.x, t.y, t.z, t.i, t.j)):
+            if o > ARC_CCW:
+                if o == CMD:
+                    for code in RE_MODE.findall(args.get(k, ("",))[0].upper()):
+                        if code == "G90": absolute = True
+                        elif code == "G91": absolute = False
+                        elif code == "G20": scale = 25.4
+                        else: scale = 1.0
+                elif o == CALL and depth < 16 and args[k][0] in subs:
+                    state[:] = px, py, pz, absolute, scale
+                    run(subs[args[k][0]], depth + 1)
+                    px, py, pz, absolute, scale = state
+                continue
+            if absolute:
+                nx = x * scale if x == x else px
+                ny = y * scale if y == y else py
+                nz = z * scale if z == z else pz
+            else:
+                nx = px + x * scale if x == x else px
+                ny = py + y * scale if y == y else py
+                nz = pz + z * scale if z == z else pz
+            if o == RAPID:
+                # подъём по Z из материала безопасен, остальное ниже верха — нет
+                if min(nz, pz) < 0.0 and (nx != px or ny != py or nz < pz):
+                    rapids[0] += 1
+            elif o == FEED or j != j:
+                # дуга через R (parse_program) считается хордой
+                lines.append((px, py, pz, nx, ny, nz))
+            else:
+                arcs.append((px, py, pz, nx, ny, nz, o == ARC_CW, i * scale, j * scale))
+            px, py, pz = nx, ny, nz
+        state[:] = px, py, pz, absolute, scale
+
+    run(tp, 0)
+    return lines, arcs, rapids[0]
+
+def _dedup(np, a, key: list, z: int):
+    """Проходы с одинаковой XY-геометрией на постоянном Z: остаётся самый глубокий.
+
+    Фреза на том же пути выше ничего не добавляет к съёму, поэтому из
+    повторяющихся слоёв кармана в разбор идёт только последний.
+    """
+    flat = a[:, z] == a[:, z + 3]
+    if flat.sum() < 2:
+        return a
+    f = a[flat]
+    _, first, inv = np.unique(f[:, key], axis=0, return_index=True, return_inverse=True)
+    zmin = np.full(len(first), np.inf)
+    np.minimum.at(zmin, inv.ravel(), f[:, z])
+    f = f[first]
+    f[:, z] = f[:, z + 3] = zmin
+    return np.concatenate([f, a[~flat]])
+
+def _chunks(np, n, limit: int):
+    """Границы групп отрезков, в каждой не больше limit точек (или один отрезок)."""
+    ends = np.cumsum(n)
+    lo = 0
+    while lo < len(n):
+        base = ends[lo - 1] if lo else 0
+        hi = max(int(np.searchsorted(ends, base + limit, side="right")), lo + 1)
+        yield lo, hi
+        lo = hi
+
+def _spread(np, n):
+    """Номер отрезка и параметр t от 0 до 1 для каждой точки."""
+    seg = np.repeat(np.arange(len(n)), n)
+    start = np.cumsum(n) - n
+    t = (np.arange(n.sum()) - start[seg]) / np.maximum(n[seg] - 1, 1)
+    return seg, t
+
+def _samples(np, lines: list, arcs: list, step: float):
+    """Точки осевой линии (x, y, z) с шагом не больше step — порциями массивов."""
+    if lines:
+        a = _dedup(np, np.asarray(lines, dtype=float), [0, 1, 3, 4], 2)
+        n = np.ceil(np.hypot(a[:, 3] - a[:, 0], a[:, 4] - a[:, 1]) / step).astype(np.int64) + 1
+        for lo, hi in _chunks(np, n, CHUNK):
+            x0, y0, z0, x1, y1, z1 = a[lo:hi].T
+            seg, t = _spread(np, n[lo:hi])
+            yield (x0[seg] + (x1 - x0)[seg] * t, y0[seg] + (y1 - y0)[seg] * t,
+                   z0[seg] + (z1 - z0)[seg] * t)
+    if arcs:
+        a = _dedup(np, np.asarray(arcs, dtype=float), [0, 1, 3, 4, 6, 7, 8], 2)
+        x0, y0, z0, x1, y1, z1, cw, i, j = a.T
+        cx, cy = x0 + i, y0 + j
+        r = np.hypot(i, j)
+        a0 = np.arctan2(y0 - cy, x0 - cx)
+        sweep = np.arctan2(y1 - cy, x1 - cx) - a0
+        sweep = np.where(cw > 0, -sweep, sweep) % (2 * np.pi)
+        sweep = np.where(sweep < 1e-9, 2 * np.pi, sweep)   # полная окружность
+        sweep = np.where(cw > 0, -sweep, sweep)
+        n = np.ceil(r * np.abs(sweep) / step).astype(np.int64) + 1
+        for lo, hi in _chunks(np, n, CHUNK):
+            seg, t = _spread(np, n[lo:hi])
+            seg += lo
+            ang = a0[seg] + sweep[seg] * t
+            yield (cx[seg] + r[seg] * np.cos(ang), cy[seg] + r[seg] * np.sin(ang),
+                   z0[seg] + (z1 - z0)[seg] * t)
+
+def _disk_rows(radius_cells: float) -> list:
+    """Полуширина диска фрезы по строкам: [(dy, w), ...]."""
+    r = int(ceil(radius_cells))
+    return [(dy, int(sqrt(max(radius_cells ** 2 - dy * dy, 0.0))))
+            for dy in range(-r, r + 1) if dy * dy <= radius_cells ** 2]
+
+def _window_min(np, a, w: int):
+    """Минимум по окну a[:, x-w:x+w+1] для каждого x (удвоением окна)."""
+    n = 2 * w + 1
+    m = np.pad(a, ((0, 0), (w, w)), constant_values=np.inf)
+    span = 1
+    while span * 2 <= n:
+        m = np.minimum(m[:, :-span], m[:, span:])
+        span *= 2
+    width = a.shape[1]
+    return np.minimum(m[:, :width], m[:, n - span:n - span + width])
+
+def _erode(np, Z, rows: list):
+    """Минимум Z по диску фрезы вокруг каждой ячейки (построчные окна)."""
+    h = Z.shape[0]
+    out = np.full_like(Z, np.inf)
+    cache: dict = {}
+    for dy, w in rows:
+        if w not in cache:
+            cache[w] = _window_min(np, Z, w)
+        m = cache[w]
+        if dy >= 0:
+            np.minimum(out[dy:], m[:h - dy], out=out[dy:])
+        else:
+            np.minimum(out[:dy], m[-dy:], out=out[:dy])
+    return out
+
+def simulate(tp: Toolpath, tool_diam: float, depth: Optional[float] = None,
+             region: Optional[Region] = None, cell: Optional[float] = None) -> SimResult:
+    """Прогнать траекторию по карте высот.
+
+    depth — целевая глубина (положительная, мм): ниже неё — зарез, а в
+    region всё выше неё — недорез. Граница области на одну ячейку не
+    проверяется (ячейки, которые фреза задевает частично).
+    """
+    np = _numpy()
+    lines, arcs, rapids = _moves(tp)
+    R = tool_diam / 2.0
+    # габарит: концы отрезков и окружности дуг целиком, плюс радиус фрезы
+    bx: list = []
+    by: list = []
+    if lines:
+        a = np.asarray(lines, dtype=float)
+        a = a[np.minimum(a[:, 2], a[:, 5]) < 0.0]
+        bx += [a[:, 0], a[:, 3]]
+        by += [a[:, 1], a[:, 4]]
+    if arcs:
+        a = np.asarray(arcs, dtype=float)
+        cx, cy, r = a[:, 0] + a[:, 7], a[:, 1] + a[:, 8], np.hypot(a[:, 7], a[:, 8])
+        bx += [cx - r, cx + r]
+        by += [cy - r, cy + r]
+    if region is not None:
+        rx0, ry0, rx1, ry1 = region.bounds()
+        bx.append(np.array([rx0, rx1]))
+        by.append(np.array([ry0, ry1]))
+    bx = np.concatenate(bx) if bx else np.empty(0)
+    by = np.concatenate(by) if by else np.empty(0)
+    if not bx.size:
+        raise ValueError("В траектории нет рабочих перемещений")
+    x0, y0 = bx.min() - R, by.min() - R
+    x1, y1 = bx.max() + R, by.max() + R
+    if cell is None:
+        cell = max(tool_diam / 16.0, sqrt((x1 - x0) * (y1 - y0) / MAX_CELLS))
+    x0 -= 2 * cell
+    y0 -= 2 * cell
+    nx = int(ceil((x1 - x0) / cell)) + 3
+    ny = int(ceil((y1 - y0) / cell)) + 3
+
+    # точки осевой линии -> самый низкий Z в каждой ячейке -> минимум по диску фрезы
+    Z = np.full((ny, nx), np.inf)
+    for px, py, pz in _samples(np, lines, arcs, cell / 2.0):
+        keep = pz < 0.0
+        ix = np.rint((px[keep] - x0) / cell).astype(np.int64)
+        iy = np.rint((py[keep] - y0) / cell).astype(np.int64)
+        np.minimum.at(Z, (iy, ix), pz[keep])
+    H = np.minimum(_erode(np, Z, _disk_rows(R / cell)), 0.0)
+
+    area = cell * cell
+    result = dict(cell=cell, origin=(x0, y0), heights=H,
+                  removed_volume=float(-H.sum() * area), min_z=float(H.min()),
+                  gouge_area=0.0, uncut_area=0.0, islands=0, rapids_in_stock=rapids)
+    if depth is not None:
+        target = -abs(depth)
+        result["gouge_area"] = float((H < target - Z_TOL).sum() * area)
+        if region is not None:
+            inside = _region_mask(np, region, x0, y0, cell, H.shape)
+            uncut = inside & (H > target + Z_TOL)
+            result["uncut_area"] = float(uncut.sum() * area)
+            result["islands"] = _count_islands(np, uncut)
+    return SimResult(**result)
+
+def simulate_file(path: str, tool_diam: float, depth: Optional[float] = None,
+                  region: Optional[Region] = None, cell: Optional[float] = None,
+                  encoding: str = 'utf-8') -> SimResult:
+    with open_text(path, 'r', encoding=encoding) as f:
+        tp = parse_program(f)
+    return simulate(tp, tool_diam, depth, region, cell)
+
+def _region_mask(np, region: Region, x0: float, y0: float, cell: float, shape: tuple):
+    """Ячейки области, отстоящие от её границы больше чем на ячейку."""
+    gy, gx = np.mgrid[0:shape[0], 0:shape[1]]
+    x = x0 + gx * cell
+    y = y0 + gy * cell
+    if region.kind == "circle":
+        return np.hypot(x - region.a, y - region.b) <= region.c - cell
+    return ((x >= region.a + cell) & (x <= region.c - cell)
+            & (y >= region.b + cell) & (y <= region.d - cell))
+
+def _count_islands(np, mask) -> int:
+    """Число связных (по 4 соседям) участков маски."""
+    todo = set(map(tuple, np.argwhere(mask).tolist()))
+    islands = 0
+    while todo:
+        islands += 1
+        stack = [todo.pop()]
+        while stack:
+            y, x = stack.pop()
+            for nb in ((y + 1, x), (y - 1, x), (y, x + 1), (y, x - 1)):
+                if nb in todo:
+                    todo.remove(nb)
+                    stack.append(nb)
+    return islands
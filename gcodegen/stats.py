@@ -0,0 +1,142 @@
+"""stats.py — счётчики и замеры для --stats / --profile
+
+Счётчики подключаются только по запросу: PostProcessor.attach_stats()
+подменяет на экземпляре _block и format_moves обёртками, а валидатору
+отдаётся поток строк через count_lines(). Без --stats ни одна проверка
+в горячих циклах не добавляется.
+"""
+from __future__ import annotations
+import sys
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+
+from .toolpath import MOTION_CMD
+from .validator import parse_block
+
+# Типы блоков в отчёте
+BLOCK_TYPES = MOTION_CMD + ("comment", "other")
+# Слова, по которым кадр без G-кода — перемещение модального типа
+_AXES = frozenset("XYZIJR")
+
+def peak_rss_mb() -> float:
+    """Пиковая память процесса, МБ (VmHWM на Linux, иначе ru_maxrss)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+def block_type(text: str, motion: Optional[str] = None) -> tuple[str, Optional[str]]:
+    """Тип блока по тексту (с N-номером или без) и модальный код движения
+    после него. motion — код до блока: кадр с координатами без G0..G3
+    (модальное сжатие) — перемещение этого типа."""
+    b = parse_block(text)
+    if b is None:
+        return "comment", motion
+    kind = None
+    for g in b.g:
+        if g in (0, 1, 2, 3):
+            kind = motion = MOTION_CMD[g]
+        elif 80 <= g <= 89:
+            # G80 и постоянные циклы: координаты дальше — не G0..G3
+            kind = motion = None
+    if kind is None and motion and any(letter in _AXES for letter, _ in b.words):
+        kind = motion
+    return kind or "other", motion
+
+class Stats:
+    """Время по фазам, блоки по типам, записанные байты."""
+
+    def __init__(self):
+        self.phases: dict[str, float] = {}
+        self.blocks: dict[str, int] = dict.fromkeys(BLOCK_TYPES, 0)
+        self.dropped = 0        # перемещения, выброшенные модальным сжатием
+        self.bytes = 0
+        self.lines = 0
+        self.motion: Optional[str] = None   # модальный G0..G3 для count_block
+
+    def add_time(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t0)
+
+    def count_block(self, text: str) -> None:
+        if text:
+            kind, self.motion = block_type(text, self.motion)
+            self.blocks[kind] += 1
+
+    def timed(self, blocks: Iterable[str], phase: str = "format") -> Iterator[str]:
+        """Поток блоков, время получения которых копится в фазе phase.
+
+        Если запись идёт из этого потока, остальное время записи — это I/O.
+        """
+        it = iter(blocks)
+        clock = time.perf_counter
+        spent = 0.0
+        try:
+            while True:
+                t0 = clock()
+                try:
+                    b = next(it)
+                except StopIteration:
+                    return
+                finally:
+                    spent += clock() - t0
+                yield b
+        finally:
+            self.add_time(phase, spent)
+
+    def count_lines(self, lines: Iterable[str]) -> Iterator[str]:
+        """Поток строк для валидатора: считает строки, байты и типы кадров."""
+        blocks = self.blocks
+        motion = None
+        for raw in lines:
+            self.lines += 1
+            self.bytes += len(raw)
+            body = raw.strip()
+            if body:
+                kind, motion = block_type(body, motion)
+                blocks[kind] += 1
+            yield raw
+
+    def report(self) -> list[tuple[str, str]]:
+        """Строки отчёта (название, значение)."""
+        rows = [(f"time {name}", f"{sec:.3f} s") for name, sec in self.phases.items()]
+        rows += [(f"blocks {t}", str(n)) for t, n in self.blocks.items() if n]
+        if self.dropped:
+            rows.append(("blocks dropped (modal)", str(self.dropped)))
+        if self.lines:
+            rows.append(("lines", str(self.lines)))
+        rows.append(("bytes", str(self.bytes)))
+        rows.append(("peak memory", f"{peak_rss_mb():.1f} MB"))
+        return rows
+
+@contextmanager
+def profile(path: Optional[str]):
+    """cProfile вокруг блока; статистика pstats пишется в path (None — выключено)."""
+    if not path:
+        yield
+        return
+    import cProfile
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        prof.dump_stats(path)
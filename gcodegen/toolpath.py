@@ -0,0 +1,177 @@
+"""toolpath.py — компактное промежуточное представление траектории (IR)
+
+Геометрия (core.py) заполняет Toolpath, постпроцессор (post.py) превращает
+его в текст целиком. Траектория хранится колонками array: код операции
+(1 байт) и координаты x, y, z, i, j, f (по 8 байт), т.е. ~49 байт на
+перемещение вместо словаря и строки на каждый блок. Отсутствующая
+координата хранится как NaN.
+
+Помимо перемещений G0/G1/G2/G3 в том же потоке лежат служебные операции
+(комментарий, заголовок, смена инструмента и т.п.) — их аргументы хранятся
+в разреженном словаре args по номеру строки.
+
+Подпрограммы (повторяющийся слой по XY) хранятся отдельными Toolpath в
+subs и выводятся постпроцессором после основной программы.
+"""
+from __future__ import annotations
+from array import array
+from typing import Optional
+
+# Коды операций: перемещения
+RAPID = 0      # G0
+FEED = 1       # G1
+ARC_CW = 2     # G2
+ARC_CCW = 3    # G3
+# Коды операций: служебные блоки
+COMMENT = 4
+CMD = 5
+HEADER = 6
+FOOTER = 7
+TOOL_CHANGE = 8
+SPINDLE_ON = 9
+SPINDLE_OFF = 10
+COOLANT_ON = 11
+COOLANT_OFF = 12
+CALL = 13       # вызов подпрограммы (M98 P...)
+
+MOTION_CMD = ("G0", "G1", "G2", "G3")
+
+NAN = float("nan")
+
+def _v(v: Optional[float]) -> float:
+    return NAN if v is None else v
+
+class Toolpath:
+    """Последовательность операций программы в колоночном виде.
+
+    Объект можно сохранить (pickle), преобразовать (translate) и повторно
+    отдать любому PostProcessor без пересчёта геометрии.
+    """
+    __slots__ = ("op", "x", "y", "z", "i", "j", "f", "args", "subs")
+
+    def __init__(self):
+        self.op = array("B")
+        self.x = array("d")
+        self.y = array("d")
+        self.z = array("d")
+        self.i = array("d")
+        self.j = array("d")
+        self.f = array("d")
+        self.args: dict[int, tuple] = {}
+        # подпрограммы: (номер, комментарий, тело)
+        self.subs: list[tuple[int, str, "Toolpath"]] = []
+
+    def __len__(self) -> int:
+        return len(self.op)
+
+    # ---------- заполнение ----------
+    def _push(self, op: int, x: float = NAN, y: float = NAN, z: float = NAN,
+              i: float = NAN, j: float = NAN, f: float = NAN) -> None:
+        self.op.append(op)
+        self.x.append(x); self.y.append(y); self.z.append(z)
+        self.i.append(i); self.j.append(j); self.f.append(f)
+
+    def _service(self, op: int, *args) -> None:
+        if args:
+            self.args[len(self.op)] = args
+        self._push(op)
+
+    def rapid(self, x: float | None = None, y: float | None = None, z: float | None = None) -> None:
+        self._push(RAPID, _v(x), _v(y), _v(z))
+
+    def feed(self, x: float | None = None, y: float | None = None, z: float | None = None, f: float | None = None) -> None:
+        self._push(FEED, _v(x), _v(y), _v(z), f=_v(f))
+
+    def arc(self, cw: bool, x: float, y: float, i: float, j: float,
+            f: float | None = None, z: float | None = None) -> None:
+        """Дуга G2 (cw=True) или G3 с центром I/J относительно начальной точки."""
+        self._push(ARC_CW if cw else ARC_CCW, x, y, _v(z), i, j, _v(f))
+
+    def comment(self, text: str) -> None:
+        self._service(COMMENT, text)
+
+    def cmd(self, text: str) -> None:
+        """Произвольная строка команд без координат (G17 G21 G90, G54, ...)."""
+        self._service(CMD, text)
+
+    def header(self, program_number: int, comment: str = "PROGRAM") -> None:
+        self._service(HEADER, program_number, comment)
+
+    def footer(self) -> None:
+        self._service(FOOTER)
+
+    def tool_change(self, tool: int) -> None:
+        self._service(TOOL_CHANGE, tool)
+
+    def spindle_on(self, spindle: int) -> None:
+        self._service(SPINDLE_ON, spindle)
+
+    def spindle_off(self) -> None:
+        self._service(SPINDLE_OFF)
+
+    def coolant_on(self) -> None:
+        self._service(COOLANT_ON)
+
+    def coolant_off(self) -> None:
+        self._service(COOLANT_OFF)
+
+    def subprogram(self, program_number: int, comment: str, body: "Toolpath") -> None:
+        """Зарегистрировать подпрограмму; вызывается через call()."""
+        self.subs.append((program_number, comment, body))
+
+    def call(self, program_number: int) -> None:
+        self._service(CALL, program_number)
+
+    def extend(self, other: "Toolpath", drop: tuple = ()) -> None:
+        """Дописать операции other, кроме кодов из drop. Подпрограммы не переносятся."""
+        if not drop:
+            base = len(self.op)
+            self.op.extend(other.op)
+            for name in ("x", "y", "z", "i", "j", "f"):
+                getattr(self, name).extend(getattr(other, name))
+            self.args.update((base + k, a) for k, a in other.args.items())
+            return
+        args = other.args
+        for k, o in enumerate(other.op):
+            if o in drop:
+                continue
+            if k in args:
+                self.args[len(self.op)] = args[k]
+            self._push(o, other.x[k], other.y[k], other.z[k], other.i[k], other.j[k], other.f[k])
+
+    # ---------- преобразования ----------
+    def translate(self, dx: float = 0.0, dy: float = 0.0, dz: float = 0.0) -> "Toolpath":
+        """Копия траектории, сдвинутая на (dx, dy, dz). I/J относительные и не меняются."""
+        tp = Toolpath()
+        tp.op = array("B", self.op)
+        tp.x = array("d", (v + dx for v in self.x))
+        tp.y = array("d", (v + dy for v in self.y))
+        tp.z = array("d", (v + dz for v in self.z))
+        tp.i = array("d", self.i)
+        tp.j = array("d", self.j)
+        tp.f = array("d", self.f)
+        tp.args = dict(self.args)
+        tp.subs = [(n, c, body.translate(dx, dy, dz)) for n, c, body in self.subs]
+        return tp
+
+    def retime(self, feed_from: float, feed_to: float, spindle: Optional[int] = None) -> "Toolpath":
+        """Копия с подачей feed_to вместо feed_from (прочие F — пропорционально)
+        и, если задано, оборотами spindle — без пересчёта геометрии."""
+        if feed_from == 0:
+            raise ValueError("Подачу 0 нельзя пересчитать пропорционально")
+        tp = Toolpath()
+        tp.op = array("B", self.op)
+        tp.x = array("d", self.x)
+        tp.y = array("d", self.y)
+        tp.z = array("d", self.z)
+        tp.i = array("d", self.i)
+        tp.j = array("d", self.j)
+        k = feed_to / feed_from
+        tp.f = array("d", (feed_to if v == feed_from else v * k for v in self.f))
+        tp.args = dict(self.args)
+        if spindle is not None:
+            for pos, o in enumerate(self.op):
+                if o == SPINDLE_ON:
+                    tp.args[pos] = (spindle,)
+        tp.subs = [(n, c, body.retime(feed_from, feed_to, spindle)) for n, c, body in self.subs]
+        return tp
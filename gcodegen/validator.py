@@ -1,8 +1,12 @@
 """validator.py — расширенные проверки"""
 from __future__ import annotations
-from typing import List
+from typing import Callable, Iterable, List, NamedTuple, Optional
+import io
+import os
 import re
 
+from .compress import codec, open_binary, open_text
+
 MSG = {
     'ru': {
         'no_g17': 'Нет G17 (плоскость XY)',
@@ -50,140 +54,803 @@ MSG = {
     }
 }
 
-RE_BLOCK = re.compile(r"^(?:N\d+\s+)?(?P<body>.*)$", re.I)
-RE_FLOAT = r"[-+]?\d+(?:\.\d+)?"
-RE_FEED = re.compile(r"F(" + RE_FLOAT + ")", re.I)
-RE_Z = re.compile(r"Z(" + RE_FLOAT + ")", re.I)
-RE_G = re.compile(r"G(\d+)", re.I)
-RE_M = re.compile(r"M(\d+)", re.I)
+RE_N = re.compile(r"N\d+\s+", re.I)
+# Глобальные проверки: G17/G21/G90/G54..G59 где-либо в тексте (как подстрока)
+RE_GLOBAL = re.compile(r"G17|G21|G90|G5[4-9]")
+RE_COMMENT = re.compile(r"\([^)]*\)?|;.*")
+# Слово G-кода: буква + число
+RE_WORD = re.compile(r"([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))")
+# Только слова, нужные проверкам валидатора: X/Y и прочие буквы регулярка
+# пропускает, не создавая для них кортежей — это основная экономия на кадр
+RE_CHECK_WORD = re.compile(r"([GMFZRIJ])\s*([-+]?(?:\d+\.?\d*|\.\d+))")
+
+def tokenize(body: str, word_re: re.Pattern = RE_WORD) -> list[tuple[str, str]]:
+    """Слова кадра [(буква, значение), ...]; коды внутри комментариев не считаются."""
+    body = body.upper()
+    if '(' in body or ';' in body:
+        body = RE_COMMENT.sub(' ', body)
+    return word_re.findall(body)
+
+class Block(NamedTuple):
+    """Разобранный кадр: слова (буква, значение) и выделенные из них коды.
+
+    g, m — коды G/M (int, либо float для G54.1 и т.п.), f — все F в кадре,
+    z — первое Z (или None), arc_center — есть ли R/I/J. Все поля —
+    неизменяемые, поэтому кадр можно кэшировать и отдавать нескольким проверкам.
+    """
+    body: str
+    words: tuple
+    g: tuple
+    m: tuple
+    f: tuple
+    z: Optional[float]
+    arc_center: bool
+
+def parse_block(line: str, word_re: re.Pattern = RE_WORD) -> Block | None:
+    """Разобрать строку программы за один проход токенизатора.
+
+    Возвращает None для пустых строк и строк-комментариев. word_re задаёт,
+    какие слова попадут в Block.words (по умолчанию — все).
+    """
+    line = line.strip()
+    mm = RE_N.match(line)
+    body = line[mm.end():] if mm else line
+    if not body or body[0] == '(':
+        return None
+    return parse_body(body, word_re)
+
+def parse_body(body: str, word_re: re.Pattern = RE_WORD) -> Block:
+    """Разобрать тело кадра (без N-номера)."""
+    words = tokenize(body, word_re)
+    g = mc = f = ()
+    z = None
+    arc_center = False
+    for letter, val in words:
+        if letter == 'G':
+            g += (int(val) if val.isdigit() else float(val),)
+        elif letter == 'M':
+            mc += (int(val) if val.isdigit() else float(val),)
+        elif letter == 'F':
+            f += (float(val),)
+        elif letter == 'Z':
+            if z is None:
+                z = float(val)
+        elif letter == 'R' or letter == 'I' or letter == 'J':
+            arc_center = True
+    return Block(body, tuple(words), g, mc, f, z, arc_center)
 
 # Коды, которые считаем допустимыми (минимальный набор). Можно расширять.
 KNOWN_G = {0,1,2,3,17,18,19,20,21,28,40,41,42,43,49,54,55,56,57,58,59,80,81,82,83,84,85,86,87,88,89,90,91}
-KNOWN_M = {0,1,2,3,5,6,8,9,30}
+KNOWN_M = {0,1,2,3,5,6,8,9,30,98,99}
+
+# ---------- правила ----------
+# Правило — функция check(b, s, warn): b — Block, s — ScanState, warn(key)
+# — добавить предупреждение: готовое сообщение, кортеж условного
+# сообщения (см. ChunkResult) или LINE — «длинная строка» с номером
+# текущей строки. Триггеры правила — коды и слова, при которых его
+# вызывать: "G1", "M98" — код в кадре, "G"/"M" — любой G/M-код, "F"/"Z" —
+# слово в кадре, "*" — каждый кадр. Порядок регистрации — порядок
+# предупреждений внутри кадра.
+#
+# Правило должно зависеть только от кадра и модального состояния в s:
+# для повторяющегося кадра при неизменном состоянии его предупреждения
+# берутся из кэша, и правила не вызываются.
+
+# Ключ «номер текущей строки» (см. ChunkResult.warns)
+LINE = object()
+
+# Номер модального состояния (шпиндель, СОЖ, подача) — один и тот же во
+# всех проходах, чтобы кэш кадров IncrementalValidator не устаревал
+_states: dict[tuple, int] = {}
+
+def _state_id(state: tuple) -> int:
+    return _states.setdefault(state, len(_states))
+
+class Rule(NamedTuple):
+    name: str
+    triggers: tuple
+    check: Callable
+
+RULES: dict[str, Rule] = {}
+
+def rule(name: str, *triggers: str):
+    """Декоратор: зарегистрировать функцию check как правило name.
+
+    Правило попадает в наборы правил, созданные после регистрации, и в
+    набор по умолчанию.
+    """
+    def register(check: Callable) -> Callable:
+        global _default
+        RULES[name] = Rule(name, triggers, check)
+        _default = None
+        return check
+    return register
+
+def _tokens(b: Block) -> set:
+    t = {"*"}
+    if b.g:
+        t.add("G")
+        t.update(f"G{g}" for g in b.g)
+    if b.m:
+        t.add("M")
+        t.update(f"M{mc}" for mc in b.m)
+    if b.f:
+        t.add("F")
+    if b.z is not None:
+        t.add("Z")
+    return t
+
+class RuleSet:
+    """Набор включённых правил и их настройки; таблица кадр -> правила.
+
+    Для кадра набор правил определяется его G/M-кодами и наличием F и Z;
+    он считается один раз на такую сигнатуру (таблица по триггерам), так что
+    неприменимые правила не вызываются вовсе.
+    """
+
+    def __init__(self, names: Optional[Iterable[str]] = None, disable: Iterable[str] = (),
+                 known_g: Iterable = (), known_m: Iterable = (),
+                 max_line: int = 80, min_z: float = -1000.0):
+        names = list(RULES) if names is None else list(names)
+        disable = set(disable)
+        unknown = [n for n in (*names, *disable) if n not in RULES]
+        if unknown:
+            raise ValueError(f"Неизвестные правила: {', '.join(unknown)}")
+        self.rules = tuple(RULES[n] for n in names if n not in disable)
+        self.known_g = KNOWN_G | set(known_g)
+        self.known_m = KNOWN_M | set(known_m)
+        self.max_line = max_line
+        self.min_z = min_z
+        self.timings: dict[str, list] | None = None
+        self._checks = tuple(r.check for r in self.rules)
+        self._by_trigger: dict[str, list] = {}
+        for k, r in enumerate(self.rules):
+            for t in r.triggers:
+                self._by_trigger.setdefault(t, []).append(k)
+        self._table: dict[tuple, tuple] = {}
+
+    @classmethod
+    def from_config(cls, cfg) -> "RuleSet":
+        """Набор правил профиля поста (поля rules, disable_rules, known_g, known_m PostConfig)."""
+        return cls(getattr(cfg, "rules", None) or None, getattr(cfg, "disable_rules", ()),
+                   getattr(cfg, "known_g", ()), getattr(cfg, "known_m", ()))
+
+    @property
+    def names(self) -> tuple:
+        return tuple(r.name for r in self.rules)
+
+    def for_block(self, b: Block) -> tuple:
+        key = (b.g, b.m, bool(b.f), b.z is not None)
+        checks = self._table.get(key)
+        if checks is None:
+            hit = sorted({k for t in _tokens(b) for k in self._by_trigger.get(t, ())})
+            checks = self._table[key] = tuple(self._checks[k] for k in hit)
+        return checks
+
+    def timed(self) -> "RuleSet":
+        """Копия, считающая вызовы и время каждого правила (в timings: имя -> [вызовы, с])."""
+        from time import perf_counter
+        rs = RuleSet.__new__(RuleSet)
+        rs.__dict__.update(self.__dict__)
+        rs.timings = {r.name: [0, 0.0] for r in self.rules}
+
+        def wrap(name: str, check: Callable) -> Callable:
+            acc = rs.timings[name]
+
+            def timed_check(b, s, warn):
+                t0 = perf_counter()
+                check(b, s, warn)
+                acc[1] += perf_counter() - t0
+                acc[0] += 1
+            return timed_check
+
+        rs._checks = tuple(wrap(r.name, r.check) for r in self.rules)
+        rs._table = {}
+        return rs
+
+@rule("long_line", "*")
+def _long_line(b, s, warn):
+    if len(b.body) > s.rules.max_line:
+        warn(LINE)
+
+@rule("unknown_code", "G", "M")
+def _unknown_code(b, s, warn):
+    for gcode in b.g:
+        if gcode not in s.rules.known_g:
+            warn(s.m['unknown_code'].format(code=f"G{gcode}"))
+    for mcode in b.m:
+        if mcode not in s.rules.known_m:
+            warn(s.m['unknown_code'].format(code=f"M{mcode}"))
+
+@rule("dup_feed", "F")
+def _dup_feed(b, s, warn):
+    if len(b.f) > 1:
+        warn(s.m['dup_feed'])
+
+@rule("absurd_z", "Z")
+def _absurd_z(b, s, warn):
+    if b.z < s.rules.min_z:
+        warn(s.m['absurd_z'].format(z=b.z))
+
+@rule("g0_down", "G0")
+def _g0_down(b, s, warn):
+    if b.z is not None and b.z < 0:
+        warn(s.m['g0_down'])
+
+# Проверки на G1 (None — состояние на входе в кусок ещё не известно)
+@rule("g1_before_m3", "G1")
+def _g1_before_m3(b, s, warn):
+    if s.spindle_on is not True:
+        warn(_cond(s.m['g1_before_m3'], s.spindle_on, 0))
+
+@rule("g1_no_feed", "G1")
+def _g1_no_feed(b, s, warn):
+    if s.feed_ok is not True:
+        warn(_cond(s.m['g1_no_feed'], s.feed_ok, 2))
+
+@rule("coolant_before_cut", "G1")
+def _coolant_before_cut(b, s, warn):
+    if s.coolant_on is not True:
+        warn(_cond(s.m['coolant_before_cut'], s.coolant_on, 1))
+
+@rule("g0_with_feed", "G0")
+def _g0_with_feed(b, s, warn):
+    if b.f:
+        warn(s.m['g0_with_feed'])
+
+@rule("arc_no_radius", "G2", "G3")
+def _arc_no_radius(b, s, warn):
+    if not b.arc_center:
+        warn(s.m['arc_no_radius'])
+
+# Предел кэша разобранных кадров в validate_lines()
+BLOCK_CACHE_LIMIT = 1 << 14
+
+# Параллельная проверка: размер куска файла, байт
+CHUNK_MIN = 1 << 20
+CHUNK_MAX = 64 << 20
+
+# Состояние на входе в кусок: (spindle_on, coolant_on, feed_ok, g91_mode,
+# saw_m30, call_state). В начале файла всё известно; кусок из середины
+# файла сканируется с неизвестным входом: None в трёхзначных флагах
+# означает «как на входе», _UNKNOWN в call_state — «вызов неизвестен».
+_UNKNOWN = ...
+START_STATE = (False, False, False, False, False, None)
+_SYMBOLIC = (None, None, None, None, None, _UNKNOWN)
+
+class _NeedState(Exception):
+    """Кусок нельзя проверить без входного состояния (начало подпрограммы)."""
+
+class ChunkResult(NamedTuple):
+    """Итог сканирования куска.
+
+    warns — ключи предупреждений по порядку первого появления: str —
+    готовое сообщение, int — номер длинной строки внутри куска, кортеж
+    (сообщение, k) — сообщение выводится, если k-й флаг на входе
+    (0 — шпиндель, 1 — СОЖ, 2 — подача) окажется False.
+    """
+    warns: tuple
+    lines: int
+    globals: tuple
+    state: tuple
+    safe_z_ok: bool
+    saw_m5: bool
+    saw_m9: bool
+
+def _cond(msg: str, v: Optional[bool], k: int):
+    return msg if v is False else (msg, k)
+
+_default: RuleSet | None = None
+
+def default_rules() -> RuleSet:
+    """Все зарегистрированные правила с настройками по умолчанию."""
+    global _default
+    if _default is None:
+        _default = RuleSet()
+    return _default
+
+def validate_gcode(text: str, lang: str = 'ru', safe_min: float = 0.0,
+                   rules: RuleSet | None = None) -> List[str]:
+    return validate_lines(text.splitlines(), lang, safe_min, rules)
+
+def validate_file(path: str, lang: str = 'ru', safe_min: float = 0.0, encoding: str = 'utf-8',
+                  jobs: int = 1, chunk_size: int | None = None, rules: RuleSet | None = None) -> List[str]:
+    """Проверка файла построчно: в памяти не держится ничего, кроме текущей строки.
+
+    jobs > 1 (0 — по числу ядер) — файл режется на куски по границам строк
+    и проверяется в пуле процессов; результат совпадает с jobs=1.
+    Кодировка должна быть совместима с ASCII (utf-8, cp1251 и т.п.).
+    rules — набор правил (по умолчанию — все зарегистрированные).
+    """
+    if jobs != 1:
+        return validate_file_parallel(path, lang, safe_min, encoding, jobs, chunk_size, rules)
+    with open_text(path, 'r', encoding=encoding) as f:
+        return validate_lines(f, lang, safe_min, rules)
+
+def validate_lines(lines: Iterable[str], lang: str = 'ru', safe_min: float = 0.0,
+                   rules: RuleSet | None = None) -> List[str]:
+    """Проверка потока строк за один проход с постоянной памятью.
+
+    Глобальные проверки (G17/G21/G90/G54..G59 где-либо в тексте) ведутся
+    флагами по ходу чтения. Предупреждения сразу складываются в
+    упорядоченный словарь без дублей, поэтому их число не растёт с размером
+    файла. Результат совпадает с validate_gcode() на том же тексте.
+    """
+    m = MSG.get(lang, MSG['ru'])
+    return _finish(m, [_scan(lines, m, safe_min, START_STATE, rules=rules)])
 
-def validate_gcode(text: str, lang: str = 'ru', safe_min: float = 0.0) -> List[str]:
+def _chunks(path: str, n: int, chunk_size: int | None) -> List[tuple]:
+    """Байтовые диапазоны [start, stop) по границам строк (после '\\n')."""
+    size = os.path.getsize(path)
+    if chunk_size is None:
+        chunk_size = min(max(size // (n * 4), CHUNK_MIN), CHUNK_MAX)
+    bounds = [0]
+    with open(path, 'rb') as f:
+        pos = chunk_size
+        while pos < size:
+            f.seek(pos)
+            f.readline()
+            pos = f.tell()
+            if pos >= size:
+                break
+            bounds.append(pos)
+            pos += chunk_size
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+def _scan_range(path: str, start: int, stop: int, lang: str, safe_min: float,
+                encoding: str, state: tuple, rules: RuleSet | None = None) -> ChunkResult | None:
+    """Проверить байты [start, stop) файла. None — нужен вход (см. _NeedState)."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(stop - start)
+    return _scan_bytes(data, lang, safe_min, encoding, state, rules)
+
+def _scan_bytes(data: bytes, lang: str, safe_min: float, encoding: str,
+                state: tuple, rules: RuleSet | None = None) -> ChunkResult | None:
+    # newline=None — те же правила разбиения строк, что у open() в validate_file
+    lines = io.StringIO(data.decode(encoding), newline=None)
+    try:
+        return _scan(lines, MSG.get(lang, MSG['ru']), safe_min, state, rules=rules)
+    except _NeedState:
+        return None
+
+def validate_file_parallel(path: str, lang: str = 'ru', safe_min: float = 0.0, encoding: str = 'utf-8',
+                           jobs: int = 0, chunk_size: int | None = None,
+                           rules: RuleSet | None = None) -> List[str]:
+    """Проверка файла кусками в пуле процессов.
+
+    Первый кусок сканируется с известным начальным состоянием, остальные —
+    с неизвестным: проверки, зависящие от входа (G1 до M3/M8/F), сохраняются
+    условными и разрешаются при сшивке кусков по порядку. Кусок, которому
+    вход нужен по существу (начало подпрограммы после M30), перепроверяется
+    с известным состоянием уже при сшивке.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    jobs = jobs or os.cpu_count() or 1
+    if codec(path):
+        return _validate_stream_parallel(path, lang, safe_min, encoding, jobs, chunk_size, rules)
+    ranges = _chunks(path, jobs, chunk_size)
+    m = MSG.get(lang, MSG['ru'])
+    if jobs == 1 or len(ranges) == 1:
+        with open_text(path, 'r', encoding=encoding) as f:
+            return validate_lines(f, lang, safe_min, rules)
+    with ProcessPoolExecutor(max_workers=min(jobs, len(ranges))) as pool:
+        futures = [pool.submit(_scan_range, path, a, b, lang, safe_min, encoding,
+                               START_STATE if a == 0 else _SYMBOLIC, rules)
+                   for a, b in ranges]
+        results = (fut.result() for fut in futures)
+        return _finish(m, results, lambda k, state: _scan_range(path, *ranges[k], lang, safe_min, encoding, state, rules))
+
+def _validate_stream_parallel(path: str, lang: str, safe_min: float, encoding: str,
+                              jobs: int, chunk_size: int | None, rules: RuleSet | None) -> List[str]:
+    """Сжатый файл: распаковка потоком в этом процессе, проверка кусков — в пуле.
+
+    По распакованному потоку не перейти к смещению, поэтому куски
+    отрезаются по ходу чтения; в работе не больше 2 × jobs кусков.
+    """
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    chunk_size = chunk_size or CHUNK_MIN * 4
     m = MSG.get(lang, MSG['ru'])
-    warns: List[str] = []
+    current = [b""]
+
+    def results(pool, f):
+        pending: deque = deque()
+        state = START_STATE
+        while True:
+            while len(pending) < 2 * jobs:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                data += f.readline()
+                pending.append((data, pool.submit(_scan_bytes, data, lang, safe_min, encoding, state, rules)))
+                state = _SYMBOLIC
+            if not pending:
+                return
+            current[0], fut = pending.popleft()
+            yield fut.result()
+
+    with open_binary(path) as f, ProcessPoolExecutor(max_workers=jobs) as pool:
+        return _finish(m, results(pool, f), lambda k, state: _scan_bytes(current[0], lang, safe_min, encoding, state, rules))
+
+def _finish(m: dict, results: Iterable[ChunkResult | None], rescan=None) -> List[str]:
+    """Сшить результаты кусков по порядку и собрать итоговый список."""
+    warns: dict[str, None] = {}
+    warn = warns.setdefault
+    flags = [False] * 4
+    spindle_on, coolant_on, feed_ok, g91_mode, saw_m30, call_state = START_STATE
+    safe_z_ok = saw_m5 = saw_m9 = False
+    offset = 0
+
+    for k, r in enumerate(results):
+        entry = (spindle_on, coolant_on, feed_ok, g91_mode, saw_m30, call_state)
+        if r is None:
+            r = rescan(k, entry)
+        for key in r.warns:
+            if key.__class__ is str:
+                warn(key)
+            elif key.__class__ is int:
+                warn(m['long_line'].format(n=offset + key))
+            elif entry[key[1]] is False:
+                warn(key[0])
+        offset += r.lines
+        flags = [a or b for a, b in zip(flags, r.globals)]
+        s, c, fo, g91, m30, call = r.state
+        spindle_on = spindle_on if s is None else s
+        coolant_on = coolant_on if c is None else c
+        feed_ok = feed_ok if fo is None else fo
+        g91_mode = g91_mode if g91 is None else g91
+        saw_m30 = saw_m30 if m30 is None else m30
+        if call is not _UNKNOWN:
+            call_state = call if call is None else tuple(
+                entry[i] if v is None else v for i, v in enumerate(call))
+        safe_z_ok = safe_z_ok or r.safe_z_ok
+        saw_m5 = saw_m5 or r.saw_m5
+        saw_m9 = saw_m9 or r.saw_m9
+
+    # Итоги
+    has_g17, has_g21, has_g90, has_wcs = flags
+    head: List[str] = []
+    if not has_g17: head.append(m['no_g17'])
+    if not has_g21: head.append(m['no_g21'])
+    if not has_g90: head.append(m['no_g90'])
+    if not has_wcs: head.append(m['no_wcs'])
+    result = head + list(warns)
+    if g91_mode:
+        result.append(m['g91_mode'])
+    if not saw_m30:
+        result.append(m['missing_footer'])
+    if not saw_m5:
+        result.append(m['no_spindle_off'])
+    if not saw_m9:
+        result.append(m['no_coolant_off'])
+    if not safe_z_ok:
+        result.append(m['no_safe_retract'])
+
+    return list(dict.fromkeys(result))  # убираем дубли
+
+class ScanState:
+    """Что видят правила: модальное состояние на текущем кадре.
+
+    spindle_on, coolant_on, feed_ok — True/False, либо None, если это
+    состояние на входе куска ещё не известно (параллельная проверка).
+    """
+    __slots__ = ("m", "rules", "version", "spindle_on", "coolant_on", "feed_ok")
+
+    def __init__(self, m: dict, rules: "RuleSet", spindle_on, coolant_on, feed_ok):
+        self.m = m
+        self.rules = rules
+        self.version = _state_id((spindle_on, coolant_on, feed_ok))
+        self.spindle_on = spindle_on
+        self.coolant_on = coolant_on
+        self.feed_ok = feed_ok
+
+    def set(self, spindle_on, coolant_on, feed_ok) -> None:
+        if (spindle_on, coolant_on, feed_ok) != (self.spindle_on, self.coolant_on, self.feed_ok):
+            self.spindle_on = spindle_on
+            self.coolant_on = coolant_on
+            self.feed_ok = feed_ok
+            self.version = _state_id((spindle_on, coolant_on, feed_ok))
+
+def _scan(lines: Iterable[str], m: dict, safe_min: float, state: tuple,
+          cache: dict | None = None, rules: "RuleSet | None" = None) -> ChunkResult:
+    """Один проход по строкам; общий для последовательной и параллельной проверки.
+
+    Здесь ведётся только модальное состояние; предупреждения выдают правила
+    из rules (по умолчанию — все зарегистрированные), каждому кадру — лишь
+    те, чьи триггеры в нём есть. cache — кэш разобранных кадров, общий для
+    нескольких проходов (у IncrementalValidator куски короткие, и свой кэш
+    на кусок не окупается).
+    """
+    if rules is None:
+        rules = default_rules()
+    for_block = rules.for_block
+    warns: dict = {}
+    warn = warns.setdefault
 
     # Глобальные флаги
-    if 'G17' not in text: warns.append(m['no_g17'])
-    if 'G21' not in text: warns.append(m['no_g21'])
-    if 'G90' not in text: warns.append(m['no_g90'])
-    if not any(g in text for g in ('G54', 'G55', 'G56', 'G57', 'G58', 'G59')):
-        warns.append(m['no_wcs'])
-
-    spindle_on = False
-    coolant_on = False
-    feed_current = None
-    absurd = -1000.0
-    g91_mode = False
+    has_g17 = has_g21 = has_g90 = has_wcs = False
+    globals_seen = False
+
+    spindle_on, coolant_on, feed_ok, g91_mode, saw_m30, call_state = state
+    s = ScanState(m, rules, spindle_on, coolant_on, feed_ok)
     last_safe_z_ok = False
 
     # для footer
-    saw_m30 = False
     saw_m5 = False
     saw_m9 = False
 
-    lines = text.splitlines()
+    # тело кадра -> [Block, правила, версия состояния, предупреждения кадра при ней]
+    blocks: dict[str, list] | None = {} if cache is None else cache
+    hits = 0
+    idx = 0
+
+    # call_state — состояние на момент вызова подпрограммы (M98): подпрограммы
+    # лежат после M30, и проверять их нужно в том состоянии, в котором их вызывают
+
     for idx, raw in enumerate(lines, start=1):
+        if not globals_seen and RE_GLOBAL.search(raw):
+            for code in RE_GLOBAL.findall(raw):
+                if code == 'G17': has_g17 = True
+                elif code == 'G21': has_g21 = True
+                elif code == 'G90': has_g90 = True
+                else: has_wcs = True
+            globals_seen = has_g17 and has_g21 and has_g90 and has_wcs
         line = raw.strip()
-        mm = RE_BLOCK.match(line)
-        if not mm:
+        mm = RE_N.match(line)
+        body = line[mm.end():] if mm else line
+        if not body or body[0] == '(':
             continue
-        body = mm.group('body')
-        if not body or body.startswith('('):
+        # без N-номера кадры сильно повторяются (одинаковые слои, кольца),
+        # поэтому разобранные кадры кэшируются по телу
+        entry = blocks.get(body) if blocks is not None else None
+        if entry is None:
+            b = parse_body(body, RE_CHECK_WORD)
+            entry = [b, for_block(b), None, ()]
+            if blocks is not None:
+                if len(blocks) >= BLOCK_CACHE_LIMIT and blocks is cache:
+                    blocks.clear()
+                elif len(blocks) >= BLOCK_CACHE_LIMIT:
+                    # повторов мало (уникальные координаты из CAM) — кэш
+                    # только мешает, дальше разбираем без него
+                    blocks = {} if hits >= len(blocks) else None
+                    hits = 0
+                if blocks is not None:
+                    blocks[body] = entry
+        else:
+            hits += 1
+        b = entry[0]
+        if body[0] in 'Oo' and saw_m30 is not False and call_state is not None:
+            if saw_m30 is None or call_state is _UNKNOWN:
+                raise _NeedState
+            s.set(*call_state)
             continue
 
-        # Длина строки
-        if len(body) > 80:
-            warns.append(m['long_line'].format(n=idx))
-
-        # Найдём G/M коды
-        g_codes = [int(x) for x in RE_G.findall(body)]
-        m_codes = [int(x) for x in RE_M.findall(body)]
-
-        # Неизвестные коды
-        for gcode in g_codes:
-            if gcode not in KNOWN_G:
-                warns.append(m['unknown_code'].format(code=f"G{gcode}"))
-        for mcode in m_codes:
-            if mcode not in KNOWN_M:
-                warns.append(m['unknown_code'].format(code=f"M{mcode}"))
-
         # Состояние шпинделя/СОЖ
-        if any(c == 3 for c in m_codes):  # M3
-            spindle_on = True
-        if any(c == 5 for c in m_codes):  # M5
-            saw_m5 = True
-            spindle_on = False
-        if any(c == 8 for c in m_codes):  # M8
-            coolant_on = True
-        if any(c == 9 for c in m_codes):  # M9
-            saw_m9 = True
-            coolant_on = False
-        if any(c == 30 for c in m_codes):  # M30
-            saw_m30 = True
+        m_codes = b.m
+        if m_codes:
+            spindle_on, coolant_on = s.spindle_on, s.coolant_on
+            if 3 in m_codes:  # M3
+                spindle_on = True
+            if 5 in m_codes:  # M5
+                saw_m5 = True
+                spindle_on = False
+            if 8 in m_codes:  # M8
+                coolant_on = True
+            if 9 in m_codes:  # M9
+                saw_m9 = True
+                coolant_on = False
+            s.set(spindle_on, coolant_on, s.feed_ok)
+            if 30 in m_codes:  # M30
+                saw_m30 = True
+            if 98 in m_codes:  # M98
+                call_state = (s.spindle_on, s.coolant_on, s.feed_ok)
 
         # G90/G91
+        g_codes = b.g
         if 90 in g_codes:
             g91_mode = False
         if 91 in g_codes:
             g91_mode = True
 
-        # FEED
-        feeds = RE_FEED.findall(body)
-        if len(feeds) > 1:
-            warns.append(m['dup_feed'])
-        if feeds:
-            try:
-                feed_current = float(feeds[-1])
-            except ValueError:
-                pass
-
-        # Z
-        mz = RE_Z.search(body)
-        if mz:
-            try:
-                z = float(mz.group(1))
-                if z < absurd:
-                    warns.append(m['absurd_z'].format(z=z))
-                if 'G0' in body.upper() and z < 0:
-                    warns.append(m['g0_down'])
-                # пометим что был безопасный retract выше safe_min
-                if 'G0' in body.upper() and z >= safe_min:
-                    last_safe_z_ok = True
-            except ValueError:
-                pass
-
-        # Проверки на G1
-        if any(code == 1 for code in g_codes):
-            if not spindle_on:
-                warns.append(m['g1_before_m3'])
-            if feed_current is None or feed_current <= 0:
-                warns.append(m['g1_no_feed'])
-            if not coolant_on:
-                warns.append(m['coolant_before_cut'])
-
-        # Проверка на G0 с подачей
-        if any(code == 0 for code in g_codes) and feeds:
-            warns.append(m['g0_with_feed'])
-            # feed_current не сбрасываем, это модальная величина
-
-        # Арки
-        if any(code in (2,3) for code in g_codes):
-            if not re.search(r"[RIJij]", body):
-                warns.append(m['arc_no_radius'])
+        # подача модальная; F на G0 её тоже задаёт
+        if b.f and (b.f[-1] > 0) is not s.feed_ok:
+            s.set(s.spindle_on, s.coolant_on, b.f[-1] > 0)
 
-    # Итоги
-    if g91_mode:
-        warns.append(m['g91_mode'])
-    if not saw_m30:
-        warns.append(m['missing_footer'])
-    if not saw_m5:
-        warns.append(m['no_spindle_off'])
-    if not saw_m9:
-        warns.append(m['no_coolant_off'])
-    if not last_safe_z_ok:
-        warns.append(m['no_safe_retract'])
+        # безопасный отвод: G0 на Z не ниже 0 и не ниже safe_min
+        z = b.z
+        if z is not None and z >= 0 and z >= safe_min and 0 in g_codes:
+            last_safe_z_ok = True
+
+        # предупреждения кадра при этом состоянии уже известны — правила не зовём
+        if entry[2] != s.version:
+            found: list = []
+            for check in entry[1]:
+                check(b, s, found.append)
+            entry[2] = s.version
+            entry[3] = tuple(found)
+        for key in entry[3]:
+            warn(idx if key is LINE else key)
+
+    return ChunkResult(
+        tuple(warns), idx, (has_g17, has_g21, has_g90, has_wcs),
+        (s.spindle_on, s.coolant_on, s.feed_ok, g91_mode, saw_m30, call_state),
+        last_safe_z_ok, saw_m5, saw_m9,
+    )
+
+# ---------- инкрементальная проверка ----------
+# Строк между контрольными точками состояния IncrementalValidator
+CHECKPOINT = 64
+
+def _join(a: ChunkResult | None, b: ChunkResult | None) -> ChunkResult | None:
+    """Итог двух соседних кусков, проверенных с известным входом, как одного."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    warns = b.warns
+    if a.lines and any(key.__class__ is int for key in warns):
+        warns = tuple(a.lines + key if key.__class__ is int else key for key in warns)
+    return ChunkResult(
+        tuple(dict.fromkeys(a.warns + warns)), a.lines + b.lines,
+        tuple(x or y for x, y in zip(a.globals, b.globals)), b.state,
+        a.safe_z_ok or b.safe_z_ok, a.saw_m5 or b.saw_m5, a.saw_m9 or b.saw_m9,
+    )
+
+class IncrementalValidator:
+    """Проверка редактируемой программы без повторного прохода с начала.
+
+    Текст хранится кусками примерно по checkpoint строк; для каждого куска
+    — ChunkResult, полученный с известным входом, его state на выходе и
+    есть контрольная точка модального состояния (шпиндель, СОЖ, подача,
+    G90/G91, M30, вызов подпрограммы). Правка перепроверяет куски с
+    ближайшей точки до правки и дальше, пока состояние на выходе не
+    совпадёт с прежним. Итоги кусков собраны в дерево отрезков, так что
+    общий результат после правки пересчитывается за O(log кусков).
+    warnings() совпадает с validate_lines() на текущем тексте.
+    """
+
+    def __init__(self, lines: Iterable[str] = (), lang: str = 'ru', safe_min: float = 0.0,
+                 checkpoint: int = CHECKPOINT, rules: RuleSet | None = None):
+        self.m = MSG.get(lang, MSG['ru'])
+        self.safe_min = safe_min
+        self.rules = rules or default_rules()
+        self.checkpoint = max(1, checkpoint)
+        self.rescanned = 0      # строк перепроверено последней правкой
+        self._cache: dict[str, list] = {}
+        self._load(list(lines))
+
+    def _load(self, lines: list) -> None:
+        n = self.checkpoint
+        self._parts = [lines[k:k + n] for k in range(0, len(lines), n)] or [[]]
+        self._results: list = []
+        state = START_STATE
+        for part in self._parts:
+            r = _scan(part, self.m, self.safe_min, state, self._cache, self.rules)
+            self._results.append(r)
+            state = r.state
+        self.rescanned = len(lines)
+        self._build()
+
+    def _build(self) -> None:
+        size = 1
+        while size < len(self._results):
+            size *= 2
+        self._size = size
+        tree = [None] * (2 * size)
+        tree[size:size + len(self._results)] = self._results
+        for k in range(size - 1, 0, -1):
+            tree[k] = _join(tree[2 * k], tree[2 * k + 1])
+        self._tree = tree
+
+    def _update(self, k: int) -> None:
+        tree = self._tree
+        k += self._size
+        tree[k] = self._results[k - self._size]
+        k //= 2
+        while k:
+            tree[k] = _join(tree[2 * k], tree[2 * k + 1])
+            k //= 2
+
+    def _locate(self, line: int) -> tuple:
+        """(номер куска, номер его первой строки) для строки line; конец текста — последний кусок."""
+        tree = self._tree
+        total = len(self)
+        if line >= total:
+            last = len(self._parts) - 1
+            return last, total - len(self._parts[last])
+        k = 1
+        base = 0
+        while k < self._size:
+            left = tree[2 * k]
+            if left is not None and line < base + left.lines:
+                k = 2 * k
+            else:
+                base += left.lines if left is not None else 0
+                k = 2 * k + 1
+        return k - self._size, base
+
+    def __len__(self) -> int:
+        return self._tree[1].lines
+
+    @property
+    def lines(self) -> List[str]:
+        return [s for part in self._parts for s in part]
+
+    def edit(self, start: int, stop: int, new_lines: Iterable[str]) -> None:
+        """Заменить строки [start, stop) (с нуля) на new_lines."""
+        total = len(self)
+        start = min(max(start, 0), total)
+        stop = min(max(stop, start), total)
+        new_lines = list(new_lines)
+        i, base = self._locate(start)
+        j, _ = self._locate(stop - 1) if stop > start else (i, base)
+        text = [s for part in self._parts[i:j + 1] for s in part]
+        text[start - base:stop - base] = new_lines
+        old_exit = self._results[j].state
+        # длинный кусок — обратно на куски по checkpoint, пустой — убирается
+        n = self.checkpoint
+        if len(text) > 2 * n:
+            parts = [text[k:k + n] for k in range(0, len(text), n)]
+        elif text or len(self._parts) == j - i + 1:
+            parts = [text]
+        else:
+            parts = []
+        state = self._results[i - 1].state if i else START_STATE
+        results = []
+        scanned = 0
+        for part in parts:
+            r = _scan(part, self.m, self.safe_min, state, self._cache, self.rules)
+            results.append(r)
+            scanned += len(part)
+            state = r.state
+        self._parts[i:j + 1] = parts
+        self._results[i:j + 1] = results
+        changed = list(range(i, i + len(parts)))
+        # дальше — пока состояние на выходе не сойдётся с прежним
+        k = i + len(parts)
+        while k < len(self._parts) and state != old_exit:
+            old_exit = self._results[k].state
+            r = _scan(self._parts[k], self.m, self.safe_min, state, self._cache, self.rules)
+            self._results[k] = r
+            scanned += len(self._parts[k])
+            state = r.state
+            changed.append(k)
+            k += 1
+        self.rescanned = scanned
+        if len(parts) != j - i + 1:
+            self._build()
+        else:
+            for k in changed:
+                self._update(k)
+
+    def update(self, lines: Iterable[str]) -> None:
+        """Новый текст целиком: правкой считается участок между общими началом и концом.
+
+        Общие начало и конец сначала ищутся целыми кусками (сравнение
+        списков без цикла по строкам), затем — построчно внутри оставшихся.
+        """
+        new = list(lines)
+        parts = self._parts
+        i = head = 0
+        while i < len(parts) and new[head:head + len(parts[i])] == parts[i]:
+            head += len(parts[i])
+            i += 1
+        j = len(parts)
+        end = len(new)
+        while j > i and end - len(parts[j - 1]) >= head and new[end - len(parts[j - 1]):end] == parts[j - 1]:
+            end -= len(parts[j - 1])
+            j -= 1
+        old = [s for part in parts[i:j] for s in part]
+        mid = new[head:end]
+        a = 0
+        while a < len(old) and a < len(mid) and old[a] == mid[a]:
+            a += 1
+        b = 0
+        while b < len(old) - a and b < len(mid) - a and old[-1 - b] == mid[-1 - b]:
+            b += 1
+        self.edit(head + a, head + len(old) - b, mid[a:len(mid) - b])
 
-    return list(dict.fromkeys(warns))  # убираем дубли
+    def warnings(self) -> List[str]:
+        return _finish(self.m, [self._tree[1]])
@@ -0,0 +1,28 @@
+"""Общие данные тестов: случайные программы для сверки проверок валидатора."""
+import random
+
+import pytest
+
+# Кадры, меняющие всё состояние, которое переносится между кусками:
+# шпиндель/СОЖ/подача, G90/G91, G17/G18 и прочие глобальные коды, M30,
+# вызов подпрограммы (M98) и её тело после M30
+BLOCKS = (
+    "G0 X10 Y10", "G0 Z5", "G0 Z-2", "G0 X1 F300", "G1 X20 Y5", "G1 X3 F200",
+    "G1 Z-1 F0", "F150", "G2 X5 Y5 I2 J0", "G3 X1 Y1", "M3 S8000", "M5", "M8",
+    "M9", "G90", "G91", "G17", "G18", "G21", "G54", "T2 M6", "M98 P100",
+    "G999", "M77", "(комментарий)", "", "X5 Y6", "N10 G1 X1 Y1 F100",
+    "G1 X1 Y2 Z3 F100 (" + "длинная строка " * 20 + ")",
+)
+TAIL = ("M30", "O100", "G1 X5 Y5", "M3", "G1 X6", "M99")
+
+def make_program(rng: random.Random, n: int) -> list:
+    lines = [rng.choice(BLOCKS) for _ in range(n)]
+    if rng.random() < 0.6:
+        # подпрограмма после M30: проверяется в состоянии вызова
+        lines += list(TAIL) + [rng.choice(BLOCKS) for _ in range(rng.randint(0, 10))]
+    return lines
+
+@pytest.fixture
+def program():
+    """program(seed, n) — случайная программа из n кадров (и, возможно, подпрограммы)."""
+    return lambda seed, n=200: make_program(random.Random(seed), n)
@@ -0,0 +1,78 @@
+"""IncrementalValidator после каждой правки совпадает с полной проверкой."""
+import random
+
+import pytest
+
+from gcodegen.validator import IncrementalValidator, validate_lines
+from conftest import BLOCKS, make_program
+
+# Кадры, меняющие модальное состояние для всего, что ниже
+MODAL = ("M3 S1000", "M5", "M8", "M9", "F100", "F0", "G90", "G91", "M30", "M98 P100", "O100")
+
+def _random_edit(rng: random.Random, n: int) -> tuple:
+    start = rng.randint(0, n)
+    stop = min(n, start + rng.choice((0, 0, 1, 1, 2, 5, 40)))
+    pool = MODAL if rng.random() < 0.5 else BLOCKS
+    return start, stop, [rng.choice(pool) for _ in range(rng.choice((0, 1, 1, 2, 3, 70)))]
+
+@pytest.mark.parametrize("checkpoint", (1, 4, 16, 64))
+@pytest.mark.parametrize("seed", range(6))
+def test_edits(checkpoint, seed):
+    rng = random.Random(seed)
+    text = make_program(rng, 300)
+    iv = IncrementalValidator(text, checkpoint=checkpoint)
+    assert iv.warnings() == validate_lines(text)
+    for _ in range(60):
+        start, stop, new = _random_edit(rng, len(text))
+        text[start:stop] = new
+        iv.edit(start, stop, new)
+        assert iv.lines == text
+        assert len(iv) == len(text)
+        assert iv.warnings() == validate_lines(text)
+
+@pytest.mark.parametrize("line", MODAL)
+def test_upstream_modal_change(line):
+    # правка в начале меняет состояние на входе всех следующих контрольных точек
+    text = make_program(random.Random(7), 400)
+    iv = IncrementalValidator(text, checkpoint=8)
+    for start, stop, new in ((0, 0, [line]), (1, 1, [line, line]), (0, 3, []), (5, 5, ["G91", "M5"])):
+        text[start:stop] = new
+        iv.edit(start, stop, new)
+        assert iv.warnings() == validate_lines(text)
+
+@pytest.mark.parametrize("seed", range(6))
+def test_update(seed):
+    rng = random.Random(100 + seed)
+    text = make_program(rng, 250)
+    iv = IncrementalValidator(text, checkpoint=16)
+    for _ in range(30):
+        text = list(text)
+        for _ in range(rng.randint(1, 3)):
+            start, stop, new = _random_edit(rng, len(text))
+            text[start:stop] = new
+        iv.update(text)
+        assert iv.lines == text
+        assert iv.warnings() == validate_lines(text)
+
+def test_empty_and_clear():
+    iv = IncrementalValidator([], checkpoint=4)
+    assert iv.warnings() == validate_lines([])
+    text = make_program(random.Random(3), 50)
+    iv.edit(0, 0, text)
+    assert iv.warnings() == validate_lines(text)
+    iv.edit(0, len(text), [])
+    assert len(iv) == 0
+    assert iv.warnings() == validate_lines([])
+
+@pytest.mark.parametrize("edit", ("dup", "undup"))
+def test_update_repeated_lines(edit):
+    # общие начало и конец перекрываются: вставка или удаление копии соседней строки
+    text = ["G90 G17 G21 G54", "M3", "F100"] + ["G1 X1"] * 5 + ["G91"] * 3 + ["M5 M9", "M30"]
+    iv = IncrementalValidator(text, checkpoint=2)
+    for k in range(1, len(text) - 1):
+        new = text[:k] + [text[k]] + text[k:] if edit == "dup" else text[:k] + text[k + 1:]
+        iv.update(new)
+        assert iv.lines == new
+        assert iv.warnings() == validate_lines(new)
+        iv.update(text)
+        assert iv.lines == text
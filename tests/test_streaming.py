@@ -0,0 +1,42 @@
+"""Потоковый вывод iter_* побайтно совпадает с выводом траектории целиком."""
+import pytest
+
+from gcodegen import core
+from gcodegen.post import PostProfile
+
+PROFILES = {"plain": PostProfile(), "modal": PostProfile().replace(modal=True)}
+
+# операция -> (позиционные аргументы, варианты опций); глубина на несколько проходов по Z
+CASES = {
+    "face": ((100, 60, 2.3, 0.5, 800, 10000, 10, 5, (3.0, -2.0)), [
+        {}, {"subprogram": True}, {"finish_contour": False, "overlap": 0.3},
+    ]),
+    "round_pocket": ((60, 3.1, 1.0, 300, 12000, 6, 5, (10.0, 5.0)), [
+        {}, {"cw": False}, {"strategy": "spiral"}, {"helix": True, "ramp_angle": 5.0},
+    ]),
+    "square_pocket": ((50, 30, 2.5, 0.7, 600, 9000, 6, 5, (1.0, 1.0)), [
+        {}, {"subprogram": True}, {"raster_axis": "Y", "finish_contour": False},
+        {"subprogram": True, "raster_axis": "Y"},
+    ]),
+}
+
+def _params():
+    for op, (args, variants) in CASES.items():
+        for opts in variants:
+            for name in PROFILES:
+                yield pytest.param(op, args, opts, name, id=f"{op}-{name}-{opts}")
+
+@pytest.mark.parametrize("op, args, opts, profile", list(_params()))
+def test_stream_equals_whole(op, args, opts, profile):
+    post = PROFILES[profile]
+    streamed = core._program(getattr(core, f"iter_{op}")(*args, post=post, **opts))
+    tp = getattr(core, f"{op}_toolpath")(*args, **opts)
+    whole = core._program(post.emitter().iter_program(tp))
+    assert streamed == whole
+    assert getattr(core, f"generate_{op}")(*args, post=post, **opts) == whole
+
+def test_parts_share_subprograms():
+    # подпрограмма слоя выводится один раз, после основной программы
+    text = core.generate_face(100, 60, 2.3, 0.5, 800, 10000, 10, 5, subprogram=True)
+    assert text.count("M99") == 1
+    assert text.index("M30") < text.index("M99")
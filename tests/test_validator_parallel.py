@@ -0,0 +1,65 @@
+"""Параллельная проверка совпадает с последовательной (validate_lines)."""
+import gzip
+
+import pytest
+
+from gcodegen.validator import MSG, validate_file_parallel, validate_lines
+
+SEEDS = range(12)
+# 1 — кусок на строку, 64 — несколько строк, 1 << 20 — один-два куска
+CHUNK_SIZES = (1, 64, 1 << 20)
+
+def _write(path, lines, newline="\n"):
+    path.write_bytes((newline.join(lines) + newline).encode("utf-8"))
+    return str(path)
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_parallel_equals_serial(tmp_path, program, seed, chunk_size):
+    lines = program(seed)
+    fn = _write(tmp_path / "p.nc", lines)
+    assert validate_file_parallel(fn, jobs=2, chunk_size=chunk_size) == validate_lines(lines)
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_crlf(tmp_path, program, chunk_size):
+    lines = program(100)
+    fn = _write(tmp_path / "p.nc", lines, "\r\n")
+    assert validate_file_parallel(fn, jobs=2, chunk_size=chunk_size) == validate_lines(lines)
+
+@pytest.mark.parametrize("chunk_size", (1, 64, 4096))
+@pytest.mark.parametrize("seed", SEEDS[:4])
+def test_gzip(tmp_path, program, seed, chunk_size):
+    lines = program(seed, 400)
+    fn = tmp_path / "p.nc.gz"
+    with gzip.open(fn, "wb") as f:
+        f.write(("\n".join(lines) + "\n").encode("utf-8"))
+    assert validate_file_parallel(str(fn), jobs=2, chunk_size=chunk_size) == validate_lines(lines)
+
+# Состояние с одной стороны границы куска, проверка — с другой:
+# (куски, ключи MSG, которые должны быть, ключи, которых быть не должно)
+CROSSING = [
+    # G91 в начале, G90 — нигде: предупреждение об инкрементальном режиме
+    ((["G91"], ["G1 X1 F100"], ["M30"]), {"g91_mode"}, set()),
+    # G90 в следующем куске снимает предупреждение
+    ((["G91"], ["G90"], ["M30"]), set(), {"g91_mode", "no_g90"}),
+    # G17/G18 и прочие глобальные коды в разных кусках
+    ((["G18"], ["G21 G54"], ["G17 G90", "M30"]), set(), {"no_g17", "no_g21", "no_g90", "no_wcs"}),
+    # шпиндель и подача включены в одном куске, резание — в другом
+    ((["M3 S1000", "F100"], ["G1 X1"], ["M5 M9", "M30"]), set(), {"g1_before_m3", "g1_no_feed"}),
+    ((["M5"], ["G1 X1 F100"], ["M30"]), {"g1_before_m3"}, set()),
+    # смена инструмента и СОЖ до резания в следующем куске
+    ((["T2 M6", "M8"], ["G1 X1 F100"], ["M30"]), {"g1_before_m3"}, {"coolant_before_cut"}),
+    # вызов подпрограммы до M30, её тело — в следующих кусках
+    ((["M3", "F100", "M98 P100"], ["M30", "O100"], ["G1 X1", "M99"]), set(), {"g1_before_m3", "g1_no_feed"}),
+    ((["M98 P100"], ["M30"], ["O100", "G1 X1 F100", "M99"]), {"g1_before_m3"}, set()),
+]
+
+@pytest.mark.parametrize("parts, has, lacks", CROSSING)
+def test_state_across_chunks(tmp_path, parts, has, lacks):
+    lines = [line for part in parts for line in part]
+    fn = _write(tmp_path / "p.nc", lines)
+    for chunk_size in CHUNK_SIZES:
+        warns = validate_file_parallel(fn, jobs=2, chunk_size=chunk_size)
+        assert warns == validate_lines(lines)
+        assert {MSG["ru"][k] for k in has} <= set(warns)
+        assert not {MSG["ru"][k] for k in lacks} & set(warns)